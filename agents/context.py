@@ -0,0 +1,320 @@
+"""
+Context the main agent gets on every turn, laid out for provider-side prefix caching.
+
+Providers cache the longest byte-identical prefix of a request, so the prompt is assembled in two
+parts:
+
+- `instructions`: the system prompt and slow-changing context (static locations and location
+  history, calendar, /memory files). Sent first and identical between turns until one of the
+  snapshots is rebuilt, so together with the tool schemas and the history it stays cached.
+- `live_context`: what changes every turn (current time, position and speed, Zep memory or local
+  search results). It is appended at the end of the user's message and stripped from the stored
+  history.
+
+The slow parts come from ContextSnapshot and are gathered concurrently, a provider that times out
+is left out, see register_context_providers.
+"""
+
+from datetime import datetime, timedelta, date
+
+import pytz
+from telegram.ext import Application
+
+from enums.bot_data import BotData
+from modules.calendar import Calendar
+from modules.context_snapshot import ContextEvent, ContextSnapshot
+from modules.conversation_history import LIVE_CONTEXT_HEADER
+from modules.file_system import DiskFileSystem
+from modules.location_manager import LocationManager
+from modules.memory import Memory
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+
+def get_current_time():
+
+    cet = pytz.timezone('CET')
+    current_time_and_date = datetime.now(cet)
+    current_time_and_date = current_time_and_date.strftime("%H:%M:%S %d/%m/%Y")
+
+    logger.debug("Returning time: %s", current_time_and_date)
+    return {"current_time": current_time_and_date}
+
+
+async def instructions(application: Application, system_prompt: str = "") -> str:
+    """
+    Returns the instructions for the main agent: the system prompt followed by context that only
+    changes every few minutes at most. Nothing in here may change from one message to the next.
+    """
+
+    locations, calendar, memory_files = await ContextSnapshot.gather("locations", "calendar", "memory_files")
+
+    new_prompt = system_prompt
+
+    new_prompt += (
+        "\n\nCommunication: Use the `send_telegram_message` tool to talk to the user."
+        " Telegram requests marked as direct will expect at least one call to this tool."
+        " Do not assume that text replies are delivered automatically."
+    )
+
+    new_prompt += ("\n\n Bellow provided context is live collection of data about the user, and general state of systems."
+                   "Use this information when it's relevant to better assist the user, and to compile with their preferences. "
+                   f"Values that change all the time (current time, position, speed, memory snippets) are attached to "
+                   f"the user's latest message under `{LIVE_CONTEXT_HEADER}`.")
+
+    new_prompt += locations
+    new_prompt += calendar
+
+    return "\n\n".join(part for part in (new_prompt, memory_files) if part)
+
+
+async def live_context(application: Application) -> str:
+    """
+    Returns the context that changes every turn, to be appended after the user's message.
+    """
+
+    (memory,) = await ContextSnapshot.gather("memory")
+
+    memory_manager : Memory = application.bot_data.get(BotData.MEMORY, None)
+    if not memory and memory_manager:
+        # Zep timed out without an earlier context to fall back on, the local index answers in milliseconds
+        memory = await run_blocking(Resource.DEFAULT, memory_manager.local_context) or ""
+
+    new_prompt = f"{LIVE_CONTEXT_HEADER}\n"
+
+    new_prompt += f"\n Current time: {get_current_time()} where date format is dd/mm/yyyy\n"
+
+    location_manager : LocationManager = application.bot_data.get(BotData.LOCATION, None)
+
+    if location_manager:
+        new_prompt += f"\nThis is data about the user's current status, if in undefined location it probably means they are on the move. Check speed for reference."
+        new_prompt += f"\nCurrent user position (latitude, longitude): {location_manager.get_last_location()}\n"
+
+        current_location = location_manager.get_current_location()
+
+        location_name_text = ""
+        if current_location:
+            location_name_text = "User is outside of any defined location" if not current_location.location else f"User is currently in: `{current_location.location.name}`"
+            duration = datetime.now() - current_location.entered
+            location_name_text += f" they been there for period of {str(duration).split('.')[0]} (hours:minutes:seconds)  "
+
+        new_prompt += f"{location_name_text}"
+        new_prompt += f"\nUser current speed is {location_manager.speed:02} km/h\n" if location_manager.speed > 1.2 else "\nUser is currently stationary.\n"
+
+    if memory:
+        new_prompt += f"\n{memory}"
+
+    return new_prompt
+
+
+def build_location_context(location_manager: LocationManager) -> str:
+    """Static locations, location history and time spent per location."""
+
+    new_prompt = ""
+
+    new_prompt += f"\n\nLOCATION DATA \n\n"
+
+    new_prompt += f"List of all static locations:\n"
+    new_prompt += ("Users create locations defined by name, description, latitude, longitude, and radius. "
+                   "These areas can overlap or be nested (e.g., a 'house' location within a larger 'city' location). "
+                   "The user's current location is the defined location whose center is closest, "
+                   "among all such locations whose radius they are currently within")
+
+    for loc in location_manager.get_static_locations():
+        new_prompt += f"\n- {loc.name}: {loc.description} (Lat: {loc.latitude}, Lon: {loc.longitude}, Radius: {loc.radius}m)"
+
+    new_prompt += "End of static locations.\n\n"
+
+    new_prompt += f"Detailed user location history for the past two days:\n\n"
+
+    time_spend = {}
+    duration_total = timedelta()
+    for record in location_manager.get_location_history():
+
+        entered_text = record.entered.strftime("%Y-%m-%d %H:%M")
+        exited_text = record.exited.strftime("%Y-%m-%d %H:%M")
+        duration = record.exited - record.entered
+        current_date = record.entered.date()
+
+
+        duration_total = duration_total + duration
+
+        if record.location:
+            time_spend[record.location.name] = time_spend.get(record.location.name, timedelta()) + duration
+        else:
+            time_spend["Unknown"] = time_spend.get("Unknown", timedelta()) + duration
+
+        # Insert a date separator if the date changed
+        if current_date < ( date.today() - timedelta(days=1)):
+            continue
+
+        if record.location:
+            location_name = record.location.name
+        else:
+            location_name = "Unknown Location (no name provided)"
+
+        new_prompt += (
+            f"Location: `{location_name}`\n"
+            f"Entered: {entered_text}\n"
+            f"Exited:  {exited_text}\n"
+            f"Duration: {duration}\n\n"
+        )
+
+    ### % of time spend in each location
+    new_prompt += f"Total time spend over at locations in the last {location_manager.history_size} days:\n"
+    for location, duration in time_spend.items():
+        percentage = (duration / duration_total) * 100 if duration_total > timedelta() else 0
+        new_prompt += f"- `{location}`: {str(duration).split('.')[0]} ({percentage:.2f}%)\n"
+
+
+    new_prompt += "End of location history.\n\n"
+
+    return new_prompt
+
+
+def build_calendar_context(calendar: Calendar) -> str:
+    """The closest upcoming calendar events."""
+
+    new_prompt = ""
+
+    events = calendar.get_events(10)
+
+    # print(events)
+
+    new_prompt += "\n\nCALENDAR DATA\n\n"
+
+    if not events:
+        new_prompt += "No upcoming events found in the calendar."
+        return new_prompt
+
+    new_prompt += f"The {len(events)} closest upcoming events (more may be planned later):\n"
+    for event in events:
+        summary = event.get('summary', 'No Title')
+
+        # Extract raw start/end dicts
+        raw_start = event.get('start', {})
+        raw_end = event.get('end', {})
+
+        # Determine start string
+        if 'dateTime' in raw_start:
+            # parse ISO datetime
+            start_dt = datetime.fromisoformat(raw_start['dateTime'])
+            start_str = start_dt.strftime("%Y-%m-%d %H:%M")
+        elif 'date' in raw_start:
+            # all-day event
+            start_date = datetime.fromisoformat(raw_start['date'])
+            start_str = start_date.strftime("%Y-%m-%d") + " (All day)"
+        else:
+            start_str = "Unknown start"
+
+        # Determine end string
+        if 'dateTime' in raw_end:
+            end_dt = datetime.fromisoformat(raw_end['dateTime'])
+            end_str = end_dt.strftime("%Y-%m-%d %H:%M")
+        elif 'date' in raw_end:
+            # all-day event end date is exclusive per Google Calendar API:
+            #  end_date - 1 day is last day of event
+            end_date = datetime.fromisoformat(raw_end['date'])
+            end_str = (end_date - timedelta(days=1)).strftime("%Y-%m-%d") + " (All day)"
+        else:
+            end_str = None
+
+        # Build the line
+        if end_str:
+            new_prompt += f"- {summary} (Start: {start_str}, End: {end_str})\n"
+        else:
+            new_prompt += f"- {summary} (Start: {start_str})\n"
+
+    return new_prompt
+
+
+def build_memory_context(memory: Memory) -> str:
+    new_prompt = "\n\nZEP MEMORY DATA\n\n"
+
+    mem = memory.get_memory()["context"]
+
+    if mem is None:
+        return "No memory data available."
+    else:
+
+        mem = ("MEMORY DATA\n\n"
+               "These are snippets of memory that should be most relevant to the current conversation. "
+               "It is important to know that they do not include all memory stored. "
+               "They also self update as other parts of the context, and you do not see previous verions."
+               "The text is relative to the date attached to it, so `today` next to date of 13th of May, means today in that text is 13th of May and not actually current date\n\n") + mem
+
+        # print(mem)
+        return mem
+
+def build_memory_files_context(file_manager: DiskFileSystem) -> str:
+    """
+    Returns the memory files for the main agent.
+    This function is used to get the memory files for the main agent.
+    """
+
+    new_prompt = "\n\nMEMORY FILES (/memory) \n\n"
+
+    files = file_manager.list_dir("/memory")
+
+    if not files or isinstance(files, str):
+        return "No memory files available."
+
+    for file in files:
+        file_path = f"/memory/{file}"
+        content = file_manager.read_file(file_path)
+        new_prompt += f"### `{file}: `\n{content}\n\n"
+
+    return new_prompt
+
+def memory_files_version(file_manager: DiskFileSystem):
+    """Names, sizes and mtimes of the /memory files, changes whenever one of them is written."""
+    directory = file_manager.root / "memory"
+    if not directory.is_dir():
+        return None
+    return sorted((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in directory.iterdir())
+
+
+def register_context_providers(application: Application):
+    """
+    Cache the slow parts of the prompt, they are rebuilt when their TTL runs out or something
+    fires one of their events (see modules/context_snapshot.py).
+    """
+
+    location : LocationManager = application.bot_data.get(BotData.LOCATION, None)
+    calendar : Calendar = application.bot_data.get(BotData.CALENDAR, None)
+    memory : Memory = application.bot_data.get(BotData.MEMORY, None)
+    file_manager : DiskFileSystem = application.bot_data.get(BotData.FILE_MANAGER, None)
+
+    # The history only changes when the user moves to another location, the TTL keeps "past two days" current
+    if location:
+        ContextSnapshot.register(
+            "locations", lambda: build_location_context(location),
+            ttl=600, events=(ContextEvent.LOCATION,), resource=Resource.MONGO, timeout=3,
+        )
+
+    if calendar:
+        ContextSnapshot.register(
+            "calendar", lambda: build_calendar_context(calendar),
+            ttl=300, events=(ContextEvent.CALENDAR,), resource=Resource.GOOGLE, timeout=4,
+        )
+
+    # Zep updates the context in the background after every message, a short TTL picks that up.
+    # A slow Zep call drops the memory from this turn rather than holding up the reply (live_context
+    # uses the local index then). Without Zep the local search is cheap enough to run every turn.
+    if memory:
+        ContextSnapshot.register(
+            "memory", lambda: build_memory_context(memory),
+            ttl=0 if memory.offline else 120, events=(ContextEvent.MEMORY,), resource=Resource.HTTP, timeout=3,
+        )
+
+    if file_manager:
+        ContextSnapshot.register(
+            "memory_files", lambda: build_memory_files_context(file_manager),
+            ttl=3600, version=lambda: memory_files_version(file_manager), timeout=2,
+        )
+    else:
+        ContextSnapshot.register("memory_files", lambda: "No file manager available.", ttl=float("inf"))
+
+
@@ -1,6 +1,4 @@
-import asyncio
 import os
-from datetime import datetime, timedelta, date
 from typing import Optional
 
 from pydantic_ai import Agent, Tool
@@ -8,18 +6,21 @@ from pydantic_ai.models.openrouter import OpenRouterModel
 from pydantic_ai.providers.openrouter import OpenRouterProvider
 from telegram.ext import Application
 
-from bot.commands.assistant.assistant import get_current_time
+from agents.context import instructions, register_context_providers
 from bot.watchers.email_summary import blocking_add_event
 from enums.bot_data import BotData
 from enums.database import DatabaseConstants
 from modules.bot import Bot
-from modules.calendar import Calendar
 from modules.database import ValkeyDB
 from modules.file_system import DiskFileSystem
 from modules.location_manager import LocationManager
 from modules.memory import Memory
+from modules.model_router import ModelRouter
 from modules.reminder import seconds_until, calculate_seconds, Reminders
+from modules.tool_selection import ToolSelection
+from structures.image_cache import CachedImage
 from utils.logging import get_logger
+from utils.offload import Resource, blocking, run_blocking
 
 # Import tools that were missing in local but present in remote
 from modules.time_capsule import create_capsule as create_time_capsule
@@ -29,7 +30,7 @@ from modules.habits import (
     deactivate_habit as remove_habit_tool,
     get_habit_stats as get_habit_stats_tool
 )
-from modules.habit_heatmap import generate_habit_heatmap as generate_heatmap_tool
+from modules.habit_heatmap import generate_habit_heatmap as generate_heatmap_tool, heatmap_cache_key
 from modules.service_manager import (
     list_services as list_services_tool,
     get_service_status as get_service_status_tool,
@@ -81,203 +82,6 @@ The user can't directly access the file system.
 Do not invent capabilities you don't have or offer actions/questions you can't fulfill.
 """
 
-def instructions(application: Application) -> str:
-    """
-    Returns the instructions for the main agent.
-    This function is used to get the instructions for the main agent.
-    """
-
-    new_prompt = ""
-
-    new_prompt += (
-        "\n\nCommunication: Use the `send_telegram_message` tool to talk to the user."
-        " Telegram requests marked as direct will expect at least one call to this tool."
-        " Do not assume that text replies are delivered automatically."
-    )
-
-    new_prompt += ("\n\n Bellow provided context is live collection of data about the user, and general state of systems."
-                   "Use this information when it's relevant to better assist the user, and to compile with their preferences. ")
-
-
-    new_prompt += f"\n\n Current time: {get_current_time()} where date format is dd/mm/yyyy\n"
-
-    location_manager : LocationManager = application.bot_data.get(BotData.LOCATION, None)
-
-    if location_manager:
-        new_prompt += f"\n\nLOCATION DATA \n\n"
-
-        new_prompt += f"List of all static locations:\n"
-        new_prompt += ("Users create locations defined by name, description, latitude, longitude, and radius. "
-                       "These areas can overlap or be nested (e.g., a 'house' location within a larger 'city' location). "
-                       "The user's current location is the defined location whose center is closest, "
-                       "among all such locations whose radius they are currently within")
-
-        for loc in location_manager.get_static_locations():
-            new_prompt += f"\n- {loc.name}: {loc.description} (Lat: {loc.latitude}, Lon: {loc.longitude}, Radius: {loc.radius}m)"
-
-        new_prompt += "End of static locations.\n\n"
-
-        new_prompt += f"Detailed user location history for the past two days:\n\n"
-
-        time_spend = {}
-        duration_total = timedelta()
-        for record in location_manager.get_location_history():
-
-            entered_text = record.entered.strftime("%Y-%m-%d %H:%M")
-            exited_text = record.exited.strftime("%Y-%m-%d %H:%M")
-            duration = record.exited - record.entered
-            current_date = record.entered.date()
-
-
-            duration_total = duration_total + duration
-
-            if record.location:
-                time_spend[record.location.name] = time_spend.get(record.location.name, timedelta()) + duration
-            else:
-                time_spend["Unknown"] = time_spend.get("Unknown", timedelta()) + duration
-
-            # Insert a date separator if the date changed
-            if current_date < ( date.today() - timedelta(days=1)):
-                continue
-
-            if record.location:
-                location_name = record.location.name
-            else:
-                location_name = "Unknown Location (no name provided)"
-
-            new_prompt += (
-                f"Location: `{location_name}`\n"
-                f"Entered: {entered_text}\n"
-                f"Exited:  {exited_text}\n"
-                f"Duration: {duration}\n\n"
-            )
-
-        ### % of time spend in each location
-        new_prompt += f"Total time spend over at locations in the last {location_manager.history_size} days:\n"
-        for location, duration in time_spend.items():
-            percentage = (duration / duration_total) * 100 if duration_total > timedelta() else 0
-            new_prompt += f"- `{location}`: {str(duration).split('.')[0]} ({percentage:.2f}%)\n"
-
-
-        new_prompt += "End of location history.\n\n"
-
-        new_prompt += f"This is data about the user's current status, if in undefined location it probably means they are on the move. Check speed for reference."
-        new_prompt += f"\nCurrent user position (latitude, longitude): {location_manager.get_last_location()}\n"
-
-        current_location = location_manager.get_current_location()
-
-        # print(current_location)
-
-        location_name_text = ""
-        if current_location:
-            location_name_text = "User is outside of any defined location" if not current_location.location else f"User is currently in: `{current_location.location.name}`"
-            duration = datetime.now() - current_location.entered
-            location_name_text += f" they been there for period of {str(duration).split('.')[0]} (hours:minutes:seconds)  "
-
-        new_prompt += f"{location_name_text}"
-        new_prompt += f"\nUser current speed is {location_manager.speed:02} km/h\n" if location_manager.speed > 1.2 else "\nUser is currently stationary.\n"
-
-
-    calendar : Calendar = application.bot_data.get(BotData.CALENDAR, None)
-
-
-    events = calendar.get_events(10)
-
-    # print(events)
-
-    new_prompt += "\n\nCALENDAR DATA\n\n"
-
-    if not events:
-        new_prompt += "No upcoming events found in the calendar."
-        return new_prompt
-
-    new_prompt += f"The {len(events)} closest upcoming events (more may be planned later):\n"
-    for event in events:
-        summary = event.get('summary', 'No Title')
-
-        # Extract raw start/end dicts
-        raw_start = event.get('start', {})
-        raw_end = event.get('end', {})
-
-        # Determine start string
-        if 'dateTime' in raw_start:
-            # parse ISO datetime
-            start_dt = datetime.fromisoformat(raw_start['dateTime'])
-            start_str = start_dt.strftime("%Y-%m-%d %H:%M")
-        elif 'date' in raw_start:
-            # all-day event
-            start_date = datetime.fromisoformat(raw_start['date'])
-            start_str = start_date.strftime("%Y-%m-%d") + " (All day)"
-        else:
-            start_str = "Unknown start"
-
-        # Determine end string
-        if 'dateTime' in raw_end:
-            end_dt = datetime.fromisoformat(raw_end['dateTime'])
-            end_str = end_dt.strftime("%Y-%m-%d %H:%M")
-        elif 'date' in raw_end:
-            # all-day event end date is exclusive per Google Calendar API:
-            #  end_date - 1 day is last day of event
-            end_date = datetime.fromisoformat(raw_end['date'])
-            end_str = (end_date - timedelta(days=1)).strftime("%Y-%m-%d") + " (All day)"
-        else:
-            end_str = None
-
-        # Build the line
-        if end_str:
-            new_prompt += f"- {summary} (Start: {start_str}, End: {end_str})\n"
-        else:
-            new_prompt += f"- {summary} (Start: {start_str})\n"
-
-    # print(new_prompt)
-    return new_prompt
-
-def get_memory(application: Application) -> str:
-    new_prompt = "\n\nZEP MEMORY DATA\n\n"
-
-    memory : Memory = application.bot_data.get(BotData.MEMORY, None)
-
-    mem = memory.get_memory()["context"]
-
-    if mem is None:
-        return "No memory data available."
-    else:
-
-        mem = ("MEMORY DATA\n\n"
-               "These are snippets of memory that should be most relevant to the current conversation. "
-               "It is important to know that they do not include all memory stored. "
-               "They also self update as other parts of the context, and you do not see previous verions."
-               "The text is relative to the date attached to it, so `today` next to date of 13th of May, means today in that text is 13th of May and not actually current date\n\n") + mem
-
-        # print(mem)
-        return mem
-
-def get_memory_files(application: Application) -> str:
-    """
-    Returns the memory files for the main agent.
-    This function is used to get the memory files for the main agent.
-    """
-
-    new_prompt = "\n\nMEMORY FILES (/memory) \n\n"
-
-    file_manager : DiskFileSystem = application.bot_data.get(BotData.FILE_MANAGER, None)
-
-    if not file_manager:
-        return "No file manager available."
-
-    files = file_manager.list_dir("/memory")
-
-    if not files or isinstance(files, str):
-        return "No memory files available."
-
-    for file in files:
-        file_path = f"/memory/{file}"
-        content = file_manager.read_file(file_path)
-        new_prompt += f"### `{file}: `\n{content}\n\n"
-
-    return new_prompt
-
-
 def initialize_main_agent(application: Application):
 
     """
@@ -288,13 +92,13 @@ def initialize_main_agent(application: Application):
     reminder =  Reminders(application.bot)
     application.bot_data[BotData.REMINDER] = reminder
 
+    register_context_providers(application)
+
     location : LocationManager = application.bot_data.get(BotData.LOCATION, None)
     memory : Memory = application.bot_data.get(BotData.MEMORY, None)
     file_manager : DiskFileSystem = application.bot_data.get(BotData.FILE_MANAGER, None)
 
 
-    loop = asyncio.get_event_loop()
-
     def ensure_primary_bot() -> Optional[Bot]:
         bot_wrapper: Optional[Bot] = application.bot_data.get(BotData.BOT)
 
@@ -317,7 +121,7 @@ def initialize_main_agent(application: Application):
         application.bot_data[BotData.BOT] = bot_wrapper
         return bot_wrapper
 
-    def send_telegram_message(text: str, markdown: bool = True, clean: bool = False) -> str:
+    async def send_telegram_message(text: str, markdown: bool = True, clean: bool = False) -> str:
         bot_wrapper = ensure_primary_bot()
 
         if bot_wrapper is None:
@@ -325,26 +129,22 @@ def initialize_main_agent(application: Application):
             logger.warning(warning)
             return warning
 
-        async def _send():
-            await bot_wrapper.send(text, markdown=markdown, clean=clean)
-
-        future = asyncio.run_coroutine_threadsafe(_send(), loop)
-
         try:
-            future.result()
+            sent = await bot_wrapper.send(text, markdown=markdown, clean=clean)
         except Exception as exc:  # pragma: no cover - safety net
             logger.error("Error while sending Telegram message: %s", exc)
             return f"Failed to send message: {exc}"
 
+        if sent is None and text.strip():
+            # Bot.send logs and swallows delivery errors
+            return "Failed to send message, Telegram rejected it."
+
         if memory:
-            try:
-                memory.add_message(role="Telegram Assistant", content=text, role_type="assistant")
-            except Exception as exc:  # pragma: no cover - defensive
-                logger.error("Failed to persist assistant message to memory: %s", exc)
+            memory.add_message(role="Telegram Assistant", content=text, role_type="assistant")
 
         return "Message sent to Telegram."
 
-    def generate_heatmap(habit_id: str, period: str = "last_30_days") -> str:
+    async def generate_heatmap(habit_id: str, period: str = "last_30_days") -> str:
         """
         Generate a habit heatmap and send it to the user's primary Telegram chat.
 
@@ -357,21 +157,24 @@ def initialize_main_agent(application: Application):
             logger.warning(warning)
             return warning
 
-        buf = generate_heatmap_tool(habit_id=habit_id, period=period)
-        if buf is None:
-            return "Failed to generate heatmap (habit not found or rendering error)."
+        # Same habit data and period as an earlier heatmap, resend that upload instead of rendering again
+        cache_key = await run_blocking(Resource.MONGO, heatmap_cache_key, habit_id, period)
+        photo = await run_blocking(Resource.MONGO, CachedImage.get_file_id, cache_key) if cache_key else None
 
-        async def _send():
+        if photo is None:
+            # Rendering shares the single render thread with the other matplotlib users (pyplot isn't thread safe)
+            photo = await run_blocking(Resource.RENDER, generate_heatmap_tool, habit_id=habit_id, period=period)
+            if photo is None:
+                return "Failed to generate heatmap (habit not found or rendering error)."
+
+        try:
             await bot_wrapper.send_photo(
-                buf,
+                photo,
                 caption=f"Heatmap for `{habit_id}` ({period})",
                 markdown=True,
                 filename=f"habit_{habit_id}_{period}.png",
+                cache_key=cache_key,
             )
-
-        future = asyncio.run_coroutine_threadsafe(_send(), loop)
-        try:
-            future.result()
         except Exception as exc:  # pragma: no cover - safety net
             logger.error("Error while sending heatmap to Telegram: %s", exc)
             return f"Failed to send heatmap: {exc}"
@@ -380,9 +183,13 @@ def initialize_main_agent(application: Application):
 
 
 
+    # Tools are all coroutine functions running on the event loop. The ones doing blocking I/O
+    # (Mongo, systemctl, the file system) run in their resource's pool through `blocking`.
     main_agent = Agent(
         name="Main Agent",
         model=model,
+        # Only the tool groups that look relevant to the turn are sent, see modules/tool_selection.py
+        prepare_tools=ToolSelection.select_tools,
         tools=[
             Tool(strict=False, 
                 name="seconds_until",
@@ -397,8 +204,7 @@ def initialize_main_agent(application: Application):
             Tool(strict=False, 
                 name="create_reminder",
                 description="Creates a reminder that will notify the user after a specified number of seconds. "
-                "This function is non blocking and will create a "
-                "new thread that notifies the user automatically.",
+                "This function is non blocking, the user is notified automatically when the time is up.",
                 function=reminder.add_reminder
             ),
             Tool(strict=False, 
@@ -427,14 +233,14 @@ def initialize_main_agent(application: Application):
             Tool(strict=False, 
                 name="remove_location",
                 description="Removes a static location from the system by its name",
-                function=location.remove_static_location
+                function=blocking(Resource.MONGO)(location.remove_static_location)
             ),
             ## File Manager Tools
             Tool(strict=False,
                 name="shell",
                 description="Execute shell-style file commands. "
                 "Supports: mkdir, ls, cat, rm, touch, mv, cp, tree, echo >/>> file, find",
-                function=file_manager.shell
+                function=blocking(Resource.DEFAULT)(file_manager.shell)
             ),
             ## Time Capsule
             Tool(strict=False, 
@@ -444,7 +250,7 @@ def initialize_main_agent(application: Application):
                 "at a future date (weeks, months, or even years ahead). "
                 "Unlike reminders which are task-oriented, time capsules are reflective messages "
                 "that will be delivered with distinctive formatting.",
-                function=create_time_capsule
+                function=blocking(Resource.MONGO)(create_time_capsule)
             ),
             ## Habit Tracking
             Tool(strict=False, 
@@ -456,17 +262,17 @@ def initialize_main_agent(application: Application):
                 "blue for calm/mindfulness, green for health/fitness, purple for creativity, "
                 "orange for productivity, red for intensity, cyan for hydration, pink for self-care. "
                 "Available colors: green, blue, purple, orange, red, cyan, pink.",
-                function=create_habit_tool
+                function=blocking(Resource.MONGO)(create_habit_tool)
             ),
             Tool(strict=False, 
                 name="list_habits",
                 description="Lists all active habits being tracked for the user.",
-                function=list_habits_tool
+                function=blocking(Resource.MONGO)(list_habits_tool)
             ),
             Tool(strict=False, 
                 name="remove_habit",
                 description="Deactivates a habit by its ID. The habit will no longer appear in daily check-ins.",
-                function=remove_habit_tool
+                function=blocking(Resource.MONGO)(remove_habit_tool)
             ),
             Tool(strict=False, 
                 name="get_habit_stats",
@@ -474,7 +280,7 @@ def initialize_main_agent(application: Application):
                 "For boolean habits: completion rate, current streak, best streak. "
                 "For count/numeric habits: average, trend (improving/declining), distribution, min/max values. "
                 "days: number of days to look back (default 30).",
-                function=get_habit_stats_tool
+                function=blocking(Resource.MONGO)(get_habit_stats_tool)
             ),
             Tool(strict=False, 
                 name="generate_heatmap",
@@ -489,56 +295,47 @@ def initialize_main_agent(application: Application):
                 description="Lists all allowed systemd services and their current active state "
                 "(e.g. active, inactive, failed). Only services configured in ALLOWED_SERVICES "
                 "are visible.",
-                function=list_services_tool
+                function=blocking(Resource.SUBPROCESS)(list_services_tool)
             ),
             Tool(strict=False,
                 name="get_service_status",
                 description="Returns detailed status of a systemd service: active state, sub-state, "
                 "load state, and description. "
                 "service: unit name with or without the .service suffix.",
-                function=get_service_status_tool
+                function=blocking(Resource.SUBPROCESS)(get_service_status_tool)
             ),
             Tool(strict=False,
                 name="start_service",
                 description="Starts a systemd service. "
                 "Only services listed in ALLOWED_SERVICES can be started. "
                 "service: unit name with or without the .service suffix.",
-                function=start_service_tool
+                function=blocking(Resource.SUBPROCESS)(start_service_tool)
             ),
             Tool(strict=False,
                 name="stop_service",
                 description="Stops a systemd service. "
                 "Only services listed in ALLOWED_SERVICES can be stopped. "
                 "service: unit name with or without the .service suffix.",
-                function=stop_service_tool
+                function=blocking(Resource.SUBPROCESS)(stop_service_tool)
             ),
             Tool(strict=False,
                 name="restart_service",
                 description="Restarts a systemd service. "
                 "Only services listed in ALLOWED_SERVICES can be restarted. "
                 "service: unit name with or without the .service suffix.",
-                function=restart_service_tool
+                function=blocking(Resource.SUBPROCESS)(restart_service_tool)
             ),
 
         ],
     )
 
 
-    @main_agent.system_prompt
-    def _system_prompt_warper() -> str:
-        return main_agent_system_prompt()
-
-    @main_agent.instructions
-    def _instruction_warper() -> str:
-        return instructions(application)
-
-    @main_agent.instructions
-    def get_memory_wrapper() -> str:
-        return get_memory(application)
-
+    # The system prompt is part of the instructions rather than a system prompt part of the first
+    # message, so it's always the start of the cacheable prefix (and survives history compaction).
+    # Everything that changes per message is appended to the user prompt, see agents/context.py
     @main_agent.instructions
-    def get_memory_files_wrapper() -> str:
-        return get_memory_files(application)
+    async def _instruction_warper() -> str:
+        return await instructions(application, main_agent_system_prompt())
 
 
 
@@ -547,5 +344,6 @@ def initialize_main_agent(application: Application):
     # memory.add_message(role="System Instructions", content=MAIN_AGENT_SYSTEM_PROMPT + "\n\n" + instructions(application), role_type="system")
 
     application.bot_data[BotData.MAIN_AGENT] = main_agent
+    application.bot_data[BotData.MODEL_ROUTER] = ModelRouter.from_env()
 
     logger.info("Main agent initialized.")
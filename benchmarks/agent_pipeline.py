@@ -0,0 +1,426 @@
+"""
+End-to-end latency and allocations of an assistant turn, without OpenRouter, Zep or Telegram.
+
+Replays a corpus of scripted conversations through the real pipeline: Assistant.run_batch (the
+agent run of a batch of messages) → ModelRouter → main agent with its tools and context providers
+→ Bot.send → OutboundQueue. Only the outside world is replaced:
+
+- the model is a pydantic-ai FunctionModel that plays back the tool calls and reply of each turn
+- Zep and Google Calendar are fakes with a configurable latency
+- Telegram is a fake bot that answers every request after `--rtt`
+- storage is the in-memory Mongo fallback and a temporary directory
+
+Latency is reported per stage (p50/p95), allocations come from a second pass under tracemalloc so
+they don't slow down the timed one. Stages nest: "model" includes building the instructions,
+"tools" includes "send". The message debounce is skipped, turns go straight to run_batch.
+
+Run from the repository root:
+    python -m benchmarks.agent_pipeline [--rounds 20] [--zep-latency 0.03] [--json out.json] [--max-p95 250]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+# Everything stays in memory, and the OpenRouter provider only needs a key to be constructed
+os.environ.pop("MONGODB_URI", None)
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from telegram import Chat, Message, PhotoSize, Update, User
+
+import agents.main_agent
+import modules.model_router
+from agents.main_agent import initialize_main_agent
+from bot.commands.assistant.assistant import Assistant
+from enums.bot_data import BotData
+from modules.bot import Bot
+from modules.conversation_history import ConversationHistory
+from modules.file_system import DiskFileSystem
+from modules.local_index import LocalIndex
+from modules.location_manager import LocationManager
+from modules.memory import Memory
+from modules.outbound import OutboundQueue
+
+STAGES = ("total", "instructions", "live context", "model", "tools", "send", "history")
+
+
+@dataclass
+class Turn:
+    text: str
+    tool_calls: List[Tuple[str, Dict[str, Any]]] = field(default_factory=list)
+    reply: str = "Done."
+    photo: bool = False
+
+
+CORPUS: List[List[Turn]] = [
+    [
+        Turn("hi!", reply="Hey, what can I do for you?"),
+        Turn("thanks, that's all", reply="Anytime."),
+    ],
+    [
+        Turn("remind me in 10 min to stretch", [
+            ("convert_to_seconds", {"minutes": 10}),
+            ("create_reminder", {"seconds": 600, "reminder": "stretch"}),
+        ], "Reminder set, I'll ping you in 10 minutes."),
+        Turn("what reminders do I have?", [("get_reminders", {})], "Just the stretch one."),
+    ],
+    [
+        Turn("save a note that the spare key is under the mat", [
+            ("shell", {"command": "echo 'spare key is under the mat' >> /memory/notes.md"}),
+        ], "Saved to your notes."),
+        Turn("what's in my notes?", [("shell", {"command": "cat /memory/notes.md"})],
+             "Your notes say the spare key is under the mat."),
+    ],
+    [
+        Turn("track a habit: drink water", [("create_habit", {"name": "Drink water", "color": "cyan"})],
+             "Added *Drink water* to your daily check-in."),
+        Turn("which habits am I tracking?", [("list_habits", {})], "Drink water."),
+    ],
+    [
+        Turn("what is this?", photo=True, reply="Looks like a cat on a keyboard."),
+    ],
+    [
+        Turn("how long until 2030-01-01 00:00:00 and make it a capsule reminder", [
+            ("seconds_until", {"target_date_str": "2030-01-01 00:00:00"}),
+        ], "About 3 years, " + "plenty of time. " * 40),
+    ],
+]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fakes of the outside world
+# ─────────────────────────────────────────────────────────────────────────────
+
+class FakeTelegramBot:
+    """Answers the Bot API methods the assistant uses after a simulated round trip."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.sent: List[str] = []
+        self._message_id = 0
+
+    async def _request(self) -> None:
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+    def _message(self, chat_id: int, text: Optional[str] = None) -> SimpleNamespace:
+        self._message_id += 1
+        return SimpleNamespace(message_id=self._message_id, chat_id=chat_id, text=text, photo=[])
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        await self._request()
+        self.sent.append(text)
+        return self._message(chat_id, text)
+
+    async def send_photo(self, chat_id: int, photo, **kwargs) -> SimpleNamespace:
+        await self._request()
+        return self._message(chat_id)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs) -> SimpleNamespace:
+        await self._request()
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text)
+
+    async def delete_message(self, chat_id: int, message_id: int, **kwargs) -> bool:
+        await self._request()
+        return True
+
+    async def send_chat_action(self, chat_id: int, action: str, **kwargs) -> bool:
+        await self._request()
+        return True
+
+    async def get_file(self, file_id: str) -> SimpleNamespace:
+        await self._request()
+        return SimpleNamespace(file_id=file_id, file_path=f"https://api.telegram.org/file/bot0/{file_id}.jpg")
+
+
+class FakeZep:
+    """Zep client whose requests are replaced by a sleep, they block like the real client does."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.messages: List[str] = []
+        self.requests = 0
+        self.user = SimpleNamespace(add=self._request)
+        self.thread = SimpleNamespace(
+            create=self._request, add_messages=self._add_messages, get_user_context=self._get_user_context,
+        )
+
+    def _request(self, **kwargs) -> None:
+        self.requests += 1
+        time.sleep(self.latency)
+
+    def _add_messages(self, thread_id, messages, **kwargs) -> None:
+        self._request()
+        self.messages.extend(message.content for message in messages)
+
+    def _get_user_context(self, thread_id, **kwargs) -> SimpleNamespace:
+        self._request()
+        facts = "\n".join(f"- {content[:80]}" for content in self.messages[-10:])
+        return SimpleNamespace(context=f"FACTS and ENTITIES\n{facts}")
+
+
+class FakeCalendar:
+    def __init__(self, latency: float):
+        self.latency = latency
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.events = [
+            {
+                "summary": f"Event {i}",
+                "start": {"dateTime": (start + timedelta(hours=6 * i)).isoformat()},
+                "end": {"dateTime": (start + timedelta(hours=6 * i + 1)).isoformat()},
+            }
+            for i in range(1, 15)
+        ]
+
+    def get_events(self, max_results=10):
+        time.sleep(self.latency)
+        return self.events[:max_results]
+
+    def add_event(self, start, end, summary, description=None, location=None, all_day=False):
+        time.sleep(self.latency)
+        self.events.append({"summary": summary, "start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()}})
+
+
+class ScriptedModel:
+    """Plays back the current turn: its tool calls one per request, then the reply."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.turn: Optional[Turn] = None
+        self.model = FunctionModel(self.respond, model_name="scripted")
+
+    async def respond(self, messages, info: AgentInfo) -> ModelResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # Requests made so far in this turn, counted from the one carrying the user's prompt
+        step = 0
+        for message in reversed(messages):
+            if isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts):
+                break
+            step += isinstance(message, ModelResponse)
+
+        calls = self.turn.tool_calls
+        if step < len(calls):
+            name, args = calls[step]
+            return ModelResponse(parts=[ToolCallPart(name, args)], model_name="scripted")
+        if step == len(calls):
+            return ModelResponse(parts=[ToolCallPart("send_telegram_message", {"text": self.turn.reply})], model_name="scripted")
+        return ModelResponse(parts=[TextPart("done")], model_name="scripted")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Harness
+# ─────────────────────────────────────────────────────────────────────────────
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._turn: Dict[str, float] = {}
+
+    def wrap(self, owner, name: str, stage: str) -> None:
+        """Replace the coroutine function `owner.name` with one that adds its time to `stage`."""
+        func = getattr(owner, name)
+
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+
+        setattr(owner, name, timed)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self._turn[stage] = self._turn.get(stage, 0.0) + seconds
+
+    def end_turn(self) -> None:
+        for stage in STAGES:
+            self.samples[stage].append(self._turn.get(stage, 0.0))
+        self._turn = {}
+
+
+def make_update(update_id: int, chat_id: int, turn: Turn) -> Update:
+    chat = Chat(chat_id, Chat.PRIVATE)
+    user = User(chat_id, "bench", is_bot=False)
+    photo = (PhotoSize(f"photo{update_id}", f"u{update_id}", 1280, 960),) if turn.photo else None
+    message = Message(
+        update_id, datetime.now(timezone.utc), chat, from_user=user,
+        text=None if turn.photo else turn.text, caption=turn.text if turn.photo else None, photo=photo,
+    )
+    return Update(update_id, message=message)
+
+
+def build_application(args, storage: str) -> Tuple[SimpleNamespace, ScriptedModel, FakeTelegramBot]:
+    telegram_bot = FakeTelegramBot(args.rtt)
+    zep = FakeZep(args.zep_latency)
+
+    application = SimpleNamespace(bot=telegram_bot, bot_data={})
+    application.create_task = lambda coroutine, update=None: asyncio.get_running_loop().create_task(coroutine)
+
+    # The Zep journal and the local index's messages live next to the agent's file storage, not inside it
+    file_manager = DiskFileSystem(os.path.join(storage, "storage"))
+    file_manager.shell("mkdir /memory")
+    file_manager.shell("echo 'Prefers short answers. Lives in Prague.' > /memory/user.md")
+
+    location = LocationManager()
+    location.add_static_location("home", "Flat", 50.0755, 14.4378, 80)
+    location.add_static_location("office", "Work", 50.0875, 14.4213, 120)
+
+    application.bot_data.update({
+        BotData.MEMORY: Memory(
+            "bench",
+            client=zep,
+            buffer_file=os.path.join(storage, "zep_buffer.jsonl"),
+            local_index=LocalIndex(file_manager.root, messages_file=os.path.join(storage, "memory_index.jsonl")),
+        ),
+        BotData.CALENDAR: FakeCalendar(args.calendar_latency),
+        BotData.FILE_MANAGER: file_manager,
+        BotData.LOCATION: location,
+        BotData.MESSAGE_HISTORY: ConversationHistory("benchmark"),
+    })
+
+    initialize_main_agent(application)
+
+    scripted = ScriptedModel(args.model_latency)
+    application.bot_data[BotData.MAIN_AGENT].model = scripted.model
+    return application, scripted, telegram_bot
+
+
+async def replay(application, scripted: ScriptedModel, rounds: int, timer: Optional[StageTimer] = None,
+                 on_turn=None) -> int:
+    context = SimpleNamespace(bot=application.bot, bot_data=application.bot_data, application=application)
+    update_id = 0
+
+    for _ in range(rounds):
+        for chat_id, conversation in enumerate(CORPUS, start=1):
+            for turn in conversation:
+                update_id += 1
+                scripted.turn = turn
+                update = make_update(update_id, chat_id, turn)
+
+                start = time.perf_counter()
+                await Assistant.run_batch([update], context)
+                if timer:
+                    timer.add("total", time.perf_counter() - start)
+                    timer.end_turn()
+                if on_turn:
+                    on_turn()
+
+    return update_id
+
+
+def install_timers(timer: StageTimer) -> None:
+    timer.wrap(agents.main_agent, "instructions", "instructions")
+    timer.wrap(sys.modules[Assistant.__module__], "live_context", "live context")
+    timer.wrap(Bot, "send", "send")
+    timer.wrap(ConversationHistory, "replace", "history")
+
+    record_run = modules.model_router.record_run
+
+    async def record_timings(result, timings, *args, **kwargs):
+        timer.add("model", timings.llm_time)
+        timer.add("tools", timings.tool_time)
+        return await record_run(result, timings, *args, **kwargs)
+
+    modules.model_router.record_run = record_timings
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * fraction + 0.5) - 1))]
+
+
+def describe(values: List[float], scale: float = 1000, unit: str = "ms") -> str:
+    return (f"p50 {percentile(values, 0.5) * scale:8.2f} {unit}   p95 {percentile(values, 0.95) * scale:8.2f} {unit}   "
+            f"mean {statistics.mean(values) * scale:8.2f} {unit}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20, help="times the whole corpus is replayed")
+    parser.add_argument("--warmup", type=int, default=1, help="rounds replayed before measuring")
+    parser.add_argument("--rtt", type=float, default=0.0, help="fake Telegram round trip in seconds")
+    parser.add_argument("--zep-latency", type=float, default=0.03, help="seconds per fake Zep call")
+    parser.add_argument("--calendar-latency", type=float, default=0.05, help="seconds per fake Calendar call")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="seconds per scripted model request")
+    parser.add_argument("--rate-limits", action="store_true", help="keep Telegram's per chat rate limits")
+    parser.add_argument("--top", type=int, default=8, help="allocation sites to list")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--max-p95", type=float, help="exit with status 1 when the total p95 exceeds this many ms")
+    args = parser.parse_args()
+
+    if not args.rate_limits:
+        # One reply per turn would otherwise wait for the 1 message/s per chat budget
+        OutboundQueue.chat_rate = OutboundQueue.chat_burst = OutboundQueue.global_rate = 1e6
+
+    with tempfile.TemporaryDirectory() as storage:
+        application, scripted, telegram_bot = build_application(args, storage)
+
+        await replay(application, scripted, args.warmup)
+
+        timer = StageTimer()
+        install_timers(timer)
+        turns = await replay(application, scripted, args.rounds, timer)
+
+        # Allocation pass: peak traced memory per turn and where the memory went
+        peaks: List[float] = []
+
+        def on_turn():
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        tracemalloc.start(10)
+        before = tracemalloc.take_snapshot()
+        await replay(application, scripted, max(1, args.rounds // 4), on_turn=on_turn)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        await application.bot_data[BotData.MEMORY].buffer.flush_async()
+
+    print(f"{turns} turns ({len(CORPUS)} conversations x {args.rounds} rounds), zep {args.zep_latency * 1000:.0f} ms, "
+          f"calendar {args.calendar_latency * 1000:.0f} ms, model {args.model_latency * 1000:.0f} ms, rtt {args.rtt * 1000:.0f} ms")
+    for stage in STAGES:
+        print(f"{stage:<13} {describe(timer.samples[stage])}")
+    print(f"{'peak memory':<13} {describe(peaks, scale=1 / 1024, unit='KiB')}")
+
+    top = after.compare_to(before, "lineno")[:args.top]
+    print("\nAllocation sites (retained after the allocation pass):")
+    for stat in top:
+        frame = stat.traceback[0]
+        print(f"  {stat.size_diff / 1024:9.1f} KiB {stat.count_diff:+7d} blocks  {frame.filename}:{frame.lineno}")
+
+    results = {
+        "turns": turns,
+        "stages": {
+            stage: {"p50_ms": percentile(values, 0.5) * 1000, "p95_ms": percentile(values, 0.95) * 1000}
+            for stage, values in timer.samples.items()
+        },
+        "peak_kib": {"p50": percentile(peaks, 0.5) / 1024, "p95": percentile(peaks, 0.95) / 1024},
+        "replies": len(telegram_bot.sent),
+    }
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.max_p95 is not None and results["stages"]["total"]["p95_ms"] > args.max_p95:
+        print(f"\nTotal p95 {results['stages']['total']['p95_ms']:.1f} ms is over the {args.max_p95:.1f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
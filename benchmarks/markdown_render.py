@@ -0,0 +1,59 @@
+"""
+Micro-benchmark for utils.markdown: cached vs uncached MarkdownV2 rendering.
+
+Run from the repository root:
+    python -m benchmarks.markdown_render [--iterations 2000]
+"""
+
+import argparse
+import time
+
+import telegramify_markdown
+
+from utils import markdown
+
+SAMPLES = {
+    "bars alert": (
+        "Bars Alert\n"
+        "> Your energy is *full*, use it at [gym](https://www.torn.com/gym.php) 💚\n"
+        "> Your nerve is almost full, do some [crime](https://www.torn.com/loader.php?sid=crimes#/) ❤️"
+    ),
+    "email summary": (
+        "📨 *Email Received* \n\n"
+        "📩 *From:* `someone@example.com`\n"
+        "📋 *Subject:* _Meeting moved to 14:00_\n\n"
+        "📝 *Summary*\n\nThe weekly sync moved to 14:00 (room 2.31). Bring the Q3 numbers!\n\n"
+    ),
+    "plain text": "Starting Bounty monitor",
+}
+
+
+def bench(func, text: str, iterations: int) -> float:
+    """Return renders per second."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    markdown.clear_cache()
+    print(f"{'sample':<16}{'uncached/s':>14}{'cached/s':>14}{'speedup':>10}")
+
+    for name, text in SAMPLES.items():
+        assert markdown.markdownify(text) == telegramify_markdown.markdownify(text)
+
+        uncached = bench(telegramify_markdown.markdownify, text, args.iterations)
+        cached = bench(markdown.markdownify, text, args.iterations)
+
+        print(f"{name:<16}{uncached:>14,.0f}{cached:>14,.0f}{cached / uncached:>9.0f}x")
+
+    print(f"\ncache: {markdown.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Update-to-handler latency with long polling vs a webhook.
+
+Starts a fake Bot API server (aiohttp) and a python-telegram-bot Application pointed at it, then
+replays the same message updates in both modes and measures the time from "Telegram has the update"
+to "our handler runs". `--rtt` adds a simulated network round trip between the bot and Telegram.
+
+Run from the repository root:
+    python -m benchmarks.webhook_latency [--updates 200] [--rtt 0.06] [--gap 0.05]
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import time
+from typing import Dict, List
+
+from aiohttp import ClientSession, web
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
+
+TOKEN = "123456:benchmark"
+SECRET = "benchmark-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1, "type": "private", "first_name": "bench"},
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+            "text": f"ping {update_id}",
+        },
+    }
+
+
+class FakeBotApi:
+    """The few Bot API methods python-telegram-bot needs, with getUpdates long polling."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.pending: List[dict] = []
+        self.new_update = asyncio.Event()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post() if request.content_type != "application/json" else await request.json()
+
+        await asyncio.sleep(self.rtt / 2)  # request travelling to Telegram
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self.get_updates(int(data.get("offset", 0) or 0), float(data.get("timeout", 0) or 0))
+        else:  # setWebhook, deleteWebhook, ...
+            result = True
+
+        await asyncio.sleep(self.rtt / 2)  # response travelling back
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_updates(self, offset: int, timeout: float) -> list:
+        self.pending = [u for u in self.pending if u["update_id"] >= offset]
+        if not self.pending and timeout:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(self.new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(self.pending)
+
+    def push(self, update: dict) -> None:
+        self.pending.append(update)
+        self.new_update.set()
+
+
+async def run_mode(mode: str, updates: int, rtt: float, gap: float) -> List[float]:
+    api = FakeBotApi(rtt)
+    api_app = web.Application()
+    api_app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(api_app)
+    await runner.setup()
+    api_port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", api_port).start()
+
+    sent: Dict[int, float] = {}
+    latencies: List[float] = []
+    done = asyncio.Event()
+
+    async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        latencies.append(time.perf_counter() - sent[update.update_id])
+        if len(latencies) == updates:
+            done.set()
+
+    application = ApplicationBuilder().token(TOKEN).base_url(f"http://127.0.0.1:{api_port}/bot").build()
+    application.add_handler(MessageHandler(filters.TEXT, on_message))
+
+    await application.initialize()
+    await application.start()
+
+    webhook_port = free_port()
+    if mode == "polling":
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    else:
+        await application.updater.start_webhook(
+            listen="127.0.0.1",
+            port=webhook_port,
+            url_path="telegram",
+            webhook_url=f"http://127.0.0.1:{webhook_port}/telegram",
+            secret_token=SECRET,
+        )
+
+    async with ClientSession() as session:
+        if mode == "webhook":
+            # Requests without the right secret token must be rejected
+            async with session.post(f"http://127.0.0.1:{webhook_port}/telegram", json=make_update(0)) as response:
+                assert response.status == 403, response.status
+
+        deliveries = []
+        for update_id in range(1, updates + 1):
+            update = make_update(update_id)
+            sent[update_id] = time.perf_counter()
+
+            if mode == "polling":
+                api.push(update)
+            else:
+                async def deliver(update=update):
+                    await asyncio.sleep(rtt / 2)  # Telegram -> bot
+                    await session.post(
+                        f"http://127.0.0.1:{webhook_port}/telegram",
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                    )
+                deliveries.append(asyncio.create_task(deliver()))
+
+            await asyncio.sleep(gap)
+
+        await asyncio.gather(*deliveries)
+        await asyncio.wait_for(done.wait(), timeout=60)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await runner.cleanup()
+
+    return latencies
+
+
+def describe(latencies: List[float]) -> str:
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2] * 1000
+    p95 = ordered[int(len(ordered) * 0.95) - 1] * 1000
+    return f"p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   mean {statistics.mean(ordered) * 1000:7.1f} ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.06, help="simulated bot <-> Telegram round trip in seconds")
+    parser.add_argument("--gap", type=float, default=0.05, help="seconds between replayed updates")
+    args = parser.parse_args()
+
+    print(f"{args.updates} updates, rtt {args.rtt * 1000:.0f} ms, one every {args.gap * 1000:.0f} ms")
+    for mode in ("polling", "webhook"):
+        latencies = await run_mode(mode, args.updates, args.rtt, args.gap)
+        print(f"{mode:<8} {describe(latencies)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
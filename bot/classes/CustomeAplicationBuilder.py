@@ -3,6 +3,7 @@ import asyncio
 from telegram.ext import Application, ApplicationBuilder
 
 from bot.classes.command import Command
+from bot.classes.update_processor import ChatUpdateProcessor
 from bot.classes.watcher import Watcher
 from utils.logging import get_logger
 
@@ -13,6 +14,10 @@ class CustomApplicationBuilder(ApplicationBuilder):
     def build(self) -> Application:
         app = super().build()
 
+        # The per-chat lanes need to know which conversations are active
+        if isinstance(app.update_processor, ChatUpdateProcessor):
+            app.update_processor.application = app
+
         # Register commands
         command_list = []
 
@@ -0,0 +1,92 @@
+"""
+Debounced batching of consecutive messages per chat.
+
+People often send a thought as several short messages, and an album of photos arrives as one
+message per photo. Handling each of them on its own starts one agent run per message, each
+answering only part of what was said. MessageBatcher collects the messages of a chat until none
+arrived for `window` seconds (but at most `max_wait` after the first one) and then hands them to
+the callback together.
+
+`add` returns right away, the callback runs as an application task. That way the chat's assistant
+lane in ChatUpdateProcessor is free for the next message while the batch is still collecting.
+The tasks of one chat are chained, each batch starts only after the previous one finished, so a
+quick text can't overtake a photo whose download is still in progress.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+BatchCallback = Callable[[List[Update], ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+
+@dataclass
+class PendingBatch:
+    context: ContextTypes.DEFAULT_TYPE
+    started: float = field(default_factory=time.monotonic)
+    updates: List[Update] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageBatcher:
+    def __init__(self, callback: BatchCallback, window: float = 1.5, max_wait: float = 6.0):
+        self.callback = callback
+        self.window = window
+        self.max_wait = max_wait
+        self._pending: Dict[Any, PendingBatch] = {}
+        self._running: Dict[Any, asyncio.Task] = {}  # last batch task of each chat
+
+    @classmethod
+    def from_env(cls, callback: BatchCallback) -> "MessageBatcher":
+        return cls(
+            callback,
+            window=float(os.environ.get("MESSAGE_DEBOUNCE", 1.5)),
+            max_wait=float(os.environ.get("MESSAGE_DEBOUNCE_MAX", 6)),
+        )
+
+    def add(self, chat_id: Any, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        batch = self._pending.get(chat_id)
+        if batch is None:
+            batch = self._pending[chat_id] = PendingBatch(context)
+        batch.updates.append(update)
+
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        # Every message restarts the window, but the batch never waits longer than max_wait in total
+        delay = max(0.0, min(self.window, batch.started + self.max_wait - time.monotonic()))
+        batch.timer = asyncio.get_running_loop().call_later(delay, self._flush, chat_id)
+
+    def pending(self, chat_id: Any) -> int:
+        batch = self._pending.get(chat_id)
+        return len(batch.updates) if batch else 0
+
+    def _flush(self, chat_id: Any) -> None:
+        batch = self._pending.pop(chat_id, None)
+        if batch is None:
+            return
+
+        if len(batch.updates) > 1:
+            logger.info("Batched %d messages of chat %s into one run", len(batch.updates), chat_id)
+
+        # Exceptions end up in the application's error handlers, like those of regular handlers
+        task = batch.context.application.create_task(
+            self._run_after(self._running.get(chat_id), batch), update=batch.updates[-1]
+        )
+        self._running[chat_id] = task
+        task.add_done_callback(lambda done: self._running.pop(chat_id, None) if self._running.get(chat_id) is done else None)
+
+    async def _run_after(self, previous: Optional[asyncio.Task], batch: PendingBatch) -> None:
+        if previous is not None:
+            # Its errors were reported by its own task
+            await asyncio.wait([previous])
+        await self.callback(batch.updates, batch.context)
@@ -0,0 +1,86 @@
+"""
+Concurrent update processing with per-chat lanes.
+
+Without concurrent updates python-telegram-bot handles one update at a time, so a slow agent run
+blocks every button press and command behind it. ChatUpdateProcessor processes updates
+concurrently but keeps two ordered lanes per chat:
+
+- interactive: commands, callback queries and anything an active ConversationHandler claims
+- assistant: all other messages, which are batched into agent runs (see MessageBatcher)
+
+Updates in the same lane of the same chat run one after another, so conversation state and the
+assistant's message history stay consistent, while a /settings tap no longer waits for the LLM.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor, ConversationHandler
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Lane:
+    INTERACTIVE = "interactive"
+    ASSISTANT = "assistant"
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently, serialised per chat and lane."""
+
+    def __init__(self, max_concurrent_updates: int = 32):
+        super().__init__(max_concurrent_updates)
+        self.application: Optional[Application] = None
+        self._locks: Dict[Tuple[Any, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._waiting: Dict[Tuple[Any, str], int] = defaultdict(int)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _in_conversation(self, update: Update) -> bool:
+        if self.application is None:
+            return False
+        for handlers in self.application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler) and handler.check_update(update):
+                    return True
+        return False
+
+    def lane(self, update: object) -> Tuple[Any, str]:
+        """Return the (chat, lane) key an update is serialised on."""
+        if not isinstance(update, Update):
+            return None, Lane.INTERACTIVE
+
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        message = update.effective_message
+
+        if update.callback_query is not None:
+            return chat_id, Lane.INTERACTIVE
+        if message is not None and message.text and message.text.startswith("/"):
+            return chat_id, Lane.INTERACTIVE
+        if self._in_conversation(update):
+            return chat_id, Lane.INTERACTIVE
+
+        return chat_id, Lane.ASSISTANT
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.lane(update)
+        logger.debug("Processing update on lane %s of chat %s", key[1], key[0])
+
+        self._waiting[key] += 1
+        try:
+            async with self._locks[key]:
+                await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if self._waiting[key] == 0:
+                # Nobody else is queued on this lane, don't keep a lock per chat around forever
+                self._waiting.pop(key, None)
+                self._locks.pop(key, None)
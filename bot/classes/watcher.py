@@ -1,10 +1,110 @@
+import asyncio
+import random
 import re
+import time as monotonic_time
 from datetime import time, datetime
-from typing import Dict, Type, Optional, Callable, Tuple, Union, TypeVar
-from telegram.ext import Application, ContextTypes
+from typing import Any, ClassVar, Dict, Type, Optional, Callable, Tuple, Union, TypeVar
+from telegram.ext import Application, ContextTypes, Job
+
+from modules.database import MongoDB
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking, track_blocking_calls
+
+logger = get_logger(__name__)
 
 WatcherType = TypeVar('WatcherType', bound='Watcher')
 
+
+class Backend:
+    """Shared backends watchers talk to. Watchers on the same backend are never started together."""
+    TORN = Resource.TORN
+    MONGO = Resource.MONGO
+    IMAP = Resource.IMAP
+
+
+class Overlap:
+    """What to do with a tick that fires while the previous run of the same watcher is still going."""
+    SKIP = "skip"  # Drop the tick
+    QUEUE = "queue"  # Run once the current run finishes (at most one tick is kept waiting)
+
+
+class WatcherStats:
+    """Run accounting for a single watcher."""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.timeouts = 0
+
+        self.last_duration: Optional[float] = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run: Optional[datetime] = None
+
+        self.running = False
+        self.queued = False
+
+    @property
+    def avg_duration(self) -> float:
+        return self.total_duration / self.runs if self.runs else 0.0
+
+    def record(self, duration: float) -> None:
+        self.runs += 1
+        self.last_duration = duration
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        self.last_run = datetime.now()
+
+
+class SchedulePolicy:
+    """
+    Decides when watchers first run and how much jitter each tick gets.
+
+    Every backend group gets its own start offset inside the `spread` window, and the watchers
+    inside a group are placed in consecutive slots `backend_gap` seconds apart. Because the gap is
+    larger than the maximum jitter, watchers sharing a backend keep distinct phases even when their
+    intervals share factors (30/60/90/180), so they don't burst the same API or database together.
+    """
+
+    # Golden ratio fraction, spreads an unknown number of groups evenly over the window
+    _GOLDEN = 0.6180339887
+
+    def __init__(self, spread: float = 30.0, backend_gap: float = 7.0, max_jitter: float = 3.0):
+        self.spread = spread
+        self.backend_gap = backend_gap
+        self.max_jitter = max_jitter
+
+        self._group_offsets: Dict[str, float] = {}
+        self._group_slots: Dict[str, int] = {}
+        self._assigned: Dict[str, float] = {}
+
+    def first_offset(self, name: str, backend: Optional[str]) -> float:
+        """Return the first-run delay in seconds for a watcher, reserving its slot on first call."""
+        if name in self._assigned:
+            return self._assigned[name]
+
+        group = backend or name
+
+        if group not in self._group_offsets:
+            index = len(self._group_offsets)
+            self._group_offsets[group] = (index * self._GOLDEN % 1) * self.spread
+
+        slot = self._group_slots.get(group, 0)
+        self._group_slots[group] = slot + 1
+
+        self._assigned[name] = self._group_offsets[group] + slot * self.backend_gap
+        return self._assigned[name]
+
+    def tick_jitter(self, interval: Optional[float] = None) -> float:
+        """Random delay applied before each run, never more than a tenth of the interval."""
+        limit = self.max_jitter
+        if interval:
+            limit = min(limit, interval / 10)
+        return random.uniform(0, limit)
+
+
 class WatcherMeta(type):
     """Metaclass to auto-register watchers and convert class names to snake_case."""
 
@@ -18,7 +118,7 @@ class WatcherMeta(type):
         super().__init__(name, bases, namespace)
         if getattr(cls, 'watchers', None) is None:
             cls.watchers: Dict[str, Type[Watcher]] = {}
-        if name != 'Watcher':
+        if name != 'Watcher' and not name.startswith('_'):
             cls.watchers[cls.watcher_name] = cls
 
 
@@ -27,13 +127,164 @@ class Watcher(metaclass=WatcherMeta):
     watcher_name: str
     watchers: Dict[str, Type[WatcherType]] = None
     interval: int = 60  # Default interval in seconds
+    first: Optional[float] = None  # None lets the schedule policy pick a staggered start
+    backend: Optional[str] = None  # One of Backend, used to keep watchers on the same backend apart
+    jitter: bool = True  # Apply a small random delay to every tick
+    overlap: str = Overlap.SKIP  # One of Overlap, only one run of a watcher is ever active
+    timeout: Optional[float] = None  # Deadline for a single run in seconds, None means no deadline
+    setting: Union[str, Tuple[str, ...], None] = None  # Settings key(s), the watcher only runs while one is on
+    job_kwargs: Dict[str, Any] = {}  # Extra keyword arguments for the job queue
+
+    policy: ClassVar[SchedulePolicy] = SchedulePolicy()
+    stats: ClassVar[Dict[str, WatcherStats]] = {}
+    jobs: ClassVar[Dict[str, Job]] = {}
+    _locks: ClassVar[Dict[str, asyncio.Lock]] = {}
 
     @classmethod
     def setup(cls, app: Application) -> None:
-        """Schedule the watcher's job with the application's job queue."""
+        """Schedule the watcher's job with the application's job queue, if the watcher is enabled."""
         if app.job_queue is None:
             raise ValueError("Application instance does not have a job queue.")
-        app.job_queue.run_repeating(cls.job, interval=cls.interval, first=0)
+
+        if cls.is_enabled():
+            cls.start(app)
+        else:
+            logger.debug("Watcher %s is disabled, not scheduling it", cls.watcher_name)
+
+    @classmethod
+    def settings_keys(cls) -> Tuple[str, ...]:
+        if cls.setting is None:
+            return ()
+        if isinstance(cls.setting, str):
+            return (cls.setting,)
+        return tuple(cls.setting)
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """A watcher without a setting is always enabled, otherwise any of its settings has to be on."""
+        keys = cls.settings_keys()
+        if not keys:
+            return True
+        db = MongoDB()
+        return any(db.get(key, False) for key in keys)
+
+    @classmethod
+    def is_scheduled(cls) -> bool:
+        return cls.watcher_name in Watcher.jobs
+
+    @classmethod
+    def start(cls, app: Application) -> None:
+        """Add the watcher to the job queue unless it's already there."""
+        if cls.is_scheduled():
+            return
+        Watcher.jobs[cls.watcher_name] = cls.schedule(app)
+        logger.info("Watcher %s scheduled", cls.watcher_name)
+
+    @classmethod
+    def stop(cls) -> None:
+        """Remove the watcher from the job queue. A run that is in progress is allowed to finish."""
+        job = Watcher.jobs.pop(cls.watcher_name, None)
+        if job is not None:
+            job.schedule_removal()
+            logger.info("Watcher %s unscheduled", cls.watcher_name)
+
+    @classmethod
+    def apply_setting(cls, app: Application, key: str) -> None:
+        """Start or stop every watcher bound to `key` after the setting was changed."""
+        for watcher in Watcher.watchers.values():
+            if key not in watcher.settings_keys():
+                continue
+
+            if watcher.is_enabled():
+                watcher.start(app)
+            else:
+                watcher.stop()
+
+    @classmethod
+    def schedule(cls, app: Application) -> Job:
+        """Add the watcher to the job queue. Override for non-repeating schedules."""
+        first = cls.first if cls.first is not None else cls.policy.first_offset(cls.watcher_name, cls.backend)
+        logger.debug("Scheduling %s every %ss, first run in %.1fs", cls.watcher_name, cls.interval, first)
+        return app.job_queue.run_repeating(
+            cls.run, interval=cls.interval, first=first, name=cls.watcher_name, **cls.job_kwargs
+        )
+
+    @classmethod
+    async def offload(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call from the job in the thread pool of the watcher's backend."""
+        return await run_blocking(cls.backend or Resource.DEFAULT, func, *args, **kwargs)
+
+    @classmethod
+    def get_stats(cls) -> WatcherStats:
+        if cls.watcher_name not in Watcher.stats:
+            Watcher.stats[cls.watcher_name] = WatcherStats()
+        return Watcher.stats[cls.watcher_name]
+
+    @classmethod
+    def _lock(cls) -> asyncio.Lock:
+        if cls.watcher_name not in Watcher._locks:
+            Watcher._locks[cls.watcher_name] = asyncio.Lock()
+        return Watcher._locks[cls.watcher_name]
+
+    @classmethod
+    async def run(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Job queue entry point. Applies the per-tick jitter, makes sure only one run of the
+        watcher is active (skipping or queueing the tick according to `overlap`), enforces
+        the `timeout` deadline and records the run in the watcher's stats.
+
+        The deadline cancels the job at its next await. Blocking work done on the event loop can't
+        be interrupted and only times out once it returns, so watchers should offload it with
+        `offload()`/`run_blocking`. Threads of offloaded calls can't be stopped either, after the
+        deadline the run waits for them, so the next tick never does the same work alongside them.
+        """
+        if cls.jitter:
+            await asyncio.sleep(cls.policy.tick_jitter(cls.interval))
+
+        stats = cls.get_stats()
+        lock = cls._lock()
+
+        if lock.locked():
+            if cls.overlap != Overlap.QUEUE or stats.queued:
+                stats.skipped += 1
+                logger.warning("Watcher %s is still running, skipping tick (%d skipped so far)",
+                               cls.watcher_name, stats.skipped)
+                return
+            stats.queued = True
+            logger.info("Watcher %s is still running, queueing tick", cls.watcher_name)
+
+        async with lock:
+            stats.queued = False
+            stats.running = True
+            start = monotonic_time.monotonic()
+
+            try:
+                with track_blocking_calls() as calls:
+                    try:
+                        await asyncio.wait_for(cls.job(context), timeout=cls.timeout)
+                    except asyncio.TimeoutError:
+                        stats.timeouts += 1
+                        logger.error("Watcher %s exceeded its %ss deadline and was cancelled", cls.watcher_name, cls.timeout)
+                        if calls:
+                            # The watcher stays busy (and the lock held) until its threads are done
+                            logger.warning("Watcher %s waits for %d blocking calls still running",
+                                           cls.watcher_name, len(calls))
+                            await asyncio.gather(*(asyncio.wrap_future(call) for call in list(calls)),
+                                                 return_exceptions=True)
+            except Exception:
+                stats.failures += 1
+                raise
+            finally:
+                duration = monotonic_time.monotonic() - start
+                stats.running = False
+                stats.record(duration)
+
+                if cls.interval and duration > cls.interval:
+                    stats.overruns += 1
+                    logger.warning("Watcher %s overran its %ss interval (took %.1fs, %d overruns so far)",
+                                   cls.watcher_name, cls.interval, duration, stats.overruns)
+                else:
+                    logger.debug("Watcher %s finished in %.2fs", cls.watcher_name, duration)
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -46,8 +297,12 @@ def _tuple_to_time(t: Tuple[int, int, int]) -> time:
     return time(*t)
 
 
-def run_repeated(interval=60, first=0, last=None, **kwargs):
-    """Decorator to schedule a repeating job."""
+# Decorator keyword arguments that configure the watcher class instead of the job queue
+_WATCHER_OPTIONS = ("backend", "jitter", "overlap", "timeout", "setting")
+
+
+def run_repeated(interval=60, first=None, last=None, **kwargs):
+    """Decorator to schedule a repeating job. Leave `first` as None to get a staggered start."""
     return _create_watcher_decorator('run_repeating', interval=interval, first=first, last=last, **kwargs)
 
 
@@ -72,10 +327,23 @@ def run_once(when: datetime, **kwargs):
 
 def _create_watcher_decorator(schedule_method: str, **schedule_kwargs):
     """Helper function to create watcher decorators."""
+    options = {key: schedule_kwargs.pop(key) for key in _WATCHER_OPTIONS if key in schedule_kwargs}
+
     def decorator(func: Callable[ [ContextTypes.DEFAULT_TYPE, ...] , None] ) -> Type:
         class_name = func.__name__.capitalize()
-        watcher_cls = type(class_name, (Watcher,), {'job': staticmethod(func)})
-        watcher_cls.setup = classmethod(lambda cls, app: getattr(app.job_queue, schedule_method)(cls.job, **schedule_kwargs))
-        return watcher_cls
+        namespace = {'job': staticmethod(func), **options}
+
+        if schedule_method == 'run_repeating':
+            # Repeating jobs go through Watcher.schedule so they get a staggered start
+            namespace['interval'] = schedule_kwargs.pop('interval')
+            namespace['first'] = schedule_kwargs.pop('first')
+            namespace['job_kwargs'] = schedule_kwargs
+        else:
+            namespace['interval'] = None
+            namespace['schedule'] = classmethod(
+                lambda cls, app: getattr(app.job_queue, schedule_method)(cls.run, name=cls.watcher_name, **schedule_kwargs)
+            )
+
+        return type(class_name, (Watcher,), namespace)
 
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,7 +1,5 @@
-import datetime
-
-import pytz
-
+import asyncio
+from typing import List, Optional, Tuple
 
 from pydantic_ai import Agent, ImageUrl, AudioUrl
 from utils.logging import get_logger
@@ -12,30 +10,18 @@ from telegram import Update
 from telegram.constants import ChatAction
 from telegram.ext import ContextTypes, filters, MessageHandler
 
+from agents.context import live_context
 from bot.classes.command import Command
+from bot.classes.message_batcher import MessageBatcher
 from enums.bot_data import BotData
 from enums.database import DatabaseConstants
 from modules.bot import Bot
+from modules.conversation_history import ConversationHistory
 from modules.database import MongoDB
 from modules.memory import Memory
+from modules.model_router import ModelRouter
 from modules.reminder import Reminders
-
-
-costs = {
-    "gpt-4o": 0.00500 / 1000,
-    "gpt-4o-mini": 0.000150 / 1000,
-    "o3-mini": 1.10 / 1000000
-}
-
-## TODO: Move this to a separate file at some point, it's here to just clean up the main file
-def get_current_time():
-
-    cet = pytz.timezone('CET')
-    current_time_and_date = datetime.datetime.now(cet)
-    current_time_and_date = current_time_and_date.strftime("%H:%M:%S %d/%m/%Y")
-
-    logger.debug("Returning time: %s", current_time_and_date)
-    return {"current_time": current_time_and_date}
+from modules.reply_stream import ReplyStream
 
 
 class Assistant(Command):
@@ -43,82 +29,130 @@ class Assistant(Command):
     priority = -1
     messages = []
 
+    # Updates are processed concurrently, agent runs read and replace the shared message history
+    history_lock = asyncio.Lock()
+
+    # Messages sent in quick succession (or an album) are answered in one run
+    batcher: Optional[MessageBatcher] = None
+
     @classmethod
     def handler(cls, app):
+        cls.batcher = MessageBatcher.from_env(cls.run_batch)
         app.add_handler(MessageHandler((filters.TEXT | filters.PHOTO | filters.VOICE) & ~filters.COMMAND, Assistant.handle), group=0)
 
     @classmethod
     async def handle(cls, update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         logger.debug("Handling message in Assistant command")
-
-        main_agent : Agent = context.bot_data[BotData.MAIN_AGENT]
-        reminder : Reminders = context.bot_data[BotData.REMINDER]
-
-        memory : Memory = context.bot_data.get(BotData.MEMORY, None)
-
-        reminder.chat_id = update.effective_chat.id
-        bot = Bot(context.bot, update.effective_chat.id)
-        context.bot_data[BotData.BOT] = bot
+        logger.debug("Update: %s", update)
 
         ## Change status to typing
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        if not cls.batcher.pending(update.effective_chat.id):
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
 
-        logger.debug("Update: %s", update)
+        cls.batcher.add(update.effective_chat.id, update, context)
+
+    @staticmethod
+    async def _read_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tuple[str, list]:
+        """Text of one message for the prompt and its attachments."""
+        attachments = []
+        notes = []
 
-        ## This whole think is broken as if you send more that one image they all get registered as a separate message
-        photos = []
         if update.message.photo:
             photo = update.message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)  # Renamed to clarify
-            photos.append(file.file_path)
+            file = await context.bot.get_file(photo.file_id)
+            attachments.append(ImageUrl(url=file.file_path))
+            notes.append("Attachment: Photo provided with the message.")
 
-        audio_url = None
         if update.message.voice:
-            audio = update.message.voice
-            file = await context.bot.get_file(audio.file_id)
-            audio_url = file.file_path
-            logger.debug("Audio URL: %s", audio_url)
+            file = await context.bot.get_file(update.message.voice.file_id)
+            logger.debug("Audio URL: %s", file.file_path)
+            attachments.append(AudioUrl(url=file.file_path))
+            notes.append("Attachment: Voice message provided with the message.")
 
         # HH:MM format
         time_text = update.message.date.strftime("%H:%M")
 
-        base_text = update.message.text or update.message.caption or ""
-        base_text = base_text.strip()
+        base_text = (update.message.text or update.message.caption or "").strip()
+        text = f"Send at {time_text}: {base_text or '(no text provided)'}"
+        if notes:
+            text += "\n" + "\n".join(notes)
 
-        direct_request_note = (
-            "This is direct request on telegram and your response is expected with at least one send message. Unless asked otherwise."
-        )
+        return text, attachments
+
+    @classmethod
+    async def run_batch(cls, updates: List[Update], context: ContextTypes.DEFAULT_TYPE):
+        """One agent run answering all messages of a batch."""
+        update = updates[-1]
+
+        main_agent : Agent = context.bot_data[BotData.MAIN_AGENT]
+        reminder : Reminders = context.bot_data[BotData.REMINDER]
+
+        memory : Memory = context.bot_data.get(BotData.MEMORY, None)
 
-        if base_text:
-            composed_text = f"Send at {time_text}: {base_text}\n\n{direct_request_note}"
-        else:
-            composed_text = f"Send at {time_text}: (no text provided)\n\n{direct_request_note}"
+        bot = Bot(context.bot, update.effective_chat.id)
 
-        if photos:
-            logger.info("User sent %d photos", len(photos))
-            composed_text += "\n\nAttachment: Photo provided with the message."
+        texts, attachments = [], []
+        for message_update in updates:
+            text, message_attachments = await cls._read_message(message_update, context)
+            texts.append(text)
+            attachments.extend(message_attachments)
 
-        if audio_url is not None:
-            logger.info("User sent a voice message")
-            composed_text += "\n\nAttachment: Voice message provided with the message."
+        base_text = " ".join((u.message.text or u.message.caption or "").strip() for u in updates).strip()
 
-        message_parts = [composed_text]
+        direct_request_note = (
+            "This is direct request on telegram and your response is expected with at least one send message. Unless asked otherwise."
+        )
+        if len(updates) > 1:
+            direct_request_note = (
+                f"The user sent these {len(updates)} messages in quick succession, answer them together. "
+                + direct_request_note
+            )
 
-        if photos:
-            message_parts.append(ImageUrl(url=photos[0]))
+        if attachments:
+            logger.info("User sent %d attachments", len(attachments))
 
-        if audio_url is not None:
-            message_parts.append(AudioUrl(url=audio_url))
+        message_parts = ["\n".join(texts) + f"\n\n{direct_request_note}", *attachments]
 
+        # Before the live context, so a local memory search already sees these messages
         if memory:
-            memory.add_message(role="User", content=update.message.text or "Text Not Found", role_type="user")
+            for message_update in updates:
+                memory.add_message(role="User", content=message_update.message.text or "Text Not Found", role_type="user")
 
-        messages = context.bot_data.get(BotData.MESSAGE_HISTORY, [])
+        # Goes last so everything before it stays a cacheable prefix, it's dropped from the history afterwards
+        message_parts.append(await live_context(context.application))
 
-        response = await main_agent.run(message_parts, message_history=messages)
+        db = MongoDB()
 
-        context.bot_data[BotData.MESSAGE_HISTORY] = response.all_messages()
+        async with cls.history_lock:
+            # Tools reply through these, so only point them at this chat once it's our turn
+            reminder.chat_id = update.effective_chat.id
+            context.bot_data[BotData.BOT] = bot
+
+            history: ConversationHistory = context.bot_data.setdefault(BotData.MESSAGE_HISTORY, ConversationHistory())
+            messages = history.messages
+            generation = history.generation
+
+            router: ModelRouter = context.bot_data.get(BotData.MODEL_ROUTER) or ModelRouter()
+            route = router.route(base_text, has_media=bool(attachments))
+            run_kwargs = dict(message_history=messages, chat_id=update.effective_chat.id)
+
+            if db.get(DatabaseConstants.STREAM_REPLIES, False):
+                # Show a placeholder right away and fill it in while the reply is generated
+                bot.stream = ReplyStream(bot)
+                await bot.stream.start()
+                try:
+                    response, _ = await router.run(
+                        main_agent, message_parts, route, event_stream_handler=bot.stream.handle_events, **run_kwargs
+                    )
+                finally:
+                    await bot.stream.close()
+                    bot.stream = None
+            else:
+                response, _ = await router.run(main_agent, message_parts, route, **run_kwargs)
+
+            # Compacted to the token budget and persisted
+            await history.replace(response.all_messages(), generation)
 
         tool_calls = {}
         bot_output = ""
@@ -148,13 +182,12 @@ class Assistant(Command):
                 continue
 
             if memory:
-                memory.add_message(
-                    role=tool_call["name"],
-                    content=f"{tool_call['name']}({tool_call['args']}) => {tool_call['output']}",
-                    role_type="tool"
-                )
+                memory.add_message(role=tool_call["name"], content=content, role_type="tool")
+
+        if memory:
+            # Everything this turn added goes to Zep in one request, in the background
+            memory.flush_soon()
 
-        db = MongoDB()
         if db.get(DatabaseConstants.DEBUG, False):
             for tool_call_id, tool_call in tool_calls.items():
                 await bot.send(f"`{tool_call['name']}({tool_call['args']}) => {tool_call['output']}`")
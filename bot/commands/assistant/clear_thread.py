@@ -1,16 +1,21 @@
 from bot.classes.command import command
 from enums.bot_data import BotData
+from modules.conversation_history import ConversationHistory
 from modules.memory import Memory
+from utils.offload import Resource, run_blocking
 
 
 @command
 async def clear_thread(update, context):
     """ Clears the thread """
-    context.bot_data[BotData.MESSAGE_HISTORY] = []
+    # No need to wait for a running agent, the history's generation keeps it from writing the old thread back
+    history: ConversationHistory = context.bot_data.get(BotData.MESSAGE_HISTORY)
+    if history is not None:
+        await history.clear()
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text="Thread cleared."
     )
 
     memory : Memory = context.bot_data.get(BotData.MEMORY, None)
-    memory.clear_memory()
\ No newline at end of file
+    await run_blocking(Resource.HTTP, memory.clear_memory)
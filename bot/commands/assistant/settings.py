@@ -2,6 +2,7 @@ from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ConversationHandler, CommandHandler, CallbackQueryHandler, ContextTypes, Application
 
 from bot.classes.command import Command
+from bot.classes.watcher import Watcher
 from bot.commands.time_table.time_table import cancel
 from modules.database import MongoDB
 
@@ -15,6 +16,7 @@ class SettingsKey:
     # General
     DEBUG = "debug"
     RETRIEVAL = "retrieval"
+    STREAM_REPLIES = "stream_replies"
 
     # Torn - Energy & Nerve
     ENERGY_FULL = "notify_energy_full"
@@ -60,6 +62,7 @@ SETTINGS_PAGES = {
     "⚙️ General": [
         ("Debug", SettingsKey.DEBUG),
         ("Retrieval", SettingsKey.RETRIEVAL),
+        ("Stream Replies", SettingsKey.STREAM_REPLIES),
     ],
     "💚 Torn — Energy & Nerve": [
         ("Energy Full Alert", SettingsKey.ENERGY_FULL),
@@ -173,6 +176,9 @@ class SettingsHandler:
             current_value = db.get(query.data, False)
             db.set(query.data, not current_value)
 
+            # Watchers bound to this setting are added to or removed from the job queue right away
+            Watcher.apply_setting(context.application, query.data)
+
         # Update the message with fresh keyboard on the current page
         current_page = context.user_data.get("settings_page")
         if current_page:
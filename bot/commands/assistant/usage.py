@@ -0,0 +1,44 @@
+"""Show token usage, cost and latency of the main agent per model."""
+
+from datetime import datetime, timedelta
+
+from bot.classes.command import command
+from structures.agent_run import AgentRun
+from utils.offload import Resource, run_blocking
+
+
+def _format_period(title: str, runs: list[AgentRun]) -> str:
+    if not runs:
+        return f"{title}\n  no runs"
+
+    lines = [title]
+    for model, totals in sorted(AgentRun.aggregate(runs).items(), key=lambda item: -item[1]["runs"]):
+        cost = f"${totals['cost']:.4f}"
+        if totals["unpriced_runs"]:
+            cost += f" (+{totals['unpriced_runs']} unpriced)"
+        failed = f" (+{totals['failed_runs']} failed)" if totals["failed_runs"] else ""
+
+        lines.append(
+            f"{model}\n"
+            f"  runs {totals['runs']}{failed}, requests {totals['avg_requests']:.1f}/run, tools {totals['tool_calls']}\n"
+            f"  tokens in {totals['input_tokens']} (cached {totals['cache_ratio']:.0%}), out {totals['output_tokens']}\n"
+            f"  cost {cost}\n"
+            f"  tool schemas not sent ~{totals['tool_tokens_saved']} tokens (mostly cache reads otherwise), "
+            f"lost tool calls {totals['lost_tool_calls']} "
+            f"({totals['lost_tool_call_rate']:.0%})\n"
+            f"  avg {totals['avg_total_time']:.1f}s (LLM {totals['avg_llm_time']:.1f}s, tools {totals['avg_tool_time']:.1f}s)"
+        )
+    return "\n".join(lines)
+
+
+@command
+async def usage(update, context):
+    """Show agent token usage, cost and latency for today and the last 7 days"""
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    week = await run_blocking(Resource.MONGO, AgentRun.since, now - timedelta(days=7))
+    day = [run for run in week if run.started_at >= today]
+
+    text = _format_period("Today (UTC)", day) + "\n\n" + _format_period("Last 7 days", week)
+    await update.message.reply_text("```\n" + text + "\n```", parse_mode="Markdown")
@@ -0,0 +1,58 @@
+"""Show run statistics of all registered watchers."""
+
+from bot.classes.command import command
+from bot.classes.watcher import Watcher
+from modules.outbound import OutboundQueue, Priority
+
+
+def _format_duration(seconds) -> str:
+    if seconds is None:
+        return "-"
+    return f"{seconds:.1f}s"
+
+
+@command
+async def watchers(update, context):
+    """Show watcher run times, skipped ticks and overruns"""
+    lines = []
+
+    for name in sorted(Watcher.watchers):
+        watcher = Watcher.watchers[name]
+        stats = watcher.get_stats()
+
+        if stats.running:
+            state = "running"
+        elif watcher.is_scheduled():
+            state = "idle"
+        else:
+            state = "disabled"
+        if stats.queued:
+            state += " (+1 queued)"
+
+        last_run = stats.last_run.strftime("%H:%M:%S") if stats.last_run else "never"
+
+        lines.append(
+            f"{name} [{state}]\n"
+            f"  every {watcher.interval or '-'}s, last {last_run}\n"
+            f"  runs {stats.runs}, avg {_format_duration(stats.avg_duration)}, "
+            f"max {_format_duration(stats.max_duration)}, last {_format_duration(stats.last_duration)}\n"
+            f"  skipped {stats.skipped}, overruns {stats.overruns}, "
+            f"timeouts {stats.timeouts}, failures {stats.failures}"
+        )
+
+    if not lines:
+        await update.message.reply_text("No watchers registered.")
+        return
+
+    outbound = OutboundQueue.for_bot(context.bot)
+    for priority, name in Priority.NAMES.items():
+        stats = outbound.stats[priority]
+        lines.append(
+            f"outbound {name}\n"
+            f"  queued {outbound.depth(priority)} (max {stats.max_depth}), sent {stats.sent}\n"
+            f"  delay avg {_format_duration(stats.avg_delay)}, max {_format_duration(stats.max_delay)}, "
+            f"last {_format_duration(stats.last_delay)}\n"
+            f"  retries {stats.retries}, failures {stats.failures}"
+        )
+
+    await update.message.reply_text("```\n" + "\n\n".join(lines) + "\n```", parse_mode="Markdown")
@@ -1,6 +1,6 @@
-import telegramify_markdown
 from bot.classes.command import command
 from enums.bot_data import BotData
+from utils.markdown import markdownify
 
 
 @command
@@ -18,7 +18,7 @@ async def now(update, context):
             f"location: {lesson['location']}"
 
 
-    reply = telegramify_markdown.markdownify(reply)
+    reply = markdownify(reply)
 
     await update.message.reply_text(reply, parse_mode="MarkdownV2")
 
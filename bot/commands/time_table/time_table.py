@@ -1,7 +1,6 @@
 import re
 from datetime import datetime
 
-import telegramify_markdown
 
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CommandHandler, CallbackQueryHandler, \
@@ -11,6 +10,7 @@ from bot.classes.command import Command
 from enums.bot_data import BotData
 from modules.timetable import TimeTable
 from utils.logging import get_logger
+from utils.markdown import markdownify
 
 logger = get_logger(__name__)
 
@@ -52,7 +52,7 @@ async def choose(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(telegramify_markdown.markdownify("*Days of the Week*"), reply_markup=reply_markup)
+        await query.edit_message_text(markdownify("*Days of the Week*"), reply_markup=reply_markup)
 
         return LIST_DAYS
 
@@ -72,7 +72,7 @@ async def list_days_to_message(query, context, day):
 
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(telegramify_markdown.markdownify(f"*{day.capitalize()}*"), reply_markup=reply_markup, parse_mode="MarkdownV2")
+    await query.edit_message_text(markdownify(f"*{day.capitalize()}*"), reply_markup=reply_markup, parse_mode="MarkdownV2")
 
 
 async def list_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -13,8 +13,10 @@ from telegram.ext import ContextTypes
 from bot.classes.command import command
 from enums.bot_data import BotData
 from modules.torn import Torn
+from structures.image_cache import CachedImage
 from structures.race_record import RaceResult
 from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -267,7 +269,7 @@ async def racing(update: Update, context: ContextTypes.DEFAULT_TYPE):
     current_skill = float(user["racing"])
 
     # Build timeline from collected race history
-    races = RaceResult.find()
+    races = await run_blocking(Resource.MONGO, RaceResult.find)
     timeline = _build_skill_timeline(races, current_skill)
 
     if not timeline:
@@ -328,8 +330,18 @@ async def racing(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     try:
-        graph = generate_graph(predictions)
-        await update.message.reply_photo(
+        # The graph only changes with a new race or on a new day, reuse the upload until then
+        cache_key = CachedImage.make_key(
+            "racing",
+            skill=current_skill,
+            races=[(point['time'], point['gain']) for point in timeline],
+            day=datetime.utcnow().date(),
+        )
+        graph = await run_blocking(Resource.MONGO, CachedImage.get_file_id, cache_key)
+        if graph is None:
+            graph = await run_blocking(Resource.RENDER, generate_graph, predictions)
+
+        sent = await update.message.reply_photo(
             photo=graph,
             caption=message,
             parse_mode="Markdown"
@@ -337,4 +349,7 @@ async def racing(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error("Failed to generate racing graph: %s", e)
         await update.message.reply_text(message, parse_mode="Markdown")
+    else:
+        if not isinstance(graph, str):
+            await run_blocking(Resource.MONGO, CachedImage.set_file_id, cache_key, sent.photo[-1].file_id)
 
@@ -1,14 +1,16 @@
 """Daily check-in watcher for habit tracking."""
 
+import asyncio
 from datetime import time
 
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton, Update
 from telegram.ext import Application, ContextTypes, CallbackQueryHandler
 
-from bot.classes.watcher import Watcher
+from bot.classes.watcher import Watcher, Backend
 from enums.database import DatabaseConstants
 from modules.database import MongoDB
 from modules.habits import get_active_habits, update_daily_log, get_habit_by_id
+from modules.outbound import OutboundQueue, Priority
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -20,31 +22,32 @@ class DailyCheckin(Watcher):
     # Default check-in time: 9 PM
     checkin_hour = 19
     checkin_minute = 10
+    backend = Backend.MONGO
+    setting = "notify_daily_habit_checkin"
 
     @classmethod
     def setup(cls, app: Application) -> None:
         """Schedule the daily check-in and register callback handlers."""
         logger.info("Setting up DailyCheckin watcher")
 
-        if app.job_queue is None:
-            raise ValueError("Application instance does not have a job queue.")
-
-        # Schedule daily job
-        app.job_queue.run_daily(
-            cls.job,
-            time=time(hour=cls.checkin_hour, minute=cls.checkin_minute),
-        )
+        super().setup(app)
 
         # Register callback handler for habit responses
         app.add_handler(CallbackQueryHandler(cls.handle_habit_response, pattern=r"^habit:"))
 
+    @classmethod
+    def schedule(cls, app: Application):
+        """Schedule the daily job."""
+        return app.job_queue.run_daily(
+            cls.run,
+            time=time(hour=cls.checkin_hour, minute=cls.checkin_minute),
+            name=cls.watcher_name,
+        )
+
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send daily check-in messages."""
-        if not MongoDB().get("notify_daily_habit_checkin", False):
-            return
-
-        chat_id = MongoDB().get(DatabaseConstants.MAIN_CHAT_ID)
+        chat_id = await cls.offload(MongoDB().get, DatabaseConstants.MAIN_CHAT_ID)
 
         if chat_id is None:
             logger.warning("MAIN_CHAT_ID not set, skipping daily check-in")
@@ -54,7 +57,7 @@ class DailyCheckin(Watcher):
             chat_id = int(chat_id)
 
         # Get active habits
-        habits = get_active_habits()
+        habits = await cls.offload(get_active_habits)
 
         if not habits:
             logger.info("No habits to check in for chat %s", chat_id)
@@ -62,9 +65,8 @@ class DailyCheckin(Watcher):
 
         logger.info("Sending daily check-in for %d habits to chat %s", len(habits), chat_id)
 
-        # Send habit check-in messages (all at once)
-        for habit in habits:
-            await cls.send_habit_checkin(context, chat_id, habit)
+        # Queue all check-in messages at once, the outbound queue paces them
+        await asyncio.gather(*(cls.send_habit_checkin(context, chat_id, habit) for habit in habits))
 
     @classmethod
     async def send_habit_checkin(cls, context: ContextTypes.DEFAULT_TYPE, chat_id: int, habit) -> None:
@@ -101,9 +103,10 @@ class DailyCheckin(Watcher):
         }
         emoji = color_emojis.get(habit.color, "📋")
 
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"{emoji} *{habit.name}* — {prompt}",
+        await OutboundQueue.for_bot(context.bot).send_message(
+            chat_id,
+            f"{emoji} *{habit.name}* — {prompt}",
+            priority=Priority.BACKGROUND,
             parse_mode="Markdown",
             reply_markup=InlineKeyboardMarkup(keyboard),
         )
@@ -124,10 +127,10 @@ class DailyCheckin(Watcher):
         chat_id = query.message.chat.id
 
         # Update the daily log
-        update_daily_log(habit_id=habit_id, habit_value=value)
+        await cls.offload(update_daily_log, habit_id=habit_id, habit_value=value)
 
         # Get habit for confirmation message
-        habit = get_habit_by_id(habit_id)
+        habit = await cls.offload(get_habit_by_id, habit_id)
         habit_name = habit.name if habit else "Habit"
 
         # Pick emoji based on color
@@ -4,23 +4,26 @@ import asyncio
 
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton, Update
 from telegram.ext import Application, ContextTypes, CallbackQueryHandler
-from telegramify_markdown import markdownify
 
-from bot.classes.watcher import Watcher
+from bot.classes.watcher import Watcher, Backend
 from enums.bot_data import BotData
 from enums.database import DatabaseConstants
 from modules.database import MongoDB
 from modules.email import Email
+from modules.watcher_state import WatcherState
 from agents.email_summary_agent import Event
 from utils.logging import get_logger
-
-from typing import Dict
+from utils.markdown import markdownify
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
 class EmailSummary(Watcher):
 
     interval = 100
+    backend = Backend.IMAP
+    timeout = 5 * 60  # LLM summaries can be slow, but a stuck IMAP session shouldn't block forever
+    setting = "notify_email_summary"
     email = Email(
         os.getenv("EMAIL_ADDRESS"),
         os.getenv("EMAIL_PASSWORD"),
@@ -34,7 +37,8 @@ class EmailSummary(Watcher):
     email.add_excluded_folder("trash")
     email.add_excluded_folder("Administrativa")
 
-    events : Dict[int, Event] = {}
+    # Events waiting for an "Add to Calendar" / "Ignore" answer, keyed by message id
+    events = WatcherState("email_summary_events")
 
     bot = None
 
@@ -44,10 +48,7 @@ class EmailSummary(Watcher):
 
         logger.info("Setting up EmailSummary watcher")
 
-        if app.job_queue is None:
-            raise ValueError("Application instance does not have a job queue.")
-
-        app.job_queue.run_repeating(cls.job, interval=cls.interval)
+        super().setup(app)
 
         app.add_handler(CallbackQueryHandler(cls.add_event, pattern="add_event"))
         app.add_handler(CallbackQueryHandler(cls.ignore_event, pattern="ignore_event"))
@@ -57,12 +58,9 @@ class EmailSummary(Watcher):
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
 
-        if not MongoDB().get("notify_email_summary", False):
-            return
-
         return ## disable for now
 
-        chat_id = MongoDB().get(DatabaseConstants.EMAIL_CHAT_ID)
+        chat_id = await run_blocking(Resource.MONGO, MongoDB().get, DatabaseConstants.EMAIL_CHAT_ID)
 
         if chat_id is None:
             logger.error("chat_id is not set")
@@ -111,7 +109,7 @@ class EmailSummary(Watcher):
     async def create_event(cls, event: Event) -> bool:
         """Create an event from the callback query and add it to the calendar"""
 
-        chat_id = MongoDB().get(DatabaseConstants.EMAIL_CHAT_ID)
+        chat_id = await run_blocking(Resource.MONGO, MongoDB().get, DatabaseConstants.EMAIL_CHAT_ID)
 
         if chat_id is None:
             logger.error("chat_id is not set")
@@ -141,7 +139,7 @@ class EmailSummary(Watcher):
 
         )
 
-        cls.events[message.id] = event
+        cls.events.set(str(message.id), event.model_dump())
 
         return True
 
@@ -156,14 +154,23 @@ class EmailSummary(Watcher):
 
         calendar = context.bot_data[BotData.CALENDAR]
 
-        event = cls.events.pop(query.message.message_id)
+        event = cls.events.pop(str(query.message.message_id))
+
+        if event is None:
+            logger.warning("No pending event for message %s", query.message.message_id)
+            await query.edit_message_reply_markup(reply_markup=None)
+            return
+
+        event = Event.model_validate(event)
 
         start = None if event.start is None else datetime.datetime.fromisoformat(event.start)
         end = None if event.end is None else datetime.datetime.fromisoformat(event.end)
 
         logger.info("Event is all day: %s", event.all_day)
 
-        calendar.add_event(
+        await run_blocking(
+            Resource.GOOGLE,
+            calendar.add_event,
             start=start,
             end=end,
             summary=event.title,
@@ -196,7 +203,7 @@ class EmailSummary(Watcher):
 
         await query.answer()
 
-        cls.events.pop(query.message.message_id)
+        cls.events.pop(str(query.message.message_id))
         await context.bot.delete_message(
             chat_id=query.message.chat.id,
             message_id=query.message.message_id
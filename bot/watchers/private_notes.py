@@ -1,4 +1,4 @@
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.database import DatabaseConstants
 from modules.database import MongoDB
 from modules.private_notes import get_private_note_count
@@ -6,27 +6,34 @@ from modules.private_notes import get_private_note_count
 PRIVATE_NOTES_COUNT_KEY = "private_notes_last_count"
 
 
-@run_repeated(interval=60)
-async def private_notes_removed(context):
+def _check_removed_notes():
+    """Compare the note count with the last one seen, returns the chat and alert text if notes were removed."""
     db = MongoDB()
     current_count = get_private_note_count()
     previous_count = db.get(PRIVATE_NOTES_COUNT_KEY, None)
 
-    if previous_count is None:
-        db.set(PRIVATE_NOTES_COUNT_KEY, current_count)
-        return
+    db.set(PRIVATE_NOTES_COUNT_KEY, current_count)
+
+    if previous_count is None or current_count >= previous_count:
+        return None
 
-    if current_count < previous_count:
-        chat_id = db.get(DatabaseConstants.MAIN_CHAT_ID)
-        if chat_id is not None:
-            chat_id = int(chat_id)
+    chat_id = db.get(DatabaseConstants.MAIN_CHAT_ID)
+    if chat_id is None:
+        return None
 
-            removed_count = previous_count - current_count
-            if current_count == 0:
-                text = "⚠️ Private notes database was emptied."
-            else:
-                text = f"⚠️ {removed_count} private note(s) were removed."
+    removed_count = previous_count - current_count
+    if current_count == 0:
+        text = "⚠️ Private notes database was emptied."
+    else:
+        text = f"⚠️ {removed_count} private note(s) were removed."
 
-            await context.bot.send_message(chat_id=chat_id, text=text)
+    return int(chat_id), text
 
-    db.set(PRIVATE_NOTES_COUNT_KEY, current_count)
+
+@run_repeated(interval=60, backend=Backend.MONGO)
+async def private_notes_removed(context):
+    alert = await private_notes_removed.offload(_check_removed_notes)
+
+    if alert is not None:
+        chat_id, text = alert
+        await context.bot.send_message(chat_id=chat_id, text=text)
@@ -3,12 +3,12 @@
 from datetime import datetime
 
 from telegram.ext import ContextTypes
-from telegramify_markdown import markdownify
 
-from bot.classes.watcher import run_repeated
-from modules.database import MongoDB
+from bot.classes.watcher import run_repeated, Backend
+from modules.outbound import OutboundQueue, Priority
 from modules.time_capsule import get_pending_capsules, mark_as_sent
 from utils.logging import get_logger
+from utils.markdown import markdownify
 
 logger = get_logger(__name__)
 
@@ -49,14 +49,11 @@ def format_capsule_message(message: str, created_at: datetime) -> str:
 ─────────────────────────"""
 
 
-@run_repeated(interval=1800)  # Check every 30 minutes
+@run_repeated(interval=1800, backend=Backend.MONGO, setting="notify_time_capsule")  # Check every 30 minutes
 async def time_capsule_delivery(context: ContextTypes.DEFAULT_TYPE):
     """Check for and deliver any pending time capsules."""
 
-    if not MongoDB().get("notify_time_capsule", False):
-        return
-
-    pending = get_pending_capsules()
+    pending = await time_capsule_delivery.offload(get_pending_capsules)
     
     if not pending:
         return
@@ -70,13 +67,14 @@ async def time_capsule_delivery(context: ContextTypes.DEFAULT_TYPE):
                 created_at=capsule.created_at
             )
             
-            await context.bot.send_message(
-                chat_id=capsule.chat_id,
-                text=markdownify(formatted_message),
+            await OutboundQueue.for_bot(context.bot).send_message(
+                capsule.chat_id,
+                markdownify(formatted_message),
+                priority=Priority.BACKGROUND,
                 parse_mode="MarkdownV2"
             )
             
-            mark_as_sent(capsule.capsule_id)
+            await time_capsule_delivery.offload(mark_as_sent, capsule.capsule_id)
             logger.info("Delivered time capsule %s", capsule.capsule_id)
             
         except Exception as exc:
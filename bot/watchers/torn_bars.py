@@ -1,12 +1,17 @@
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.bot_data import BotData
 from modules.database import MongoDB
 from modules.torn import Torn
+from utils.offload import Resource, run_blocking
 
-@run_repeated(interval=90)
-async def torn_racing(context: ContextTypes.DEFAULT_TYPE):
+@run_repeated(
+    interval=90,
+    backend=Backend.TORN,
+    setting=("notify_energy_full", "notify_energy_almost_full", "notify_nerve_full", "notify_nerve_almost_full"),
+)
+async def torn_bars(context: ContextTypes.DEFAULT_TYPE):
 
     torn : Torn = context.bot_data.get(BotData.TORN)
     user = await torn.get_user()
@@ -21,19 +26,20 @@ async def torn_racing(context: ContextTypes.DEFAULT_TYPE):
         return
 
     db = MongoDB()
+    notify = await run_blocking(Resource.MONGO, lambda: {key: db.get(key, False) for key in torn_bars.settings_keys()})
 
     if energy.get("current") == energy.get("maximum") and not torn.is_stacking:
-        if db.get("notify_energy_full", False):
+        if notify["notify_energy_full"]:
             message += f"\n> Your energy is *full*, use it at [gym](https://www.torn.com/gym.php) 💚"
     elif energy.get("current") > energy.get("maximum") * 0.9 and not torn.is_stacking:
-        if db.get("notify_energy_almost_full", False):
+        if notify["notify_energy_almost_full"]:
             message += f"\n> Your energy is almost full, use it at [gym](https://www.torn.com/gym.php) 💚"
 
     if nerve.get("current") == nerve.get("maximum"):
-        if db.get("notify_nerve_full", False):
+        if notify["notify_nerve_full"]:
             message += f"\n> Your nerve is *full*, do some [crime](https://www.torn.com/loader.php?sid=crimes#/) ❤️"
     elif nerve.get("current") > nerve.get("maximum") * 0.9:
-        if db.get("notify_nerve_almost_full", False):
+        if notify["notify_nerve_almost_full"]:
             message += f"\n> Your nerve is almost full, do some [crime](https://www.torn.com/loader.php?sid=crimes#/) ❤️"
 
     if message != head:
@@ -2,9 +2,8 @@ from typing import Any, Dict, List, Tuple
 
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import Watcher
+from bot.classes.watcher import Watcher, Backend
 from enums.bot_data import BotData
-from modules.database import MongoDB
 from modules.torn import Torn
 from modules.torn_tasks import get_valid_bounties, watch_player_bounty
 from utils.logging import get_logger
@@ -14,13 +13,11 @@ logger = get_logger(__name__)
 
 class TornBountyWatcher(Watcher):
     interval = 30 * 60
+    backend = Backend.TORN
+    setting = "track_bounties"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        db = MongoDB()
-        if not db.get("track_bounties", False):
-            return
-
         torn = context.application.bot_data.get(BotData.TORN)
         if torn is None:
             logger.warning("Torn instance not available for bounty watcher")
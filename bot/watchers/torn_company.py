@@ -4,12 +4,13 @@ from typing import Optional
 import pytz
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import Watcher
+from bot.classes.watcher import Watcher, Backend
 from enums.bot_data import BotData
 from modules.database import MongoDB
 from modules.torn import Torn
 from modules.torn_tasks import send_stock_report, send_train_status
 from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -31,14 +32,13 @@ class _DailyTornWatcher(Watcher):
     timezone = pytz.timezone("CET")
     interval = 24 * 60 * 60
     target_time = time(0, 0)
+    backend = Backend.TORN
 
     @classmethod
-    def setup(cls, app):
-        if app.job_queue is None:
-            raise ValueError("Application instance does not have a job queue.")
-
-        first = _seconds_until(cls.target_time, cls.timezone)
-        app.job_queue.run_repeating(cls.job, interval=cls.interval, first=first)
+    def schedule(cls, app):
+        # Watchers sharing a target time still get their own backend slot
+        first = _seconds_until(cls.target_time, cls.timezone) + cls.policy.first_offset(cls.watcher_name, cls.backend)
+        return app.job_queue.run_repeating(cls.run, interval=cls.interval, first=first, name=cls.watcher_name)
 
     @classmethod
     def _get_torn(cls, context: ContextTypes.DEFAULT_TYPE) -> Optional[Torn]:
@@ -50,12 +50,10 @@ class _DailyTornWatcher(Watcher):
 
 class TornCompanyUpdateWatcher(_DailyTornWatcher):
     target_time = time(6, 50)
+    setting = "notify_company_update"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if not MongoDB().get("notify_company_update", False):
-            return
-
         torn = cls._get_torn(context)
         if torn is None:
             return
@@ -66,12 +64,10 @@ class TornCompanyUpdateWatcher(_DailyTornWatcher):
 
 class TornStockWatcher(_DailyTornWatcher):
     target_time = time(7, 0)
+    setting = "notify_stock_report"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if not MongoDB().get("notify_stock_report", False):
-            return
-
         torn = cls._get_torn(context)
         if torn is None:
             return
@@ -81,12 +77,10 @@ class TornStockWatcher(_DailyTornWatcher):
 
 class TornTrainWatcher(_DailyTornWatcher):
     target_time = time(7, 0)
+    setting = "notify_train_report"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if not MongoDB().get("notify_train_report", False):
-            return
-
         torn = cls._get_torn(context)
         if torn is None:
             return
@@ -96,12 +90,11 @@ class TornTrainWatcher(_DailyTornWatcher):
 
 class TornStockClearWatcher(Watcher):
     interval = 60
+    backend = Backend.TORN
+    setting = "notify_stock_clear"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if not MongoDB().get("notify_stock_clear", False):
-            return
-
         torn = _DailyTornWatcher._get_torn(context)
         if torn is None:
             return
@@ -118,22 +111,21 @@ class TornStockClearWatcher(Watcher):
             logger.error("Failed to aggregate company stock data in clear watcher: %s", exc)
             return
 
-        last_stock = MongoDB().get("company_stock_count", 0)
+        last_stock = await run_blocking(Resource.MONGO, MongoDB().get, "company_stock_count", 0)
 
         if total_in_stock > last_stock:
             await torn.clear_by_name("send_stock_report")
 
-        MongoDB().set("company_stock_count", total_in_stock)
+        await run_blocking(Resource.MONGO, MongoDB().set, "company_stock_count", total_in_stock)
 
 
 class TornTrainClearWatcher(Watcher):
     interval = 60
+    backend = Backend.TORN
+    setting = "notify_train_clear"
 
     @classmethod
     async def job(cls, context: ContextTypes.DEFAULT_TYPE) -> None:
-        if not MongoDB().get("notify_train_clear", False):
-            return
-
         torn = _DailyTornWatcher._get_torn(context)
         if torn is None:
             return
@@ -146,9 +138,9 @@ class TornTrainClearWatcher(Watcher):
         detailed = torn.company.get("company_detailed", {})
         trains_available = detailed.get("trains_available", 0)
 
-        last_trains = MongoDB().get("company_train_count", 0)
+        last_trains = await run_blocking(Resource.MONGO, MongoDB().get, "company_train_count", 0)
 
         if trains_available < last_trains:
             await torn.clear_by_name("send_train_status")
 
-        MongoDB().set("company_train_count", trains_available)
+        await run_blocking(Resource.MONGO, MongoDB().set, "company_train_count", trains_available)
@@ -1,12 +1,13 @@
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.bot_data import BotData
 from modules.database import MongoDB
 from modules.torn import Torn
+from utils.offload import Resource, run_blocking
 
 # TODO: Loogging
-@run_repeated(interval=180)
+@run_repeated(interval=180, backend=Backend.TORN, setting=("notify_xanax_available", "notify_booster_available"))
 async def torn_cooldowns(context: ContextTypes.DEFAULT_TYPE):
     torn : Torn = context.bot_data.get(BotData.TORN)
 
@@ -16,18 +17,19 @@ async def torn_cooldowns(context: ContextTypes.DEFAULT_TYPE):
     status = user.get("status")
 
     db = MongoDB()
+    notify = await run_blocking(Resource.MONGO, lambda: {key: db.get(key, False) for key in torn_cooldowns.settings_keys()})
 
     message = "*Cooldown Alarms*:"
     ## Tell player to use up their cooldowns if they can
     if status.get("state") == "Okay" or status.get("state") == "Hospital":
 
-        if cooldowns.get("drug") == 0 and db.get("notify_xanax_available", False):
+        if cooldowns.get("drug") == 0 and notify["notify_xanax_available"]:
              message += "\n >Take Xanax 💊 [here](https://www.torn.com/item.php#drugs-items)"
 
         # if cooldowns.get("medical") == 0:  # I mean I could turn it on but I don't want
         #     message += "\n > Use blood bag 💉 [here](https://www.torn.com/factions.php?step=your&type=1#/tab=armoury&start=0&sub=medical)"
 
-        if cooldowns.get("booster") == 0 and db.get("notify_booster_available", False):
+        if cooldowns.get("booster") == 0 and notify["notify_booster_available"]:
             message += "\n > Use boosters 🍺 [here](https://www.torn.com/factions.php?step=your&type=1#/tab=armoury&start=0&sub=boosters)"
 
     if message != "*Cooldown Alarms*:":
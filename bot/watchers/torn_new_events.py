@@ -1,20 +1,16 @@
 from telegram.ext import ContextTypes
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.bot_data import BotData
-from modules.database import MongoDB
 from modules.torn import Torn, remove_between_angle_brackets
+from modules.watcher_state import WatcherState
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
-@run_repeated(interval=30)
+@run_repeated(interval=30, backend=Backend.TORN, setting="notify_torn_events")
 async def torn_new_events(context: ContextTypes.DEFAULT_TYPE):
 
-    if not MongoDB().get("notify_torn_events", False):
-        return
-
-    ## Inits static variable
-    if not hasattr(torn_new_events, "oldest_event"):
-        torn_new_events.oldest_event = 0
+    state = WatcherState("torn_new_events")
+    oldest_event = state.get("oldest_event", 0)
 
     torn : Torn = context.bot_data.get(BotData.TORN)
 
@@ -25,10 +21,12 @@ async def torn_new_events(context: ContextTypes.DEFAULT_TYPE):
     events = []
 
     for event_id in newevents:
-        if newevents[event_id].get("timestamp") > torn_new_events.oldest_event:
-            torn_new_events.oldest_event = newevents[event_id].get("timestamp")
+        if newevents[event_id].get("timestamp") > oldest_event:
+            oldest_event = newevents[event_id].get("timestamp")
             events.append(remove_between_angle_brackets(newevents[event_id].get("event")))
 
+    state.set("oldest_event", oldest_event)
+
     if len(events) > 0:
         logger.info("New event found, sending alert")
         await torn.send("*Events*\n\n" + "\n".join(events), clean=False)
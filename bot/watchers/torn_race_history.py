@@ -2,13 +2,14 @@ from datetime import datetime
 
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.bot_data import BotData
 from enums.database import DatabaseConstants
 from modules.database import MongoDB
 from modules.torn import Torn
 from structures.race_record import RaceResult
 from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -114,13 +115,13 @@ async def _fetch_new_races(torn, known_race_ids, existing_records):
     if not races:
         return 0
 
-    new_records = _parse_races(races, torn, known_race_ids)
+    new_records = await run_blocking(Resource.MONGO, _parse_races, races, torn, known_race_ids)
     return len(new_records)
 
 
 async def _fetch_past_races(torn, known_race_ids, existing_records, db):
     """Fetch one batch of races older than the oldest stored race (backfill)."""
-    if db.get(BACKFILL_COMPLETE_KEY, False):
+    if await run_blocking(Resource.MONGO, db.get, BACKFILL_COMPLETE_KEY, False):
         return 0
 
     to_ts = None
@@ -142,21 +143,21 @@ async def _fetch_past_races(torn, known_race_ids, existing_records, db):
     races = response.get("races", [])
     if not races:
         # No more historical data available — backfill is done
-        db.set(BACKFILL_COMPLETE_KEY, True)
+        await run_blocking(Resource.MONGO, db.set, BACKFILL_COMPLETE_KEY, True)
         logger.info("Race history backfill complete — no more past races found")
         return 0
 
-    new_records = _parse_races(races, torn, known_race_ids)
+    new_records = await run_blocking(Resource.MONGO, _parse_races, races, torn, known_race_ids)
 
     if not new_records:
         # API returned races but none were new — we've caught up
-        db.set(BACKFILL_COMPLETE_KEY, True)
+        await run_blocking(Resource.MONGO, db.set, BACKFILL_COMPLETE_KEY, True)
         logger.info("Race history backfill complete — all past races already stored")
 
     return len(new_records)
 
 
-@run_repeated(interval=3600)
+@run_repeated(interval=3600, backend=Backend.TORN, timeout=15 * 60)
 async def torn_race_history(context: ContextTypes.DEFAULT_TYPE):
     """
     Hourly watcher that collects race history from the Torn API.
@@ -177,16 +178,16 @@ async def torn_race_history(context: ContextTypes.DEFAULT_TYPE):
     if torn is None:
         return
 
-    existing_records = RaceResult.find()
+    existing_records = await run_blocking(Resource.MONGO, RaceResult.find)
     known_race_ids = {r.race_id for r in existing_records}
 
     # 1. Collect new races
     new_count = await _fetch_new_races(torn, known_race_ids, existing_records)
 
     # 2. Backfill past races (one batch per run to stay API-friendly)
-    if not db.get(BACKFILL_COMPLETE_KEY, False):
+    if not await run_blocking(Resource.MONGO, db.get, BACKFILL_COMPLETE_KEY, False):
         # Re-read records so the backfill sees any just-saved new ones
-        existing_records = RaceResult.find()
+        existing_records = await run_blocking(Resource.MONGO, RaceResult.find)
         known_race_ids = {r.race_id for r in existing_records}
         past_count = await _fetch_past_races(torn, known_race_ids, existing_records, db)
     else:
@@ -197,7 +198,7 @@ async def torn_race_history(context: ContextTypes.DEFAULT_TYPE):
     if total > 0:
         logger.info("Saved %d race(s) to history (new: %d, backfill: %d)", total, new_count, past_count)
 
-        chat_id = db.get(DatabaseConstants.MAIN_CHAT_ID)
+        chat_id = await run_blocking(Resource.MONGO, db.get, DatabaseConstants.MAIN_CHAT_ID)
         if chat_id:
             parts = []
             if new_count:
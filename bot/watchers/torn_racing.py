@@ -1,12 +1,13 @@
 from telegram.ext import ContextTypes
 
-from bot.classes.watcher import run_repeated
+from bot.classes.watcher import run_repeated, Backend
 from enums.bot_data import BotData
 from enums.database import DatabaseConstants
 from modules.database import MongoDB
 from modules.torn import Torn
+from utils.offload import Resource, run_blocking
 
-@run_repeated(interval=180)
+@run_repeated(interval=180, backend=Backend.TORN, setting="racing_notifications")
 async def torn_racing(context: ContextTypes.DEFAULT_TYPE):
 
     """
@@ -16,10 +17,6 @@ async def torn_racing(context: ContextTypes.DEFAULT_TYPE):
 
     db = MongoDB()
 
-    # Check if racing notifications are enabled
-    if not db.get("racing_notifications", False):
-        return
-
     torn : Torn = context.bot_data.get(BotData.TORN)
     user = await torn.get_user()
 
@@ -28,6 +25,6 @@ async def torn_racing(context: ContextTypes.DEFAULT_TYPE):
 
     if user["icons"].get("icon17", None) is None:
         await context.bot.send_message(
-            chat_id=db.get(DatabaseConstants.MAIN_CHAT_ID),
+            chat_id=await run_blocking(Resource.MONGO, db.get, DatabaseConstants.MAIN_CHAT_ID),
             text="You are not in race. Join now https://www.torn.com/racing.php"
         )
\ No newline at end of file
@@ -12,6 +12,7 @@ class BotData(Enum):
     REMINDER = "reminder"
     TIMETABLE = "timetable"
     MAIN_AGENT = "client"
+    MODEL_ROUTER = "model_router"
 
     MEMORY = "memory"
 
@@ -10,4 +10,6 @@ class DatabaseConstants(str, Enum):
 
     FILE_MANAGER = "file_manager"
 
-    DEBUG = "debug"
\ No newline at end of file
+    DEBUG = "debug"
+
+    STREAM_REPLIES = "stream_replies"
\ No newline at end of file
@@ -1,5 +1,6 @@
 #!/usr/bin/python3
 
+import asyncio
 import glob
 import importlib
 import os
@@ -13,18 +14,25 @@ from telegram.ext import Defaults
 
 from agents.main_agent import initialize_main_agent
 from bot.classes.CustomeAplicationBuilder import CustomApplicationBuilder
+from bot.classes.update_processor import ChatUpdateProcessor
 from enums.database import DatabaseConstants
 from modules.calendar import Calendar
+from modules.conversation_history import ConversationHistory
 from modules.database import MongoDB, Document
 import structures  # Import triggers Document subclass registration
 from modules.location_manager import LocationManager
+from modules.local_index import LocalIndex
 from modules.memory import Memory
+from modules.outbound import OutboundQueue
 
 from modules.timetable import TimeTable
 from modules.tools import init_file_manager
 from modules.torn import Torn
+from modules.watcher_state import WatcherState
 from enums.bot_data import BotData
+from utils.ingestion import run_application
 from utils.logging import get_logger, setup_logging
+from utils.offload import LoopBlockMonitor
 
 logger = get_logger(__name__)
 
@@ -42,6 +50,12 @@ setup_logging()
 chat_id = None
 ct = None
 
+
+async def post_shutdown(application):
+    # Outbound workers would otherwise be destroyed while pending
+    await OutboundQueue.stop_all()
+
+
 if __name__ == '__main__':
 
 
@@ -58,6 +72,8 @@ if __name__ == '__main__':
                    .token(os.environ.get("TELEGRAM_KEY"))
                    .pool_timeout(10)
                    .defaults(defaults)
+                   .concurrent_updates(ChatUpdateProcessor(32))
+                   .post_shutdown(post_shutdown)
                    .build()
                    )
 
@@ -75,6 +91,12 @@ if __name__ == '__main__':
     # Initialize MongoDB indexes for all Document subclasses
     Document.ensure_all_indexes()
 
+    # Restore watcher progress (seen events, reported emails, alert message ids) from the last run
+    WatcherState.load_all()
+
+    # The agent's conversation continues where it left off before the restart
+    application.bot_data[BotData.MESSAGE_HISTORY] = ConversationHistory.load()
+
     chat_id = MongoDB().get(DatabaseConstants.MAIN_CHAT_ID, None)
 
     API_KEY = MongoDB().get(DatabaseConstants.TORN_API_KEY, "")
@@ -89,9 +111,15 @@ if __name__ == '__main__':
     application.bot_data[BotData.MEMORY] = Memory(
         user_id="user",
         api_key=os.environ.get('ZEP_API_KEY'),
-        first_name="User"
+        first_name="User",
+        local_index=LocalIndex(application.bot_data[BotData.FILE_MANAGER].root),
     )
 
     initialize_main_agent(application)
 
-    application.run_polling()
+    block_monitor = LoopBlockMonitor.from_env()
+    if block_monitor:
+        block_monitor.start(asyncio.get_event_loop())
+
+    # Long polling by default, TELEGRAM_MODE=webhook switches to a webhook server
+    run_application(application)
@@ -0,0 +1,179 @@
+"""
+Per-run accounting for the main agent: tokens, estimated cost and where the time went.
+
+`run_timed` times every node of the run. Model request nodes count as LLM time, tool call nodes as
+tool time. Without an event stream handler the nodes are timed while iterating `agent.iter`, with
+one the handler is wrapped and passed to `Agent.run`, which calls it for the duration of every node. `record_run` stores the result as an AgentRun document,
+which /usage aggregates per model.
+
+Costs come from the genai-prices data pydantic-ai ships with (`ModelResponse.cost()`). OpenRouter
+":free" models cost nothing, models without a known price are stored with `cost=None`.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, List, Optional, Tuple
+
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import (
+    AgentStreamEvent,
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    ModelMessage,
+    ModelResponse,
+)
+
+from modules.tool_selection import ToolSelection
+from structures.agent_run import AgentRun
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class RunTimings:
+    total_time: float = 0.0
+    llm_time: float = 0.0
+    tool_time: float = 0.0
+
+
+async def run_timed(agent: Agent, user_prompt: Any, event_stream_handler=None, **kwargs) -> Tuple[AgentRunResult, RunTimings]:
+    """`agent.run`, also returning how long the model requests and the tool calls took."""
+    timings = RunTimings()
+    start = time.perf_counter()
+
+    if event_stream_handler is not None:
+        # Agent.run calls the handler once per model request and tool call node, for as long as it runs
+        result = await agent.run(
+            user_prompt, event_stream_handler=_timed_handler(event_stream_handler, timings, start), **kwargs
+        )
+    else:
+        async with agent.iter(user_prompt, **kwargs) as agent_run:
+            node, node_started = None, start
+
+            # A node runs between being yielded and the next node being yielded
+            async for next_node in agent_run:
+                _add_node_time(agent, timings, node, time.perf_counter() - node_started)
+                node, node_started = next_node, time.perf_counter()
+
+            _add_node_time(agent, timings, node, time.perf_counter() - node_started)
+        result = agent_run.result
+
+    timings.total_time = time.perf_counter() - start
+    return result, timings
+
+
+def _add_node_time(agent: Agent, timings: RunTimings, node, elapsed: float) -> None:
+    if node is None:
+        return
+    if agent.is_model_request_node(node):
+        timings.llm_time += elapsed
+    elif agent.is_call_tools_node(node):
+        timings.tool_time += elapsed
+
+
+def _timed_handler(handler, timings: RunTimings, start: float):
+    """
+    Wrap an event stream handler to time the nodes it gets the events of. Agent.run sends the model
+    request before calling the handler, so the time since the previous node ended counts too.
+    """
+    node_ended = start
+
+    async def timed(ctx, stream: AsyncIterable[AgentStreamEvent]) -> None:
+        nonlocal node_ended
+        tools = False
+
+        async def events():
+            nonlocal tools
+            async for event in stream:
+                # Tool call nodes only emit these, model request nodes never do
+                tools = tools or isinstance(event, (FunctionToolCallEvent, FunctionToolResultEvent))
+                yield event
+
+        wrapped = events()
+        try:
+            await handler(ctx, wrapped)
+            # The node only ends once its stream is consumed, count the rest too
+            async for _ in wrapped:
+                pass
+        finally:
+            now = time.perf_counter()
+            if tools:
+                timings.tool_time += now - node_ended
+            else:
+                timings.llm_time += now - node_ended
+            node_ended = now
+
+    return timed
+
+
+def estimate_cost(messages: List[ModelMessage]) -> Optional[float]:
+    """Summed cost of the model responses in USD, None if any of them has an unknown price."""
+    cost = 0.0
+    for message in messages:
+        if not isinstance(message, ModelResponse):
+            continue
+        if message.model_name and message.model_name.endswith(":free"):
+            continue
+        try:
+            cost += float(message.cost().total_price)
+        except (LookupError, AssertionError):
+            return None
+    return cost
+
+
+async def record_run(
+    result: AgentRunResult,
+    timings: RunTimings,
+    model_name: str,
+    chat_id: Optional[int] = None,
+    tier: Optional[str] = None,
+    escalation: Optional[str] = None,
+) -> AgentRun:
+    usage = result.usage()
+    new_messages = result.new_messages()
+    selection = ToolSelection.pop_stats(result.run_id)
+
+    run = AgentRun(
+        model=model_name,
+        chat_id=chat_id,
+        tier=tier,
+        escalation=escalation,
+        requests=usage.requests,
+        tool_calls=usage.tool_calls,
+        input_tokens=usage.input_tokens,
+        cached_tokens=usage.cache_read_tokens,
+        cache_write_tokens=usage.cache_write_tokens,
+        output_tokens=usage.output_tokens,
+        cost=estimate_cost(new_messages),
+        total_time=timings.total_time,
+        llm_time=timings.llm_time,
+        tool_time=timings.tool_time,
+    )
+    if selection and selection.requests:
+        run.tools_offered = selection.tools_offered / selection.requests
+        run.tools_total = selection.tools_total // selection.requests
+        run.tool_tokens_saved = selection.tokens_saved
+        run.lost_tool_calls = selection.lost_tool_calls
+
+    logger.info(
+        "Agent run on %s: %d requests, %d tool calls, %d input tokens, %d cached (%.0f%%), %d output tokens, "
+        "cost %s, %.2fs total (LLM %.2fs, tools %.2fs)",
+        run.model, run.requests, run.tool_calls, run.input_tokens, run.cached_tokens,
+        100 * run.cached_tokens / run.input_tokens if run.input_tokens else 0, run.output_tokens,
+        f"${run.cost:.5f}" if run.cost is not None else "unknown", run.total_time, run.llm_time, run.tool_time,
+    )
+    if run.tools_offered is not None:
+        logger.info(
+            "Tool selection: %.1f/%d tools per request, ~%d tokens saved, %d lost tool calls",
+            run.tools_offered, run.tools_total, run.tool_tokens_saved, run.lost_tool_calls,
+        )
+
+    try:
+        await run_blocking(Resource.MONGO, run.save)
+    except Exception as e:
+        logger.error("Failed to store agent run: %s", e)
+
+    return run
@@ -0,0 +1,140 @@
+"""
+Alert slots: one on-screen message per recurring alert, updated in place.
+
+Recurring alerts (bars, cooldowns, events) used to send a new message and delete the previous one
+on every update, two API calls even when nothing changed. A slot remembers the message it showed
+last and
+
+- does nothing when the rendered text is identical,
+- edits the message when the text changed,
+- only sends a new message (and deletes the old one) when the user should get a fresh notification.
+
+By default a fresh notification is sent when the new text has lines the old one didn't have, so a
+new alert pings the user while an alert going away or a counter changing is edited silently.
+
+Usage:
+    slots = AlertSlots(bot, chat_id, state=WatcherState("torn"))
+    await slots.post("torn_bars", markdownify(text), parse_mode="MarkdownV2")
+    await slots.clear("torn_bars")
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import telegram
+from telegram.error import BadRequest
+
+from modules.outbound import OutboundQueue, Priority
+from modules.watcher_state import WatcherState
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class AlertSlots:
+    """Named alert messages in a single chat, optionally persisted in a WatcherState."""
+
+    STATE_KEY = "alert_slots"
+
+    def __init__(self, bot: telegram.Bot, chat_id, state: Optional[WatcherState] = None,
+                 priority: int = Priority.BACKGROUND):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.state = state
+        self.priority = priority
+        self._slots: Dict[str, Dict[str, Any]] = state.get(self.STATE_KEY, {}) if state else {}
+
+    @property
+    def outbound(self) -> OutboundQueue:
+        return OutboundQueue.for_bot(self.bot)
+
+    def message_id(self, name: str) -> Optional[int]:
+        slot = self._slots.get(name)
+        return slot["message_id"] if slot else None
+
+    def _save(self, name: str, message_id: Optional[int], text: Optional[str] = None) -> None:
+        if message_id is None:
+            self._slots.pop(name, None)
+        else:
+            self._slots[name] = {"message_id": message_id, "text": text}
+        if self.state is not None:
+            self.state.set(self.STATE_KEY, self._slots)
+
+    @staticmethod
+    def _has_new_lines(old: str, new: str) -> bool:
+        return bool(set(new.splitlines()) - set(old.splitlines()))
+
+    async def post(self, name: str, text: str, parse_mode: Optional[str] = None,
+                   notify: Optional[bool] = None) -> Optional[telegram.Message]:
+        """
+        Show `text` in the slot.
+
+        Args:
+            name: Slot name, usually the watcher's name.
+            text: Already rendered text (e.g. markdownified).
+            parse_mode: Telegram parse mode of the text.
+            notify: True always sends a new message, False always edits, None (default) sends a new
+                    message only when the text has new lines.
+
+        Returns:
+            The sent or edited message, None when nothing had to be done.
+        """
+        slot = self._slots.get(name)
+
+        if slot is not None:
+            if slot["text"] == text and not notify:
+                return None
+
+            if notify is False or (notify is None and not self._has_new_lines(slot["text"] or "", text)):
+                edited, message = await self._edit(slot["message_id"], text, parse_mode)
+                if edited:
+                    self._save(name, slot["message_id"], text)
+                    return message
+
+        return await self.send_new(name, text, parse_mode)
+
+    async def send_new(self, name: str, text: str, parse_mode: Optional[str] = None,
+                       delete_previous: bool = True) -> telegram.Message:
+        """Send a new message into the slot, deleting the previous one unless told not to."""
+        previous_id = self.message_id(name)
+
+        message = await self.outbound.send_message(self.chat_id, text, priority=self.priority, parse_mode=parse_mode)
+        self._save(name, message.message_id, text)
+
+        if previous_id is not None and delete_previous:
+            await self._delete(previous_id)
+
+        return message
+
+    async def clear(self, name: str) -> None:
+        """Delete the slot's message, if it has one."""
+        message_id = self.message_id(name)
+        if message_id is None:
+            return
+        await self._delete(message_id)
+        self._save(name, None)
+
+    async def _edit(self, message_id: int, text: str, parse_mode: Optional[str]) -> Tuple[bool, Optional[telegram.Message]]:
+        """Edit a message, returns (False, None) when it can't be edited (deleted by the user, too old, ...)."""
+        try:
+            message = await self.outbound.call(
+                self.bot.edit_message_text,
+                self.chat_id,
+                priority=self.priority,
+                message_id=message_id,
+                text=text,
+                parse_mode=parse_mode,
+            )
+            return True, message
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True, None
+            logger.debug("Could not edit alert message %s, sending a new one: %s", message_id, e)
+            return False, None
+
+    async def _delete(self, message_id: int) -> None:
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=message_id)
+        except Exception as e:
+            logger.debug("Failed to delete message (likely already deleted): %s", e)
@@ -1,12 +1,18 @@
+import itertools
+
 import telegram
-import telegramify_markdown
 
 from io import BytesIO
-from typing import Optional
+from typing import Optional, Union
 
 from telegram import InputFile
 
+from modules.alert_slots import AlertSlots
+from modules.outbound import OutboundQueue, Priority
+from structures.image_cache import CachedImage
 from utils.logging import get_logger
+from utils.markdown import markdownify, split_message
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -16,41 +22,42 @@ class Bot:
     Wrapper around telegram.Bot to make sending messages consistent across the bot
     """
 
-    def __init__(self, bot: telegram.Bot, chat_id):
+    def __init__(self, bot: telegram.Bot, chat_id, priority: int = Priority.INTERACTIVE):
         self.bot: telegram.Bot = bot
         self.chat_id = chat_id
-        self.last_messages = {}  # Tracks last message sent by caller_id
+        self.priority = priority
+        self.outbound = OutboundQueue.for_bot(bot)
+        self.alerts = AlertSlots(bot, chat_id, priority=priority)  # Last message sent by caller_id
+        self.stream = None  # ReplyStream of the agent run in progress, if streaming is enabled
 
     async def send(self, text, clean=True, markdown=True, caller_id=None):
         try:
+            if self.stream is not None and self.stream.active:
+                # The reply has been streamed into a placeholder already, finish it there
+                return await self.stream.finalize(text, markdown=markdown)
 
-            if len(text) > 4096:
-                for i in range(0, len(text), 4000):
-                    part = text[i:i + 4000]
-                    await self.send(part, clean=clean, markdown=markdown, caller_id=caller_id)
+            parse_mode = "MarkdownV2" if markdown else None
 
+            # Long texts are split at paragraph/code block boundaries into messages under Telegram's limit
+            chunks = split_message(text, render=markdownify if markdown else None)
+            first = next(chunks, None)
+            second = next(chunks, None)
 
-            if markdown:
-                text = telegramify_markdown.markdownify(text)
+            if first is None:
+                return None
 
-            message = await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=text,
-                parse_mode="MarkdownV2" if markdown else None,
-            )
+            if caller_id and clean and second is None:
+                # Updates the caller's previous message in place instead of delete + re-send
+                return await self.alerts.post(caller_id, first, parse_mode=parse_mode)
 
-            if caller_id and clean:
-                try:
-                    previous_message = self.last_messages.get(caller_id)
-                    if previous_message:
-                        await self.bot.delete_message(
-                            chat_id=self.chat_id,
-                            message_id=previous_message.message_id,
-                        )
-                except Exception as e:
-                    logger.error("Failed to clean last message: %s", e)
-
-                self.last_messages[caller_id] = message
+            message = None
+            for chunk in itertools.chain([first], [second] if second is not None else [], chunks):
+                message = await self.outbound.send_message(
+                    self.chat_id,
+                    chunk,
+                    priority=self.priority,
+                    parse_mode=parse_mode,
+                )
 
             return message
 
@@ -61,7 +68,7 @@ class Bot:
     async def edit(self, message, text, markdown=True):
         try:
             if markdown:
-                text = telegramify_markdown.markdownify(text)
+                text = markdownify(text)
 
             message = await self.bot.edit_message_text(
                 chat_id=self.chat_id,
@@ -77,31 +84,40 @@ class Bot:
 
     async def send_photo(
         self,
-        photo: BytesIO,
+        photo: Union[BytesIO, str],
         caption: Optional[str] = None,
         markdown: bool = True,
         filename: str = "image.png",
+        cache_key: Optional[str] = None,
     ):
         """
         Send an in-memory image to the configured chat.
 
         Args:
             photo: BytesIO containing the image data (e.g. PNG). Will be read from its current position.
+                   A str is sent as the file_id of an already uploaded image.
             caption: Optional caption text.
             markdown: If True, caption is markdownified and sent as MarkdownV2.
             filename: Filename used for Telegram's upload metadata.
+            cache_key: CachedImage key to store the file_id of the upload under.
         """
         try:
             if caption and markdown:
-                caption = telegramify_markdown.markdownify(caption)
+                caption = markdownify(caption)
 
-            input_file = InputFile(photo, filename=filename)
+            input_file = photo if isinstance(photo, str) else InputFile(photo, filename=filename)
 
-            return await self.bot.send_photo(
-                chat_id=self.chat_id,
-                photo=input_file,
+            message = await self.outbound.send_photo(
+                self.chat_id,
+                input_file,
+                priority=self.priority,
                 caption=caption,
                 parse_mode="MarkdownV2" if (caption and markdown) else None,
             )
+
+            if cache_key and not isinstance(photo, str) and message and message.photo:
+                await run_blocking(Resource.MONGO, CachedImage.set_file_id, cache_key, message.photo[-1].file_id)
+
+            return message
         except Exception as exc:
             logger.error("Error sending photo: %s", exc)
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
+from modules.context_snapshot import ContextEvent, ContextSnapshot
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -89,6 +90,7 @@ class Calendar:
                 }
 
         service.events().insert(calendarId=self.calendar_id, body=event).execute()
+        ContextSnapshot.invalidate(ContextEvent.CALENDAR)
 
 
     def list_calendars(self):
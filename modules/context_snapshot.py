@@ -0,0 +1,219 @@
+"""
+Cached context snapshots for the agent's prompt.
+
+The agent's instructions used to be rebuilt from scratch on every turn: a Calendar API call, every
+StaticLocation and LocationRecord from Mongo, a Zep round trip and a read of every /memory file.
+That data rarely changes between two messages. Each part is now a provider whose rendered text is
+kept until one of these happens:
+
+- its `ttl` runs out
+- one of its `events` is fired with `ContextSnapshot.invalidate(event)`, e.g. by the location
+  manager when the user changes location or by the calendar after inserting an event
+- its `version` callable returns something different, e.g. the mtimes of the /memory files
+
+Providers that do need a rebuild are gathered concurrently, each in the thread pool of its
+`resource` and bounded by its own `timeout`. A provider that is too slow or fails doesn't hold up
+the reply: its last (expired) text is used if there is one, otherwise its `fallback`, and the
+rebuild keeps running in the background to be picked up by the next turn. Turns arriving while
+it runs get the previous text (or the fallback) right away instead of starting another one.
+
+Usage:
+    ContextSnapshot.register("calendar", build_calendar, ttl=300, events=(ContextEvent.CALENDAR,),
+                             resource=Resource.GOOGLE, timeout=3)
+    text = ContextSnapshot.get("calendar")
+    calendar, memory = await ContextSnapshot.gather("calendar", "memory")
+
+    ContextSnapshot.invalidate(ContextEvent.CALENDAR)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
+
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+
+class ContextEvent:
+    LOCATION = "location"
+    CALENDAR = "calendar"
+    MEMORY = "memory"
+
+
+@dataclass
+class ContextProvider:
+    name: str
+    build: Callable[[], str]
+    ttl: float
+    events: Tuple[str, ...] = ()
+    version: Optional[Callable[[], Any]] = None
+    resource: str = Resource.DEFAULT
+    timeout: float = 5.0
+    fallback: str = ""
+
+    value: Optional[str] = None
+    built_at: float = 0.0
+    built_version: Any = None
+
+    hits: int = 0
+    misses: int = 0
+    last_build: float = 0.0  # seconds the last rebuild took
+
+    calls: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    last_latency: float = 0.0  # seconds the last gather waited for this provider
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # The build running in the pool, shared by every turn until it finishes. A timeout only stops
+    # waiting for it, the thread keeps going, so starting another one would only queue up behind it.
+    pending: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    def is_fresh(self, version: Any) -> bool:
+        if self.value is None:
+            return False
+        if time.monotonic() - self.built_at >= self.ttl:
+            return False
+        return version == self.built_version
+
+    def get(self) -> str:
+        # One rebuild at a time, a second caller waits for it instead of building the same text again
+        with self.lock:
+            version = self.version() if self.version else None
+
+            if self.is_fresh(version):
+                self.hits += 1
+                return self.value
+
+            start = time.perf_counter()
+            self.value = self.build()
+            self.last_build = time.perf_counter() - start
+            self.built_at = time.monotonic()
+            self.built_version = version
+            self.misses += 1
+
+            logger.debug("Rebuilt context '%s' in %.3fs", self.name, self.last_build)
+            return self.value
+
+    async def aget(self) -> str:
+        """`get` in the provider's thread pool, giving up after `timeout` seconds."""
+        if self.pending is not None and not self.pending.done():
+            # An earlier turn's rebuild is still running (or hanging), waiting for it again would add
+            # the whole timeout to every reply until it returns
+            logger.debug("Context '%s' is still being rebuilt, using the previous text", self.name)
+            return self.value if self.value is not None else self.fallback
+
+        start = time.perf_counter()
+        self.pending = asyncio.ensure_future(run_blocking(self.resource, self.get))
+        self.pending.add_done_callback(_consume_exception)
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.pending), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning("Context '%s' took longer than %.1fs, leaving it out of this turn", self.name, self.timeout)
+        except Exception as e:
+            self.errors += 1
+            logger.error("Context '%s' failed: %s", self.name, e)
+        finally:
+            latency = time.perf_counter() - start
+            self.calls += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+
+        # Expired text is better than nothing, it was only dropped if something invalidated it
+        return self.value if self.value is not None else self.fallback
+
+    def invalidate(self) -> None:
+        self.value = None
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Builds nobody waited for anymore fail silently, the error was logged if someone did
+    if not future.cancelled():
+        future.exception()
+
+
+class ContextSnapshot:
+    """Registry of the context providers, by name."""
+
+    _providers: ClassVar[Dict[str, ContextProvider]] = {}
+
+    @classmethod
+    def register(
+        cls,
+        name: str,
+        build: Callable[[], str],
+        ttl: float,
+        events: Tuple[str, ...] = (),
+        version: Optional[Callable[[], Any]] = None,
+        resource: str = Resource.DEFAULT,
+        timeout: float = 5.0,
+        fallback: str = "",
+    ) -> ContextProvider:
+        provider = ContextProvider(
+            name=name,
+            build=build,
+            ttl=ttl,
+            events=tuple(events),
+            version=version,
+            resource=resource,
+            timeout=timeout,
+            fallback=fallback,
+        )
+        cls._providers[name] = provider
+        return provider
+
+    @classmethod
+    def get(cls, name: str) -> str:
+        return cls._providers[name].get()
+
+    @classmethod
+    async def gather(cls, *names: str) -> List[str]:
+        """Get several snapshots concurrently, in the given order. Unregistered names give ""."""
+        async def empty() -> str:
+            return ""
+
+        start = time.perf_counter()
+        texts = await asyncio.gather(*(
+            cls._providers[name].aget() if name in cls._providers else empty() for name in names
+        ))
+        logger.debug("Gathered context %s in %.3fs", ", ".join(names), time.perf_counter() - start)
+        return list(texts)
+
+    @classmethod
+    def invalidate(cls, event: str) -> None:
+        """Drop every snapshot that depends on `event`, it's rebuilt the next time it's needed."""
+        for provider in cls._providers.values():
+            if event in provider.events:
+                provider.invalidate()
+                logger.debug("Context '%s' invalidated by %s", provider.name, event)
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        for provider in cls._providers.values():
+            provider.invalidate()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "hits": p.hits,
+                "misses": p.misses,
+                "last_build": p.last_build,
+                "timeouts": p.timeouts,
+                "errors": p.errors,
+                "last_latency": p.last_latency,
+                "max_latency": p.max_latency,
+                "avg_latency": p.total_latency / p.calls if p.calls else 0.0,
+            }
+            for name, p in cls._providers.items()
+        }
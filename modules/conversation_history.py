@@ -0,0 +1,231 @@
+"""
+Bounded message history for the main agent.
+
+The whole `response.all_messages()` used to be passed back on every turn, so prompt tokens grew with
+the length of the conversation until /clear_thread. ConversationHistory keeps it under a token
+budget:
+
+- large tool returns are cut down to `tool_return_limit` characters
+- photos and voice messages are replaced with a short note (Telegram file URLs expire anyway)
+- per-request instructions, system prompt parts and the live context attached to user messages
+  are dropped, only the ones of the current request are ever used
+- when the history is still over `token_budget`, the oldest turns are evicted and condensed into a
+  short summary of what the user asked and what was answered, which is kept at the start
+
+The compacted history is stored in the "conversation_history" collection, so a restart doesn't
+reset the conversation.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import ClassVar, List, Optional
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from modules.database import MongoDB
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+SUMMARY_HEADER = "Summary of the earlier conversation (older messages were removed to save space):"
+# Per-turn context appended to the user's message (time, position, ...), only valid for that turn
+LIVE_CONTEXT_HEADER = "LIVE CONTEXT (as of this message):"
+
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    """Rough token count, ~4 characters per token of the serialized messages."""
+    if not messages:
+        return 0
+    return len(ModelMessagesTypeAdapter.dump_json(messages)) // 4
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class ConversationHistory:
+    """The main agent's message history, compacted to a token budget and persisted."""
+
+    COLLECTION = "conversation_history"
+
+    token_budget: ClassVar[int] = 20000
+    keep_turns: ClassVar[int] = 3  # newest turns that are never evicted, whatever their size
+    tool_return_limit: ClassVar[int] = 1500
+    summary_limit: ClassVar[int] = 4000  # characters of summary, oldest lines go first
+    summary_line_limit: ClassVar[int] = 240
+
+    def __init__(self, key: str = "main"):
+        self.key = key
+        self.messages: List[ModelMessage] = []
+        self.summary: str = ""
+        # Bumped by clear(), a run that started before it must not write the old thread back
+        self.generation = 0
+
+    @classmethod
+    def load(cls, key: str = "main") -> ConversationHistory:
+        history = cls(key)
+        try:
+            doc = MongoDB().collection(cls.COLLECTION).find_one({"_id": key})
+        except Exception as e:
+            logger.error("Failed to load conversation history: %s", e)
+            doc = None
+
+        if doc:
+            try:
+                history.messages = ModelMessagesTypeAdapter.validate_python(doc.get("messages", []))
+                history.summary = doc.get("summary", "")
+            except Exception as e:
+                logger.error("Stored conversation history is invalid, starting a new one: %s", e)
+
+        logger.info("Loaded conversation history with %d messages", len(history.messages))
+        return history
+
+    def save(self) -> None:
+        MongoDB().collection(self.COLLECTION).update_one(
+            {"_id": self.key},
+            {"$set": {
+                "messages": ModelMessagesTypeAdapter.dump_python(self.messages, mode="json"),
+                "summary": self.summary,
+            }},
+            upsert=True,
+        )
+
+    async def replace(self, messages: List[ModelMessage], generation: Optional[int] = None) -> None:
+        """
+        Take the messages of a finished run, compact and persist them. With `generation` (read when
+        the run started) they are dropped if the history was cleared meanwhile.
+        """
+        if generation is not None and generation != self.generation:
+            logger.info("History was cleared during the run, dropping its messages")
+            return
+        self.messages = self.compact(messages)
+        try:
+            await run_blocking(Resource.MONGO, self.save)
+        except Exception as e:
+            logger.error("Failed to save conversation history: %s", e)
+
+    async def clear(self) -> None:
+        self.generation += 1
+        self.summary = ""
+        await self.replace([])
+
+    # Compaction
+
+    def compact(self, messages: List[ModelMessage]) -> List[ModelMessage]:
+        messages = [self._collapse(message) for message in messages]
+        turns = self._turns(messages)
+
+        before = estimate_tokens(messages)
+        evicted = []
+        while len(turns) > self.keep_turns and estimate_tokens([m for turn in turns for m in turn]) > self.token_budget:
+            evicted.append(turns.pop(0))
+
+        if evicted:
+            lines = [self._describe(turn) for turn in evicted]
+            self.summary = self._trim_summary("\n".join(filter(None, [self.summary, *lines])))
+
+        compacted = [m for turn in turns for m in turn]
+        if self.summary and compacted:
+            compacted[0] = self._with_summary(compacted[0])
+
+        if evicted:
+            logger.info(
+                "Compacted conversation history from ~%d to ~%d tokens, %d turns summarised",
+                before, estimate_tokens(compacted), len(evicted),
+            )
+        return compacted
+
+    def _collapse(self, message: ModelMessage) -> ModelMessage:
+        if isinstance(message, ModelRequest):
+            parts = []
+            for part in message.parts:
+                if isinstance(part, ToolReturnPart):
+                    content = part.model_response_str()
+                    if len(content) > self.tool_return_limit:
+                        omitted = len(content) - self.tool_return_limit
+                        part = dataclasses.replace(
+                            part, content=f"{content[:self.tool_return_limit]}\n[... {omitted} characters omitted]"
+                        )
+                elif isinstance(part, UserPromptPart):
+                    if isinstance(part.content, str) and part.content.startswith(SUMMARY_HEADER):
+                        continue  # Re-added after compaction, with whatever got evicted this time
+                    if not isinstance(part.content, str):
+                        part = dataclasses.replace(part, content="\n\n".join(
+                            item if isinstance(item, str) else f"[{getattr(item, 'kind', 'attachment')} omitted]"
+                            for item in part.content
+                            if not (isinstance(item, str) and item.startswith(LIVE_CONTEXT_HEADER))
+                        ))
+                elif isinstance(part, SystemPromptPart):
+                    continue  # The system prompt is sent with the instructions
+                parts.append(part)
+            return dataclasses.replace(message, parts=parts, instructions=None)
+        return message
+
+    @staticmethod
+    def _turns(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+        """Split into turns, each starting with the request carrying the user's prompt."""
+        turns: List[List[ModelMessage]] = []
+        for message in messages:
+            starts_turn = isinstance(message, ModelRequest) and any(
+                isinstance(part, UserPromptPart) for part in message.parts
+            )
+            if starts_turn or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _describe(self, turn: List[ModelMessage]) -> Optional[str]:
+        """One summary line: what the user asked, what was sent back and which tools were used."""
+        asked, answered, tools = "", [], []
+        for message in turn:
+            for part in message.parts:
+                if isinstance(part, UserPromptPart) and isinstance(part.content, str) and not asked:
+                    asked = part.content.split("\n\n")[0]
+                elif isinstance(part, ToolCallPart):
+                    if part.tool_name == "send_telegram_message":
+                        answered.append(str(part.args_as_dict().get("text", "")))
+                    else:
+                        tools.append(part.tool_name)
+                elif isinstance(message, ModelResponse) and isinstance(part, TextPart):
+                    answered.append(part.content)
+
+        if not asked and not answered:
+            return None
+
+        line = f"- User: {_shorten(asked, self.summary_line_limit)}"
+        if answered:
+            line += f" | Assistant: {_shorten(' '.join(answered), self.summary_line_limit)}"
+        if tools:
+            line += f" (tools: {', '.join(dict.fromkeys(tools))})"
+        return line
+
+    def _trim_summary(self, summary: str) -> str:
+        lines = summary.split("\n")
+        while len(lines) > 1 and sum(len(line) + 1 for line in lines) > self.summary_limit:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _with_summary(self, message: ModelMessage) -> ModelMessage:
+        part = UserPromptPart(content=f"{SUMMARY_HEADER}\n{self.summary}")
+        if isinstance(message, ModelRequest):
+            return dataclasses.replace(message, parts=[part, *message.parts])
+        return message
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __repr__(self) -> str:
+        return f"ConversationHistory({self.key!r}, {len(self.messages)} messages, ~{estimate_tokens(self.messages)} tokens)"
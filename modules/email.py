@@ -2,10 +2,15 @@ from imap_tools import MailBox, AND
 import os
 
 from agents.email_summary_agent import get_email_summary_agent, EmailResponse
+from modules.watcher_state import WatcherState
 from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
+# Only the most recent uids are kept, older mails won't show up as unread again
+MAX_REPORTED = 1000
+
 
 class Email:
 
@@ -16,7 +21,7 @@ class Email:
         self.port = port
         self.excluded_folders = []
         self.spam_folder = "spam"
-        self.reported = []
+        self.state = WatcherState(f"email:{address}")
 
         self.client = get_email_summary_agent()
 
@@ -27,6 +32,15 @@ class Email:
     def set_spam_folder(self, folder):
         self.spam_folder = folder
 
+    @property
+    def reported(self):
+        return self.state.get("reported", [])
+
+    def mark_reported(self, uid):
+        reported = self.reported
+        reported.append(uid)
+        self.state.set("reported", reported[-MAX_REPORTED:])
+
 
     def get_mailboxes(self):
         with MailBox(self.imap_server).login(self.address, self.password) as mailbox:
@@ -53,15 +67,16 @@ class Email:
 
     async def summarize_new(self):
         summary = []
-        unread = self.get_unread_emails()
+        unread = await run_blocking(Resource.IMAP, self.get_unread_emails)
+        reported = set(self.reported)
 
         for e in unread:
-            if e.uid not in self.reported:
+            if e.uid not in reported:
                 response : EmailResponse = (await self.client.run(f"{e.subject} {e.text} \n timestamp: {e.date.isoformat()}")).output
-                self.reported.append(e.uid)
+                self.mark_reported(e.uid)
 
                 if response.spam:
-                    self.move_email(e, self.spam_folder)
+                    await run_blocking(Resource.IMAP, self.move_email, e, self.spam_folder)
 
                 summary.append((e, response))
 
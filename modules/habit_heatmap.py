@@ -21,6 +21,7 @@ from modules.habits import (
     get_habit_by_id,
     HABIT_COLORS,
 )
+from structures.image_cache import CachedImage
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -181,6 +182,29 @@ def generate_habit_heatmap(
     )
 
 
+def heatmap_cache_key(habit_id: str, period: str = "last_30_days") -> Optional[str]:
+    """
+    CachedImage key for a heatmap, changes whenever the rendered image would.
+
+    Returns None if the habit doesn't exist.
+    """
+    habit = get_habit_by_id(habit_id)
+    if not habit:
+        return None
+
+    start_date, end_date, period_label = _parse_period(period)
+    logs = get_logs_for_period(start_date, end_date)
+
+    return CachedImage.make_key(
+        "heatmap",
+        habit=habit.model_dump(include={"habit_id", "name", "habit_type", "options", "color"}),
+        start=start_date,
+        end=end_date,
+        label=period_label,
+        values={log.date: log.habits.get(habit.habit_id) for log in logs},
+    )
+
+
 def _render_heatmap(
     title: str,
     start_date: date,
@@ -0,0 +1,365 @@
+"""
+Local full-text index over the agent's files and past messages.
+
+Zep is a remote service: its context is a request on every rebuild and the agent gets nothing from
+it when it is slow or down. LocalIndex keeps a small BM25 index in memory that answers in
+milliseconds:
+
+- files in the agent's storage (/memory, /daily and anything uploaded or written there, without
+  /logs), cut into paragraph chunks and re-indexed when their mtime or size changes
+- messages passed to Memory.add_message, also appended to a local JSONL file (`MEMORY_INDEX_FILE`)
+  so the last `max_messages` are indexed again after a restart
+
+Words are scored with BM25, character trigrams of the words with a lower weight on top, so typos
+and other word forms ("meeting" / "meetings") still match.
+
+Usage:
+    index = LocalIndex(file_manager.root)
+    index.add_message("user", "the spare key is under the mat")
+    hits = index.search("where is the key", k=3)
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have i in is it its me my of on or so that the this "
+    "to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def trigrams(words: Iterable[str]) -> List[str]:
+    grams = []
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def chunk_text(text: str, limit: int = 600) -> List[str]:
+    """Split into chunks of whole paragraphs (lines for long paragraphs) of at most ~limit characters."""
+    chunks: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        pieces = [paragraph] if len(paragraph) <= limit else paragraph.splitlines()
+        for piece in pieces:
+            piece = piece.strip()
+            if not piece:
+                continue
+            while len(piece) > limit:
+                cut = piece.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                chunks.append(piece[:cut])
+                piece = piece[cut:].strip()
+            if current and len(current) + len(piece) + 2 > limit:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class Hit:
+    score: float
+    source: str
+    key: str
+    text: str
+
+
+@dataclass
+class _Chunk:
+    key: str
+    source: str
+    text: str
+
+
+class _Field:
+    """Postings and lengths of one tokenisation, scored with BM25."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, chunk_id: int, terms: List[str]) -> None:
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+        self.lengths[chunk_id] = len(terms)
+        self.total_length += len(terms)
+
+    def remove(self, chunk_id: int, terms: Iterable[str]) -> None:
+        for term in set(terms):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(chunk_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(chunk_id, 0)
+
+    def score(self, terms: List[str], scores: Dict[int, float], weight: float = 1.0, max_df: float = 1.0) -> None:
+        """Add the BM25 scores of `terms` to `scores`. Terms in more than `max_df` of the chunks are skipped."""
+        count = len(self.lengths)
+        if not count:
+            return
+        average = self.total_length / count or 1
+        limit = max_df * count
+        for term in set(terms):
+            docs = self.postings.get(term)
+            if not docs or len(docs) > limit:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for chunk_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + weight * idf * tf * (self.k1 + 1) / norm
+
+
+class LocalIndex:
+    chunk_chars: int = 600
+    max_messages: int = 2000
+    max_file_size: int = 1_000_000
+    rescan_interval: float = 10.0  # seconds between checks for changed files
+    trigram_weight: float = 0.3
+    # Trigrams like " th" are in nearly every chunk, scoring their postings costs far more than the
+    # little they add. Typos only need the rarer trigrams of a word to match.
+    trigram_max_df: float = 0.05
+    relative_cutoff: float = 0.35
+    skip_dirs: Tuple[str, ...] = ("logs",)
+
+    def __init__(self, root: Optional[Path] = None, messages_file: Optional[str] = None):
+        self.root = Path(root).resolve() if root is not None else None
+        self.messages_path = Path(messages_file or os.environ.get("MEMORY_INDEX_FILE", "memory_index.jsonl"))
+
+        self._words = _Field()
+        self._grams = _Field()
+        self._chunks: Dict[int, _Chunk] = {}
+        self._terms: Dict[int, Tuple[List[str], List[str]]] = {}
+        self._by_key: Dict[str, List[int]] = {}
+        self._next_id = 0
+
+        self._files: Dict[str, Tuple[int, int]] = {}  # key -> (mtime_ns, size) when indexed
+        self._scanned_at = 0.0
+        self._messages: Deque[str] = deque()  # keys, oldest first
+        self._message_count = 0
+        self._lock = threading.RLock()
+        self._scan_lock = threading.Lock()
+
+        self._load_messages()
+        self.refresh_files(force=True)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    # Documents
+
+    def upsert(self, key: str, source: str, text: str) -> None:
+        """(Re)index a document under `key`, replacing its previous chunks."""
+        with self._lock:
+            self.remove(key)
+            ids = []
+            for piece in chunk_text(text, self.chunk_chars):
+                words = tokenize(piece)
+                if not words:
+                    continue
+                grams = trigrams(words)
+                chunk_id = self._next_id
+                self._next_id += 1
+                self._chunks[chunk_id] = _Chunk(key, source, piece)
+                self._terms[chunk_id] = (words, grams)
+                self._words.add(chunk_id, words)
+                self._grams.add(chunk_id, grams)
+                ids.append(chunk_id)
+            if ids:
+                self._by_key[key] = ids
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            for chunk_id in self._by_key.pop(key, []):
+                words, grams = self._terms.pop(chunk_id)
+                self._words.remove(chunk_id, words)
+                self._grams.remove(chunk_id, grams)
+                del self._chunks[chunk_id]
+
+    # Messages
+
+    def add_message(self, role: str, content: str, persist: bool = True) -> None:
+        text = f"{role}: {content}"
+        with self._lock:
+            key = f"message:{self._message_count}"
+            self._message_count += 1
+            self.upsert(key, "message", text)
+            self._messages.append(key)
+            while len(self._messages) > self.max_messages:
+                self.remove(self._messages.popleft())
+
+            if persist:
+                try:
+                    with open(self.messages_path, "a", encoding="utf-8") as file:
+                        file.write(json.dumps({"role": role, "content": content, "at": time.time()}) + "\n")
+                except OSError as e:
+                    logger.error("Failed to persist message for the local index: %s", e)
+
+    def recent_messages(self, count: int = 3, role: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(key, content) of the newest messages, oldest first, optionally only those of one role."""
+        found = []
+        with self._lock:
+            for key in reversed(self._messages):
+                chunk_ids = self._by_key.get(key)
+                if not chunk_ids:
+                    continue
+                message_role, _, content = "\n\n".join(self._chunks[chunk_id].text for chunk_id in chunk_ids).partition(": ")
+                if role is None or message_role == role:
+                    found.append((key, content))
+                    if len(found) == count:
+                        break
+        return found[::-1]
+
+    def _load_messages(self) -> None:
+        if not self.messages_path.exists():
+            return
+        try:
+            lines = self.messages_path.read_text(encoding="utf-8").splitlines()
+        except OSError as e:
+            logger.error("Failed to read %s: %s", self.messages_path, e)
+            return
+
+        for line in lines[-self.max_messages:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self.add_message(entry.get("role", "user"), entry.get("content", ""), persist=False)
+
+        if len(lines) > 2 * self.max_messages:
+            # Only the newest messages are ever loaded, don't let the file grow forever
+            tmp = self.messages_path.with_suffix(self.messages_path.suffix + ".tmp")
+            tmp.write_text("\n".join(lines[-self.max_messages:]) + "\n", encoding="utf-8")
+            os.replace(tmp, self.messages_path)
+
+        logger.info("Indexed %d past messages from %s", len(self._messages), self.messages_path)
+
+    # Files
+
+    def refresh_files(self, force: bool = False) -> int:
+        """Re-index files that changed since the last scan, returns how many were (re)indexed or removed."""
+        if self.root is None or not self.root.is_dir():
+            return 0
+        if not force and time.monotonic() - self._scanned_at < self.rescan_interval:
+            return 0
+
+        # Files are listed and read without holding the index lock, Memory.add_message on the
+        # event loop needs it. A scan already running in another thread is enough.
+        if not self._scan_lock.acquire(blocking=False):
+            return 0
+        changed = 0
+        seen = set()
+        try:
+            self._scanned_at = time.monotonic()
+            for path in self.root.rglob("*"):
+                relative = path.relative_to(self.root)
+                if relative.parts[0] in self.skip_dirs or not path.is_file():
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+
+                key = f"file:/{relative.as_posix()}"
+                seen.add(key)
+                fingerprint = (stat.st_mtime_ns, stat.st_size)
+                if self._files.get(key) == fingerprint:
+                    continue
+
+                self._files[key] = fingerprint
+                changed += 1
+                if stat.st_size > self.max_file_size:
+                    self.remove(key)
+                    continue
+                try:
+                    text = path.read_text(encoding="utf-8")
+                except (UnicodeDecodeError, OSError):
+                    self.remove(key)
+                    continue
+
+                source = relative.parts[0] if len(relative.parts) > 1 and relative.parts[0] in ("memory", "daily") else "file"
+                self.upsert(key, source, f"{relative.as_posix()}\n{text}")
+
+            for key in set(self._files) - seen:
+                del self._files[key]
+                self.remove(key)
+                changed += 1
+        finally:
+            self._scan_lock.release()
+
+        if changed:
+            logger.debug("Local index: %d files changed, %d chunks", changed, len(self._chunks))
+        return changed
+
+    # Search
+
+    def search(self, query: str, k: int = 5, sources: Optional[Iterable[str]] = None, min_score: float = 1.0,
+               exclude: Iterable[str] = ()) -> List[Hit]:
+        """Best matching chunks. Hits scoring under `relative_cutoff` of the best one are dropped, they
+        are usually trigram noise. `exclude` are document keys to leave out."""
+        self.refresh_files()
+
+        words = tokenize(query)
+        if not words:
+            return []
+        allowed = set(sources) if sources else None
+        excluded = set(exclude)
+
+        with self._lock:
+            scores: Dict[int, float] = {}
+            self._words.score(words, scores)
+            self._grams.score(trigrams(words), scores, self.trigram_weight, self.trigram_max_df)
+
+            hits = []
+            ranked = sorted(
+                ((chunk_id, score) for chunk_id, score in scores.items()
+                 if self._chunks[chunk_id].key not in excluded
+                 and (allowed is None or self._chunks[chunk_id].source in allowed)),
+                key=lambda item: -item[1],
+            )
+            cutoff = max(min_score, ranked[0][1] * self.relative_cutoff) if ranked else min_score
+            for chunk_id, score in ranked:
+                if score < cutoff:
+                    break
+                chunk = self._chunks[chunk_id]
+                hits.append(Hit(score, chunk.source, chunk.key, chunk.text))
+                if len(hits) == k:
+                    break
+        return hits
+
+    @staticmethod
+    def format_hits(hits: List[Hit], limit: int = 400) -> str:
+        lines = []
+        for hit in hits:
+            text = " ".join(hit.text.split())
+            text = text if len(text) <= limit else text[:limit] + "…"
+            origin = hit.key[len("file:"):] if hit.key.startswith("file:") else hit.source
+            lines.append(f"- [{origin}] {text}")
+        return "\n".join(lines)
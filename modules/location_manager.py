@@ -4,6 +4,7 @@ from typing import Self
 from pydantic import ConfigDict
 from geopy.distance import geodesic
 
+from modules.context_snapshot import ContextEvent, ContextSnapshot
 from modules.database import Document
 
 
@@ -187,6 +188,8 @@ class LocationManager:
                 entered=datetime.now()
             )
 
+            ContextSnapshot.invalidate(ContextEvent.LOCATION)
+
         self.last_location = (latitude, longitude)
         self.last_location_timestamp = datetime.now()
         self._cleanup_old_records()
@@ -221,6 +224,7 @@ class LocationManager:
             radius=radius
         )
         new_location.save(key_field="name")
+        ContextSnapshot.invalidate(ContextEvent.LOCATION)
 
     def closest_location(self, latitude: float, longitude: float, k: int = 1) -> list[StaticLocation]:
         """
@@ -257,3 +261,4 @@ class LocationManager:
         Remove a static location by its name.
         """
         StaticLocation.delete_one(name=name)
+        ContextSnapshot.invalidate(ContextEvent.LOCATION)
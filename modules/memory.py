@@ -1,22 +1,226 @@
+import asyncio
+import atexit
 import os
+import threading
 import uuid
 import json
-from typing import Literal
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
 
 from zep_cloud.client import Zep
 from zep_cloud.types import Message
 
+from modules.context_snapshot import ContextEvent, ContextSnapshot
+from modules.local_index import LocalIndex
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+
+class MessageBuffer:
+    """
+    Zep messages waiting to be written, journaled to a local JSONL file.
+
+    `add_message` used to be one blocking Zep request per message, on the event loop or in a tool's
+    thread. Messages are now appended to the buffer (and the journal, so a crash doesn't lose them)
+    and written with one `thread.add_messages` call per thread in the background:
+
+    - `flush_soon()` at the end of a turn sends everything buffered during it
+    - anything else is sent `flush_delay` seconds after it was added
+    - a failed write keeps the messages and is retried with backoff, up to `max_retry_delay`
+    - a batch Zep rejects for good (other 4xx, e.g. a deleted thread) is moved to
+      `<journal>.rejected` so it doesn't block everything after it
+
+    The journal is written outside the agent's file storage, `MEMORY_BUFFER_FILE` sets its path.
+    Messages left in it by a previous run are sent to their original thread with the first flush.
+    """
+
+    flush_delay: float = 5.0
+    retry_delay: float = 5.0
+    max_retry_delay: float = 300.0
+    max_batch: int = 30  # messages per add_messages request
+
+    def __init__(self, client, path: Optional[str] = None):
+        self.client = client
+        self.path = Path(path or os.environ.get("MEMORY_BUFFER_FILE", "zep_buffer.jsonl"))
+
+        self._pending: List[Dict[str, Any]] = self._read_journal()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one write to Zep at a time, keeps the order
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None  # at most one flush in flight
+        self._failures = 0
+
+        if self._pending:
+            logger.info("Found %d unsent Zep messages in %s", len(self._pending), self.path)
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        pending = []
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                pending.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping damaged line in %s", self.path)
+        return pending
+
+    def _write_journal(self) -> None:
+        """Rewrite the journal with what is still pending, called with the lock held."""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(entry) + "\n" for entry in self._pending)
+        os.replace(tmp, self.path)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def rejected_path(self) -> Path:
+        return self.path.with_suffix(self.path.suffix + ".rejected")
+
+    def _set_aside(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            with open(self.rejected_path, "a", encoding="utf-8") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in batch)
+        except OSError as e:
+            logger.error("Failed to keep rejected Zep messages: %s", e)
+
+    def add(self, thread_id: str, role_type: str, content: str) -> None:
+        entry = {"thread_id": thread_id, "role": role_type, "content": content}
+        with self._lock:
+            self._pending.append(entry)
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.error("Failed to journal Zep message: %s", e)
+        self._schedule(self.flush_delay)
+
+    def flush_soon(self) -> None:
+        if self._pending:
+            self._schedule(0)
+
+    def _schedule(self, delay: float) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a worker thread or a script, the next flush on the loop (or at exit) sends it
+            return
+
+        if self._flushing is not None:
+            # The running flush sends these messages too, or schedules the next one when it's done
+            return
+
+        if self._timer is not None and not self._timer.cancelled():
+            # Don't let new messages cut the backoff short while Zep is failing
+            if self._failures or delay >= self._timer.when() - loop.time():
+                return
+            self._timer.cancel()
+
+        def _start_flush():
+            self._timer = None
+            self._flushing = loop.create_task(self._flush_task())
+
+        self._timer = loop.call_later(delay, _start_flush)
+
+    async def _flush_task(self) -> None:
+        try:
+            sent = await self.flush_async()
+        finally:
+            self._flushing = None
+
+        if sent:
+            self._failures = 0
+            if self._pending:
+                # Added after the write had already finished with the batch
+                self._schedule(0)
+        else:
+            self._failures += 1
+            delay = min(self.retry_delay * 2 ** (self._failures - 1), self.max_retry_delay)
+            logger.warning("Retrying Zep write of %d messages in %.0fs", len(self), delay)
+            self._schedule(delay)
+
+    async def flush_async(self) -> bool:
+        """`flush` in an HTTP worker thread."""
+        if not self._pending:
+            return True
+        return await run_blocking(Resource.HTTP, self.flush)
+
+    def flush(self) -> bool:
+        """Send the pending messages, oldest first. Returns False when Zep couldn't be reached."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return True
+                    thread_id = self._pending[0]["thread_id"]
+                    batch = []
+                    for entry in self._pending:
+                        if entry["thread_id"] != thread_id or len(batch) == self.max_batch:
+                            break
+                        batch.append(entry)
+
+                try:
+                    self.client.thread.add_messages(
+                        thread_id=thread_id,
+                        messages=[Message(role=entry["role"], content=entry["content"]) for entry in batch],
+                        ignore_roles=["system", "tool", "assistant"],
+                    )
+                except Exception as e:
+                    if _retryable(e):
+                        logger.error("Failed to write %d messages to Zep: %s", len(batch), e)
+                        return False
+                    # Retrying a rejected batch would block every later write, set it aside instead
+                    logger.error("Zep rejected %d messages, moving them to %s: %s", len(batch), self.rejected_path, e)
+                    self._set_aside(batch)
+
+                with self._lock:
+                    # Messages added meanwhile were appended after the batch
+                    del self._pending[:len(batch)]
+                    try:
+                        self._write_journal()
+                    except OSError as e:
+                        logger.error("Failed to update Zep message journal: %s", e)
+
+
+def _retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, 5xx and 429 are worth retrying, other 4xx won't change."""
+    status = getattr(error, "status_code", None)
+    if not isinstance(status, int):
+        return True
+    return status >= 500 or status in (408, 429)
+
 
 class Memory:
+    """
+    Zep memory with a LocalIndex next to it. Messages go to both. When Zep fails the context and
+    graph searches come from the local index instead, with `MEMORY_BACKEND=local` Zep isn't used
+    at all (no API key needed).
+    """
 
-    def __init__(self, user_id, api_key=None, first_name=None):
+    def __init__(self, user_id, api_key=None, first_name=None, client=None, buffer_file: Optional[str] = None,
+                 local_index: Optional[LocalIndex] = None):
+        """`client` is an existing Zep client to use instead of creating one with the API key."""
         self.api_key = api_key or os.environ.get('ZEP_API_KEY')
+        self.offline = client is None and os.environ.get("MEMORY_BACKEND", "zep").lower() == "local"
+        self.local = local_index if local_index is not None else LocalIndex()
+        self.user_id = user_id
 
-        if not self.api_key:
+        if self.offline:
+            logger.info("Zep disabled, memory is served from the local index")
+            self.client = None
+            self.buffer = None
+            self.session_id = uuid.uuid4().hex
+            return
+
+        if client is None and not self.api_key:
             raise ValueError("ZEP_API_KEY not provided or not found in environment.")
 
-        self.user_id = user_id
-        self.client = Zep(api_key=self.api_key)
+        self.client = client or Zep(api_key=self.api_key)
+        self.buffer = MessageBuffer(self.client, buffer_file)
+        atexit.register(self.buffer.flush)
 
         # Create or ensure user exists
 
@@ -44,23 +248,47 @@ class Memory:
 
     def reset_session(self):
         """Create a new session ID and reset memory context."""
-        self.session_id = self._create_session()
+        self.session_id = uuid.uuid4().hex if self.offline else self._create_session()
+        ContextSnapshot.invalidate(ContextEvent.MEMORY)
 
     def add_message(self, role, content, role_type="user"):
-        message = Message(
-            role=role_type,
-            content=content,
-        )
+        """Queue a message for the current thread, see MessageBuffer. Doesn't block on Zep."""
+        if role_type in ("user", "assistant"):
+            self.local.add_message(role_type, content)
+        if self.buffer is not None:
+            self.buffer.add(self.session_id, role_type, content)
 
-        self.client.thread.add_messages(thread_id=self.session_id, messages=[message], ignore_roles=["system", "tool", "assistant"])
+    def flush_soon(self):
+        """Send the buffered messages in the background, called at the end of every turn."""
+        if self.buffer is not None:
+            self.buffer.flush_soon()
 
     def get_memory(self):
-        memory = self.client.thread.get_user_context(thread_id=self.session_id , mode="summary")
+        if self.offline:
+            return {"context": self.local_context()}
+
+        try:
+            memory = self.client.thread.get_user_context(thread_id=self.session_id , mode="summary")
+        except Exception as e:
+            logger.warning("Zep context unavailable, using the local index: %s", e)
+            return {"context": self.local_context()}
 
         return {
             "context": memory.context,
         }
 
+    def local_context(self, query: Optional[str] = None) -> Optional[str]:
+        """Snippets of notes, files and past messages matching `query` (default: the user's last messages)."""
+        recent = self.local.recent_messages(3, role="user")
+        if query is None:
+            query = "\n".join(content for _, content in recent)
+
+        # The user's own messages would be the best matches for themselves
+        hits = self.local.search(query, k=5, exclude=[key for key, _ in recent])
+        if not hits:
+            return None
+        return "Closest matches from notes, files and past messages (local search):\n" + LocalIndex.format_hits(hits)
+
     def clear_memory(self):
         """Resets the memory by starting a new session (keeps same user)."""
         self.reset_session()
@@ -82,11 +310,16 @@ class Memory:
 
     def search_graph(self, query : str, scope : Literal["edges", "nodes"], limit : int =5):
 
-        results = self.client.graph.search(
-            user_id=self.user_id,
-            query=query,
-            scope=scope,
-            limit=limit
-        )
+        if not self.offline:
+            try:
+                results = self.client.graph.search(
+                    user_id=self.user_id,
+                    query=query,
+                    scope=scope,
+                    limit=limit
+                )
+                return str(results)
+            except Exception as e:
+                logger.warning("Zep graph search failed, using the local index: %s", e)
 
-        return str(results)
+        return LocalIndex.format_hits(self.local.search(query, k=limit)) or "No results."
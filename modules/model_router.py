@@ -0,0 +1,225 @@
+"""
+Tiered model routing for the main agent.
+
+Short, plain requests ("set a reminder in 10 min") don't need the model picked with /model. With
+`FAST_MODEL` set they go to that smaller model first and are escalated to the main model when the
+fast model fails:
+
+- the run raises (model errors, too many tool retries), or it never called `send_telegram_message`:
+  the main model continues from where the fast one stopped, so tools that already ran (reminders,
+  messages, service actions) aren't run again. A run that raised before any tool finished is
+  simply redone on the main model.
+
+Every model is wrapped with the `FALLBACK_MODELS` (comma separated) and requests time out after
+`MODEL_TIMEOUT` seconds, so a provider that times out or errors is replaced by the next one.
+Model names go through OpenRouter, unless they start with a pydantic-ai provider prefix like
+`openai:` or `anthropic:`.
+
+Each attempt is recorded as an AgentRun with its tier and escalation reason, and logged.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from pydantic_ai import Agent, capture_run_messages
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, RetryPromptPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models import Model, infer_model
+from pydantic_ai.models.fallback import FallbackModel
+from pydantic_ai.models.openrouter import OpenRouterModel
+from pydantic_ai.providers.openrouter import OpenRouterProvider
+
+from modules.agent_usage import RunTimings, record_run, run_timed
+from structures.agent_run import AgentRun
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+PROVIDER_PREFIXES = ("openai:", "anthropic:", "google-gla:", "google-vertex:", "groq:", "mistral:", "cohere:", "deepseek:")
+
+# Words that suggest more than a quick action
+COMPLEX_HINTS = (
+    "why", "explain", "analy", "compare", "plan", "summar", "write", "code", "debug", "research",
+    "review", "how do", "how to", "how can",
+)
+
+ESCALATION_PROMPT = (
+    "The previous attempt didn't reply to the user. "
+    "Continue with the request above and answer it with `send_telegram_message`."
+)
+
+
+class Tier:
+    FAST = "fast"
+    MAIN = "main"
+
+
+def build_model(name: str) -> Model:
+    if name.startswith(PROVIDER_PREFIXES):
+        return infer_model(name)
+    return OpenRouterModel(name, provider=OpenRouterProvider(api_key=os.getenv("OPENROUTER_API_KEY")))
+
+
+def _model_used(result: AgentRunResult, default: str) -> str:
+    """Name of the model that actually answered, fallbacks included."""
+    for message in reversed(result.new_messages()):
+        if isinstance(message, ModelResponse) and message.model_name:
+            return message.model_name
+    return default
+
+
+def _sent_reply(result: AgentRunResult) -> bool:
+    return any(
+        isinstance(part, ToolCallPart) and part.tool_name == "send_telegram_message"
+        for message in result.new_messages() for part in message.parts
+    )
+
+
+def _tool_retries(result: AgentRunResult) -> int:
+    return sum(
+        isinstance(part, RetryPromptPart)
+        for message in result.new_messages() for part in message.parts
+    )
+
+
+def _resume_point(messages: List[ModelMessage], history_length: int) -> Optional[List[ModelMessage]]:
+    """
+    Messages of a failed run up to its last finished tool calls, None if no tool call finished.
+
+    A trailing response whose tool calls have no results yet is dropped, the main model decides
+    again whether to make them.
+    """
+    messages = list(messages)
+    while len(messages) > history_length and isinstance(messages[-1], ModelResponse):
+        messages.pop()
+    finished = any(
+        isinstance(message, ModelRequest) and any(isinstance(part, ToolReturnPart) for part in message.parts)
+        for message in messages[history_length:]
+    )
+    return messages if finished else None
+
+
+@dataclass
+class Route:
+    tier: str
+    reason: str
+
+
+class ModelRouter:
+    simple_max_chars: int = 200
+    simple_max_lines: int = 2
+
+    def __init__(self, fast_model: Optional[str] = None, fallback_models: Optional[List[str]] = None, timeout: float = 60.0):
+        self.fast_model_name = fast_model
+        self.fallback_names = fallback_models or []
+        self.timeout = timeout
+
+        self.fallbacks = [build_model(name) for name in self.fallback_names]
+        self.fast_model = self.with_fallbacks(build_model(fast_model)) if fast_model else None
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        fallbacks = [name.strip() for name in os.environ.get("FALLBACK_MODELS", "").split(",") if name.strip()]
+        router = cls(
+            fast_model=os.environ.get("FAST_MODEL") or None,
+            fallback_models=fallbacks,
+            timeout=float(os.environ.get("MODEL_TIMEOUT", 60)),
+        )
+        logger.info(
+            "Model router: fast model %s, fallbacks %s, timeout %.0fs",
+            router.fast_model_name or "-", ", ".join(router.fallback_names) or "-", router.timeout,
+        )
+        return router
+
+    def with_fallbacks(self, model: Model) -> Model:
+        fallbacks = [m for m in self.fallbacks if m.model_name != model.model_name]
+        return FallbackModel(model, *fallbacks) if fallbacks else model
+
+    def route(self, text: str, has_media: bool = False) -> Route:
+        if self.fast_model is None:
+            return Route(Tier.MAIN, "no fast model configured")
+        if has_media:
+            return Route(Tier.MAIN, "attachment")
+        if len(text) > self.simple_max_chars:
+            return Route(Tier.MAIN, f"long message ({len(text)} chars)")
+        if text.count("\n") >= self.simple_max_lines or "```" in text:
+            return Route(Tier.MAIN, "multi-line message")
+        lowered = text.lower()
+        hint = next((hint for hint in COMPLEX_HINTS if hint in lowered), None)
+        if hint:
+            return Route(Tier.MAIN, f"complex request ('{hint}')")
+        return Route(Tier.FAST, "short plain message")
+
+    async def run(
+        self,
+        agent: Agent,
+        user_prompt: Any,
+        route: Route,
+        message_history: list,
+        chat_id: Optional[int] = None,
+        **kwargs,
+    ) -> Tuple[AgentRunResult, RunTimings]:
+        """Run the turn on the routed tier, escalating to the main model when the fast one fails."""
+        main_model = self.with_fallbacks(agent.model)
+        model_settings = {"timeout": self.timeout}
+
+        logger.info("Routing turn to %s tier: %s", route.tier, route.reason)
+
+        if route.tier == Tier.FAST:
+            with capture_run_messages() as partial:
+                try:
+                    result, timings = await run_timed(
+                        agent, user_prompt, model=self.fast_model, model_settings=model_settings,
+                        message_history=message_history, **kwargs,
+                    )
+                    failure = None
+                except Exception as e:
+                    failure = e
+
+            if failure is not None:
+                await self._record_failure(Tier.FAST, chat_id, str(failure))
+                resumed = _resume_point(partial, len(message_history))
+                if resumed is None:
+                    logger.warning("Fast model failed (%s), redoing the turn on the main model", failure)
+                    return await self._run_main(
+                        agent, main_model, user_prompt, message_history, chat_id, "fast model error", **kwargs
+                    )
+                logger.warning("Fast model failed (%s) after running tools, the main model continues", failure)
+                return await self._run_main(
+                    agent, main_model, ESCALATION_PROMPT, resumed, chat_id, "fast model error", **kwargs
+                )
+
+            await record_run(result, timings, _model_used(result, self.fast_model_name), chat_id, tier=Tier.FAST)
+
+            retries = _tool_retries(result)
+            if not _sent_reply(result):
+                logger.info("Fast model didn't reply (%d tool retries), escalating to the main model", retries)
+                return await self._run_main(
+                    agent, main_model, ESCALATION_PROMPT, result.all_messages(), chat_id, "no reply", **kwargs
+                )
+
+            logger.info("Fast model handled the turn (%d tool retries)", retries)
+            return result, timings
+
+        return await self._run_main(agent, main_model, user_prompt, message_history, chat_id, None, **kwargs)
+
+    async def _run_main(self, agent, model, user_prompt, message_history, chat_id, escalation, **kwargs):
+        result, timings = await run_timed(
+            agent, user_prompt, model=model, model_settings={"timeout": self.timeout},
+            message_history=message_history, **kwargs,
+        )
+        used = _model_used(result, getattr(agent.model, "model_name", "unknown"))
+        await record_run(result, timings, used, chat_id, tier=Tier.MAIN, escalation=escalation)
+
+        if escalation:
+            logger.info("Escalated turn (%s) handled by %s, replied: %s", escalation, used, _sent_reply(result))
+        return result, timings
+
+    async def _record_failure(self, tier: str, chat_id: Optional[int], error: str) -> None:
+        run = AgentRun(model=self.fast_model_name, chat_id=chat_id, tier=tier, error=error[:500])
+        try:
+            await run_blocking(Resource.MONGO, run.save)
+        except Exception as e:
+            logger.error("Failed to store agent run: %s", e)
@@ -0,0 +1,341 @@
+"""
+Central rate-limited queue for outgoing Telegram messages.
+
+Telegram allows roughly one message per second per chat and 30 messages per second overall, and
+answers with 429 (RetryAfter) when a bot goes over. Everything that sends messages goes through one
+OutboundQueue per bot, which
+
+- keeps messages to the same chat in FIFO order (within a priority),
+- limits sending with a global token bucket and a small bucket per chat,
+- re-queues a message when Telegram answers with RetryAfter and pauses that chat,
+- serves interactive replies before background alerts,
+- records queue depth and queueing delay.
+
+Usage:
+    outbound = OutboundQueue.for_bot(context.bot)
+    message = await outbound.send_message(chat_id, text, priority=Priority.BACKGROUND, parse_mode="MarkdownV2")
+
+    # any other bot method that posts to a chat
+    await outbound.call(bot.edit_message_text, chat_id, message_id=message_id, text=text)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, ClassVar, Deque, Dict, Optional
+
+import telegram
+from telegram.error import RetryAfter
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Priority:
+    """Lower value is sent first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+    NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    """Token bucket that refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+
+@dataclass
+class _Item:
+    chat_id: int
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    priority: int
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+    retries: int = 0
+
+
+@dataclass
+class OutboundStats:
+    sent: int = 0
+    failures: int = 0
+    retries: int = 0
+    max_depth: int = 0
+    last_delay: float = 0.0
+    max_delay: float = 0.0
+    total_delay: float = 0.0
+
+    @property
+    def avg_delay(self) -> Optional[float]:
+        return self.total_delay / self.sent if self.sent else None
+
+
+class _Chat:
+    """Per chat queues (one FIFO per priority) and rate limit state."""
+
+    def __init__(self, rate: float, burst: float):
+        self.queues: Dict[int, Deque[_Item]] = {}
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0.0
+        self.busy = False
+
+    def head(self) -> Optional[_Item]:
+        for priority in sorted(self.queues):
+            if self.queues[priority]:
+                return self.queues[priority][0]
+        return None
+
+    def wait_time(self) -> float:
+        return max(self.paused_until - time.monotonic(), self.bucket.wait_time(), 0.0)
+
+
+class OutboundQueue:
+    """Rate-limited, prioritised outgoing message queue for a single bot."""
+
+    global_rate: ClassVar[float] = 30.0
+    chat_rate: ClassVar[float] = 1.0
+    chat_burst: ClassVar[float] = 3.0
+    max_retries: ClassVar[int] = 3
+    slow_delay: ClassVar[float] = 10.0  # Warn when a message waited longer than this
+
+    _queues: ClassVar[Dict[int, "OutboundQueue"]] = {}
+
+    def __init__(self, bot: telegram.Bot):
+        self.bot = bot
+        self.bucket = TokenBucket(self.global_rate, self.global_rate)
+        self.chats: Dict[int, _Chat] = {}
+        self.stats: Dict[int, OutboundStats] = {priority: OutboundStats() for priority in Priority.NAMES}
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+    @classmethod
+    def for_bot(cls, bot: telegram.Bot) -> "OutboundQueue":
+        """Return the shared queue of a bot, creating it on first use."""
+        key = id(bot)
+        if key not in cls._queues:
+            cls._queues[key] = cls(bot)
+        return cls._queues[key]
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # Public API
+    # ─────────────────────────────────────────────────────────────────────────────
+
+    async def call(self, func: Callable[..., Awaitable[Any]], chat_id: int, *args,
+                   priority: int = Priority.BACKGROUND, **kwargs) -> Any:
+        """Queue `func(*args, chat_id=chat_id, **kwargs)` and wait for its result."""
+        self._ensure_worker()
+
+        item = _Item(
+            chat_id=chat_id,
+            func=func,
+            args=args,
+            kwargs={"chat_id": chat_id, **kwargs},
+            priority=priority,
+            future=asyncio.get_running_loop().create_future(),
+        )
+
+        chat = self.chats.setdefault(chat_id, _Chat(self.chat_rate, self.chat_burst))
+        chat.queues.setdefault(priority, deque()).append(item)
+
+        stats = self.stats[priority]
+        stats.max_depth = max(stats.max_depth, self.depth(priority))
+
+        self._wakeup.set()
+        return await item.future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = Priority.BACKGROUND, **kwargs):
+        return await self.call(self.bot.send_message, chat_id, text=text, priority=priority, **kwargs)
+
+    async def send_photo(self, chat_id: int, photo, priority: int = Priority.BACKGROUND, **kwargs):
+        return await self.call(self.bot.send_photo, chat_id, photo=photo, priority=priority, **kwargs)
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        """Number of queued (not yet sent) messages, optionally for a single priority."""
+        return sum(
+            len(queue)
+            for chat in self.chats.values()
+            for p, queue in chat.queues.items()
+            if priority is None or p == priority
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # Worker
+    # ─────────────────────────────────────────────────────────────────────────────
+
+    async def stop(self) -> None:
+        """Stop the worker and wait for calls in flight. Messages still queued are cancelled."""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        for chat in self.chats.values():
+            for queue in chat.queues.values():
+                while queue:
+                    item = queue.popleft()
+                    if not item.future.done():
+                        item.future.cancel()
+        self.chats.clear()
+
+    @classmethod
+    async def stop_all(cls) -> None:
+        """Stop the queues of every bot, called at application shutdown."""
+        for queue in list(cls._queues.values()):
+            await queue.stop()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _next_item(self):
+        """Return (chat, item, wait) for the message that should go out next."""
+        best = None
+        best_key = None
+        wait = None
+
+        for chat_id, chat in list(self.chats.items()):
+            if self._cleanup(chat_id):
+                continue
+            if chat.busy:
+                continue
+            item = chat.head()
+            if item is None:
+                continue
+
+            chat_wait = chat.wait_time()
+            if chat_wait > 0:
+                wait = chat_wait if wait is None else min(wait, chat_wait)
+                continue
+
+            key = (item.priority, item.enqueued)
+            if best_key is None or key < best_key:
+                best, best_key = (chat, item), key
+
+        if best is None:
+            return None, None, wait
+        return best[0], best[1], 0.0
+
+    async def _run(self) -> None:
+        while True:
+            chat, item, wait = self._next_item()
+
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if item.future.done():
+                # The caller was cancelled (or timed out) while the message was queued
+                chat.queues[item.priority].popleft()
+                continue
+
+            global_wait = self.bucket.wait_time()
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            chat.queues[item.priority].popleft()
+
+            self.bucket.take()
+            chat.bucket.take()
+            chat.busy = True
+
+            # Calls to different chats run concurrently, one chat never has more than one in flight
+            task = asyncio.create_task(self._send(chat, item))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, chat: _Chat, item: _Item) -> None:
+        stats = self.stats[item.priority]
+        delay = time.monotonic() - item.enqueued
+
+        try:
+            result = await item.func(*item.args, **item.kwargs)
+        except RetryAfter as e:
+            retry_after = _seconds(e.retry_after)
+            stats.retries += 1
+
+            if item.retries < self.max_retries:
+                logger.warning("Rate limited in chat %s, retrying in %.0fs", item.chat_id, retry_after)
+                item.retries += 1
+                chat.paused_until = time.monotonic() + retry_after
+                chat.queues.setdefault(item.priority, deque()).appendleft(item)
+            else:
+                stats.failures += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+        except Exception as e:
+            stats.failures += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            stats.sent += 1
+            stats.last_delay = delay
+            stats.max_delay = max(stats.max_delay, delay)
+            stats.total_delay += delay
+
+            if delay > self.slow_delay:
+                logger.warning(
+                    "%s message to chat %s waited %.1fs in the outbound queue (%d queued)",
+                    Priority.NAMES[item.priority], item.chat_id, delay, self.depth()
+                )
+
+            if not item.future.done():
+                item.future.set_result(result)
+        finally:
+            chat.busy = False
+            self._wakeup.set()
+
+    def _cleanup(self, chat_id: int) -> bool:
+        """Forget an idle chat once its bucket has refilled, returns True if it was removed."""
+        chat = self.chats[chat_id]
+        if chat.busy or chat.head() is not None or chat.paused_until > time.monotonic():
+            return False
+        chat.bucket.wait_time()  # refills
+        if chat.bucket.tokens < chat.bucket.capacity:
+            return False
+        del self.chats[chat_id]
+        return True
+
+
+def _seconds(value) -> float:
+    """RetryAfter.retry_after is an int in older releases and a timedelta in newer ones."""
+    if hasattr(value, "total_seconds"):
+        return value.total_seconds()
+    return float(value)
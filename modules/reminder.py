@@ -1,13 +1,13 @@
 import asyncio
 import datetime
 import time
-import threading
 
 import pytz
 from telegram.ext import ContextTypes
 
 from modules.database import MongoDB
 from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -16,13 +16,14 @@ class Reminder:
     def __init__(self, seconds: int, chat_id, reminder, bot, loop=None):
         self.reminder = reminder
         self.chat_id = chat_id
-        self.loop = loop if loop is not None else asyncio.get_event_loop()
-        self.thread = threading.Timer(seconds, self.run)
-        self.thread.start()
         self.bot = bot
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        # A timer on the event loop rather than a thread per reminder
+        self.handle = self.loop.call_later(max(seconds, 0), self.run)
+        self.task = None
 
     def run(self):
-        asyncio.run_coroutine_threadsafe(self.send_reminder(), self.loop)
+        self.task = self.loop.create_task(self.send_reminder())
 
     async def send_reminder(self):
         try:
@@ -31,7 +32,7 @@ class Reminder:
             logger.error("Error sending reminder: %s", exc)
 
     def cancel(self):
-        self.thread.cancel()
+        self.handle.cancel()
 
 
 def convert_seconds_to_hms(seconds: int):
@@ -80,25 +81,25 @@ class Reminders:
                     continue
 
                 self.reminder_data.append(reminder)
-                self.reminders.append(Reminder(reminder[0] - time.time(), reminder[2], reminder[1], bot))
+                self.reminders.append(Reminder(reminder[0] - time.time(), reminder[2], reminder[1], bot, self.loop))
 
         except Exception as exc:
             logger.error("Error loading reminders: %s", exc)
 
-    def add_reminder(self, seconds: int, reminder: str = "reminder"):
+    async def add_reminder(self, seconds: int, reminder: str = "reminder"):
         rem = Reminder(seconds, self.chat_id, reminder, self.bot, self.loop)
         self.reminders.append(rem)
         self.reminder_data.append((time.time() + seconds, reminder, self.chat_id))
 
-        self.db.set("reminders", self.reminder_data)
+        await self.save()
 
         logger.info("Reminder set for %s from now", convert_seconds_to_hms(seconds))
 
         return f"Reminder set for {convert_seconds_to_hms(seconds)} from now"
 
-    def get_reminders(self):
+    async def get_reminders(self):
 
-        self.remove_finished()
+        await self.remove_finished()
 
         logger.debug("Getting reminders")
 
@@ -109,7 +110,7 @@ class Reminders:
 
         return "\n".join(list_string_data)
 
-    def remove_reminders(self, indexes: list[int]):
+    async def remove_reminders(self, indexes: list[int]):
         indexes.sort(reverse=True)
 
         logger.debug("Removing reminders at indexes: %s", indexes)
@@ -119,14 +120,18 @@ class Reminders:
             self.reminders.pop(index)
             self.reminder_data.pop(index)
 
-        self.db.set("reminders", self.reminder_data)
+        await self.save()
 
         return "Reminders deleted"
 
-    def remove_finished(self):
+    async def save(self):
+        # Copy, the list can change while the write waits for a thread
+        await run_blocking(Resource.MONGO, self.db.set, "reminders", list(self.reminder_data))
+
+    async def remove_finished(self):
         indexes = []
         for i, reminder in enumerate(self.reminder_data):
             if reminder[0] - time.time() < 0:
                 indexes.append(i)
 
-        self.remove_reminders(indexes)
+        await self.remove_reminders(indexes)
@@ -0,0 +1,233 @@
+"""
+Progressive delivery of agent replies into a single Telegram message.
+
+The assistant answers through the `send_telegram_message` tool, so without streaming nothing reaches
+the user until the model has generated the whole tool call. ReplyStream follows the model's response
+stream instead: it shows a placeholder right away, edits it with the partial `text` argument of the
+`send_telegram_message` call at a throttled rate, and when the tool finally runs the message is
+finalised in place instead of sending a new one.
+
+Usage:
+    stream = ReplyStream(bot)
+    await stream.start()
+    result = await agent.run(prompt, event_stream_handler=stream.handle_events)
+    await stream.close()
+
+    # in the send_telegram_message tool
+    if bot.stream is not None and bot.stream.active:
+        await bot.stream.finalize(text)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from typing import AsyncIterable, Iterator, Optional, Tuple
+
+import telegram
+from telegram.error import BadRequest
+from pydantic_ai.messages import (
+    AgentStreamEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    ToolCallPart,
+    ToolCallPartDelta,
+)
+from pydantic_core import from_json
+
+from modules.outbound import Priority
+from utils.logging import get_logger
+from utils.markdown import MESSAGE_LIMIT, markdownify, split_message_sources
+
+logger = get_logger(__name__)
+
+STREAMED_TOOL = "send_telegram_message"
+
+
+class ReplyStream:
+    """Streams a single agent reply into one Telegram message."""
+
+    placeholder = "✍️ …"
+    edit_interval = 1.5  # Seconds between edits, Telegram allows roughly one per second per chat
+    cursor = " ▌"
+
+    def __init__(self, bot, edit_interval: Optional[float] = None):
+        self.bot = bot  # modules.bot.Bot
+        self.edit_interval = edit_interval or self.edit_interval
+
+        self.message: Optional[telegram.Message] = None
+        self.text = ""
+        self.shown = ""
+        self.finalized = False
+
+        self._part_index: Optional[int] = None
+        self._args = ""
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self.first_token_at: Optional[float] = None
+        self.started_at = time.monotonic()
+
+    @property
+    def active(self) -> bool:
+        """True while the placeholder is waiting to be finalised."""
+        return self.message is not None and not self.finalized
+
+    async def start(self) -> None:
+        self.started_at = time.monotonic()
+        self.message = await self.bot.outbound.send_message(
+            self.bot.chat_id, self.placeholder, priority=Priority.INTERACTIVE
+        )
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # Agent events
+    # ─────────────────────────────────────────────────────────────────────────────
+
+    async def handle_events(self, ctx, events: AsyncIterable[AgentStreamEvent]) -> None:
+        """event_stream_handler for Agent.run, follows the first reply tool call of every model response."""
+        self._part_index = None
+
+        async for event in events:
+            if self.finalized:
+                continue
+
+            if isinstance(event, PartStartEvent):
+                if self._part_index is not None:
+                    continue
+                if isinstance(event.part, ToolCallPart) and event.part.tool_name == STREAMED_TOOL:
+                    self._part_index = event.index
+                    self._args = ""
+                    self._append_args(event.part.args_as_json_str() if event.part.args else "")
+
+            elif isinstance(event, PartDeltaEvent) and event.index == self._part_index:
+                if isinstance(event.delta, ToolCallPartDelta) and isinstance(event.delta.args_delta, str):
+                    self._append_args(event.delta.args_delta)
+
+    def _append_args(self, delta: str) -> None:
+        self._args += delta
+        try:
+            args = from_json(self._args, allow_partial="trailing-strings")
+        except ValueError:
+            return
+        if isinstance(args, dict) and isinstance(args.get("text"), str):
+            self.text = args["text"]
+            self._schedule_edit()
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # Editing
+    # ─────────────────────────────────────────────────────────────────────────────
+
+    def _schedule_edit(self) -> None:
+        if not self.text.strip() or self.message is None:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            logger.debug("First reply token after %.2fs", self.first_token_at - self.started_at)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        """Edit the placeholder with the latest partial text, at most once per edit_interval."""
+        wait = self._last_edit + self.edit_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        if self.finalized or self.text == self.shown:
+            return
+
+        text = self.text
+        # Only the start of very long replies is previewed, the full text is split when finalising
+        preview = text if len(text) < MESSAGE_LIMIT - 100 else text[:MESSAGE_LIMIT - 100] + " …"
+
+        try:
+            # Previews are never shown twice, keep them out of the render cache
+            await self._edit(markdownify(preview + self.cursor, cache=False), "MarkdownV2")
+            self.shown = text
+        except Exception as e:
+            logger.debug("Failed to edit streamed reply: %s", e)
+        finally:
+            self._last_edit = time.monotonic()
+
+    async def _edit(self, text: str, parse_mode: Optional[str]) -> None:
+        await self.bot.outbound.call(
+            self.bot.bot.edit_message_text,
+            self.bot.chat_id,
+            priority=Priority.INTERACTIVE,
+            message_id=self.message.message_id,
+            text=text,
+            parse_mode=parse_mode,
+        )
+
+    async def finalize(self, text: str, markdown: bool = True) -> Optional[telegram.Message]:
+        """Replace the placeholder with the final reply, long replies continue in new messages."""
+        chunks = split_message_sources(text, render=markdownify if markdown else None)
+        parse_mode = "MarkdownV2" if markdown else None
+
+        first = next(chunks, None)
+        if first is None:
+            await self.close()
+            return None
+
+        self.finalized = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+
+        try:
+            await self._edit(first[1], parse_mode)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                # The placeholder is gone or the markdown doesn't parse, don't lose the reply
+                logger.warning("Failed to finalise streamed reply in place (%s), sending it as new messages", e)
+                await self._delete_placeholder()
+                remaining = itertools.chain([first], chunks)
+                if markdown and _parse_error(e):
+                    return await self._send_plain(remaining)
+                return await self._send_chunks(remaining, markdown)
+
+        message = await self._send_chunks(chunks, markdown) or self.message
+        logger.debug("Reply finalised after %.2fs", time.monotonic() - self.started_at)
+        return message
+
+    async def _send_chunks(self, chunks: Iterator[Tuple[str, str]], markdown: bool) -> Optional[telegram.Message]:
+        """
+        Send (source, rendered) chunks as new messages. When Telegram can't parse one, it and the
+        chunks after it are sent as plain text, the ones before it were delivered already.
+        """
+        message = None
+        for source, chunk in chunks:
+            try:
+                message = await self._send_chunk(chunk, "MarkdownV2" if markdown else None)
+            except BadRequest as e:
+                if not markdown or not _parse_error(e):
+                    raise
+                logger.warning("Telegram couldn't parse part of the reply (%s), sending the rest as plain text", e)
+                return await self._send_plain(itertools.chain([(source, chunk)], chunks))
+        return message
+
+    async def _send_plain(self, chunks: Iterator[Tuple[str, str]]) -> Optional[telegram.Message]:
+        # Plain text can be longer or shorter than its rendering, split the sources again
+        rest = "\n\n".join(source for source, _ in chunks)
+        return await self._send_chunks(split_message_sources(rest, render=None), markdown=False)
+
+    async def _send_chunk(self, chunk: str, parse_mode: Optional[str]) -> telegram.Message:
+        return await self.bot.outbound.send_message(
+            self.bot.chat_id, chunk, priority=Priority.INTERACTIVE, parse_mode=parse_mode
+        )
+
+    async def _delete_placeholder(self) -> None:
+        try:
+            await self.bot.bot.delete_message(chat_id=self.bot.chat_id, message_id=self.message.message_id)
+        except Exception as e:
+            logger.debug("Failed to delete reply placeholder: %s", e)
+
+    async def close(self) -> None:
+        """Remove the placeholder when the run ended without delivering a reply through it."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        if self.message is not None and not self.finalized:
+            self.finalized = True
+            await self._delete_placeholder()
+
+
+def _parse_error(error: BadRequest) -> bool:
+    return "can't parse" in str(error).lower()
@@ -0,0 +1,222 @@
+"""
+Per-turn tool selection for the main agent.
+
+Every tool schema is sent with every model request, most of them (services, habits, capsules, the
+file shell) aren't needed for most messages. `select_tools` is the agent's `prepare_tools` hook and
+only offers the groups that look relevant:
+
+- a group is offered when the user's recent messages match one of its keywords
+- groups used in the last `recent_turns` turns stay offered, so follow ups ("and cancel it") work
+- tools that aren't in any group, like `send_telegram_message`, are always offered
+- voice messages and photos get every tool, there's no text to match
+- offered groups are sticky: the set only grows until the start of the history changes (a new
+  summary after compaction, /clear_thread). Tool schemas come first in the prompt, every change of
+  the set would throw away the provider's prefix cache
+
+When the model calls a hidden tool anyway, pydantic-ai answers with an "Unknown tool name" retry.
+The tool's group is offered from the next request on, so the call costs one round trip but isn't
+lost. Those calls are counted as lost tool calls, together with the estimated tokens saved per run,
+and stored with the AgentRun (see /usage). The saved tokens are counted at full size, with prefix
+caching most of them would have been cheap cache reads, so the real saving is smaller.
+
+Set `TOOL_SELECTION=0` to always offer every tool.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic_ai import RunContext
+from pydantic_ai.messages import ModelRequest, ModelResponse, RetryPromptPart, ToolCallPart, UserPromptPart
+from pydantic_ai.tools import ToolDefinition
+
+from modules.conversation_history import LIVE_CONTEXT_HEADER, SUMMARY_HEADER
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+# group: (tools, keyword patterns matched against the lowercased user text)
+TOOL_GROUPS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "reminders": (
+        ("create_reminder", "cancel_reminder", "get_reminders", "seconds_until", "convert_to_seconds"),
+        (r"remind", r"\btimer\b", r"\balarm", r"\bin \d+", r"\b\d+ ?(s|sec|min|mins|minutes?|h|hours?|days?)\b",
+         r"\btomorrow\b", r"\btonight\b", r"\bwake me\b", r"\bdon'?t (let me )?forget\b"),
+    ),
+    "calendar": (
+        ("create_event", "seconds_until"),
+        (r"\bevent", r"calendar", r"\bmeeting", r"appointment", r"\bschedul", r"\bdeadline"),
+    ),
+    "locations": (
+        ("remove_location",),
+        (r"\blocation", r"\bplaces?\b", r"\baddress"),
+    ),
+    "files": (
+        ("shell",),
+        (r"\bfiles?\b", r"\bfolders?\b", r"\bdirector", r"\bnotes?\b", r"\bmemory\b", r"\bremember\b", r"\bdaily\b",
+         r"\bjournal", r"\bwrite (it |this |that )?down\b", r"\bsave\b", r"\blist\b", r"\.md\b", r"\btodo"),
+    ),
+    "capsules": (
+        ("create_time_capsule", "seconds_until", "convert_to_seconds"),
+        (r"capsule", r"future (self|me)", r"\bletter\b", r"\bin a year\b", r"\bin \d+ (weeks|months|years)\b"),
+    ),
+    "habits": (
+        ("create_habit", "list_habits", "remove_habit", "get_habit_stats", "generate_heatmap"),
+        (r"\bhabit", r"\bstreak", r"heatmap", r"\btrack", r"check-?in", r"\bstats\b", r"\bprogress\b"),
+    ),
+    "services": (
+        ("list_services", "get_service_status", "start_service", "stop_service", "restart_service"),
+        (r"\bservices?\b", r"systemctl", r"\bserver", r"\brestart", r"\bdaemon", r"\bunit\b", r"\bis .+ (running|down|up)\b",
+         r"\b(start|stop) (the )?\w+ (service|bot|server)\b"),
+    ),
+}
+
+TOOL_TO_GROUPS: Dict[str, Set[str]] = {}
+for _group, (_tools, _) in TOOL_GROUPS.items():
+    for _tool in _tools:
+        TOOL_TO_GROUPS.setdefault(_tool, set()).add(_group)
+
+_PATTERNS = {group: re.compile("|".join(patterns)) for group, (_, patterns) in TOOL_GROUPS.items()}
+
+
+def _tool_tokens(tool: ToolDefinition) -> int:
+    """Rough token count of a tool schema, ~4 characters per token like estimate_tokens."""
+    schema = {"name": tool.name, "description": tool.description, "parameters": tool.parameters_json_schema}
+    return len(json.dumps(schema)) // 4
+
+
+@dataclass
+class SelectionStats:
+    """What tool selection did during one agent run."""
+    requests: int = 0
+    tools_offered: int = 0  # summed over requests
+    tools_total: int = 0
+    tokens_saved: int = 0
+    lost_tool_calls: int = 0
+    groups: Set[str] = field(default_factory=set)
+    counted_retries: Set[str] = field(default_factory=set)
+
+
+class ToolSelection:
+    enabled: bool = os.environ.get("TOOL_SELECTION", "1").lower() not in ("0", "false", "no")
+    recent_turns: int = 3  # turns whose tool calls keep their groups offered
+    text_turns: int = 2  # user messages matched against the keywords
+    max_tracked_runs: int = 50  # stats of runs that were never recorded (errors) are dropped after this
+
+    _stats: Dict[str, SelectionStats] = {}
+    _sticky: Set[str] = set()  # groups offered since the history prefix last changed
+    _prefix: Optional[int] = None
+
+    @classmethod
+    def pop_stats(cls, run_id: Optional[str]) -> Optional[SelectionStats]:
+        return cls._stats.pop(run_id, None)
+
+    @classmethod
+    async def select_tools(cls, ctx: RunContext, tool_defs: List[ToolDefinition]) -> List[ToolDefinition]:
+        """`prepare_tools` hook of the main agent."""
+        if not cls.enabled:
+            return tool_defs
+
+        if ctx.run_id not in cls._stats and len(cls._stats) >= cls.max_tracked_runs:
+            cls._stats.pop(next(iter(cls._stats)))
+        stats = cls._stats.setdefault(ctx.run_id, SelectionStats())
+        turns = _user_turns(ctx.messages)
+
+        if _has_media(ctx.prompt):
+            groups = set(TOOL_GROUPS)
+        else:
+            groups = cls._matching_groups(turns[-cls.text_turns:])
+            groups |= cls._recently_used_groups(turns[-cls.recent_turns:])
+            groups |= cls._lost_call_groups(ctx.messages, ctx.run_id, stats)
+
+        prefix = _history_prefix(ctx.messages)
+        if prefix != cls._prefix:
+            # The cached prefix is gone anyway, start over with only what this turn needs
+            cls._prefix = prefix
+            cls._sticky = set()
+        groups |= cls._sticky
+        cls._sticky = groups
+
+        selected = [tool for tool in tool_defs if tool.name not in TOOL_TO_GROUPS or TOOL_TO_GROUPS[tool.name] & groups]
+        hidden = [tool for tool in tool_defs if tool not in selected]
+
+        stats.requests += 1
+        stats.tools_offered += len(selected)
+        stats.tools_total += len(tool_defs)
+        stats.tokens_saved += sum(_tool_tokens(tool) for tool in hidden)
+        stats.groups |= groups
+
+        logger.debug("Offering %d/%d tools, groups: %s", len(selected), len(tool_defs), ", ".join(sorted(groups)) or "-")
+        return selected
+
+    @staticmethod
+    def _matching_groups(turns: List[List]) -> Set[str]:
+        text = "\n".join(_user_text(message) for turn in turns for message in turn).lower()
+        return {group for group, pattern in _PATTERNS.items() if pattern.search(text)}
+
+    @staticmethod
+    def _recently_used_groups(turns: List[List]) -> Set[str]:
+        groups = set()
+        for turn in turns:
+            for message in turn:
+                if isinstance(message, ModelResponse):
+                    for part in message.parts:
+                        if isinstance(part, ToolCallPart):
+                            groups |= TOOL_TO_GROUPS.get(part.tool_name, set())
+        return groups
+
+    @staticmethod
+    def _lost_call_groups(messages: List, run_id: Optional[str], stats: SelectionStats) -> Set[str]:
+        """Groups of hidden tools the model tried to call in this run."""
+        groups = set()
+        for message in messages:
+            if not isinstance(message, ModelRequest) or message.run_id != run_id:
+                continue
+            for part in message.parts:
+                if isinstance(part, RetryPromptPart) and part.tool_name in TOOL_TO_GROUPS:
+                    if isinstance(part.content, str) and part.content.startswith("Unknown tool name"):
+                        groups |= TOOL_TO_GROUPS[part.tool_name]
+                        if part.tool_call_id not in stats.counted_retries:
+                            stats.counted_retries.add(part.tool_call_id)
+                            stats.lost_tool_calls += 1
+                            logger.info("Model called hidden tool %s, offering it from now on", part.tool_name)
+        return groups
+
+
+def _user_turns(messages: List) -> List[List]:
+    """Messages split into turns, each starting with a request carrying a user prompt."""
+    turns: List[List] = []
+    for message in messages:
+        if isinstance(message, ModelRequest) and any(isinstance(part, UserPromptPart) for part in message.parts):
+            turns.append([])
+        if turns:
+            turns[-1].append(message)
+    return turns
+
+
+def _user_text(message) -> str:
+    if not isinstance(message, ModelRequest):
+        return ""
+    texts = []
+    for part in message.parts:
+        if not isinstance(part, UserPromptPart):
+            continue
+        items = [part.content] if isinstance(part.content, str) else part.content
+        texts.extend(
+            item for item in items
+            if isinstance(item, str) and not item.startswith((LIVE_CONTEXT_HEADER, SUMMARY_HEADER))
+        )
+    return "\n".join(texts)
+
+
+def _history_prefix(messages: List) -> Optional[int]:
+    """Identifies the start of the history, it changes when the history is compacted or cleared."""
+    for message in messages[:1]:
+        return hash(_user_text(message))
+    return None
+
+
+def _has_media(prompt) -> bool:
+    return prompt is not None and not isinstance(prompt, str) and any(not isinstance(item, str) for item in prompt)
@@ -1,17 +1,21 @@
 import asyncio
 import re
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 import telegram
 import inspect
 
-import telegramify_markdown
 
 from modules.database import MongoDB
+from modules.alert_slots import AlertSlots
+from modules.outbound import OutboundQueue, Priority
+from modules.watcher_state import WatcherState
 from structures.bts_cache import BattleStatsCache
 from utils.logging import get_logger
+from utils.markdown import markdownify
+from utils.offload import Resource, run_blocking
 
 logger = get_logger(__name__)
 
@@ -47,13 +51,23 @@ class Torn:
         self.user: Optional[Dict[str, Any]] = None
         self.company: Optional[Dict[str, Any]] = None
 
-        self.discovered_bounties = []
         self.oldest_event = 0
-        self.last_messages = {}
         self.is_stacking = False
 
+        # Survives restarts so old alerts can still be cleaned up and bounties aren't re-announced
+        self.state = WatcherState("torn")
+        self.alerts = AlertSlots(bot, chat_id, state=self.state)
+
         self.cache: Dict[str, Dict[str, Any]] = {}
 
+    @property
+    def discovered_bounties(self) -> List[Tuple[int, int]]:
+        return [tuple(record) for record in self.state.get("discovered_bounties", [])]
+
+    @discovered_bounties.setter
+    def discovered_bounties(self, value: List[Tuple[int, int]]):
+        self.state.set("discovered_bounties", [list(record) for record in value])
+
     def set_stacking(self, value: bool):
         self.is_stacking = value
 
@@ -62,43 +76,33 @@ class Torn:
 
     async def send_html(self, text: str):
         try:
-            return await self.bot.send_message(chat_id=self.chat_id, text=text, parse_mode="html")
+            return await OutboundQueue.for_bot(self.bot).send_message(
+                self.chat_id, text, priority=Priority.BACKGROUND, parse_mode="html"
+            )
         except Exception as e:
             logger.error("Failed to send html message: %s in message: %s", e, text)
 
     async def clear(self):
-        caller = inspect.stack()[1].function
-        if caller in self.last_messages:
-            try:
-                await self.bot.delete_message(chat_id=self.chat_id, message_id=self.last_messages[caller].message_id)
-            except Exception as e:
-                logger.debug("Failed to delete message (likely already deleted): %s", e)
-            self.last_messages.pop(caller)
+        await self.clear_by_name(inspect.stack()[1].function)
 
     async def clear_by_name(self, name: str):
-        if name in self.last_messages:
-            try:
-                await self.bot.delete_message(chat_id=self.chat_id, message_id=self.last_messages[name].message_id)
-            except Exception as e:
-                logger.debug("Failed to delete message (likely already deleted): %s", e)
-            self.last_messages.pop(name)
-
-    async def send(self, text: str, clean: bool = True):
-        try:
-            text = telegramify_markdown.markdownify(text)
-            message = await self.bot.send_message(chat_id=self.chat_id, text=text, parse_mode="MarkdownV2")
+        await self.alerts.clear(name)
+
+    async def send(self, text: str, clean: bool = True, notify: Optional[bool] = None):
+        """
+        Send an alert into the caller's alert slot.
 
-            try:
-                if inspect.stack()[1].function in self.last_messages and clean:
-                    await self.bot.delete_message(
-                        chat_id=self.chat_id,
-                        message_id=self.last_messages[inspect.stack()[1].function].message_id
-                    )
-            except Exception as e:
-                logger.error("Failed to clean last message: %s in message: %s", e, text)
+        With clean the slot's message is edited in place (or left alone when nothing changed) and only
+        re-sent when `notify` asks for it, see AlertSlots.post. Without clean a new message is always sent
+        and the previous one is kept.
+        """
+        caller = inspect.stack()[1].function
+        try:
+            text = markdownify(text)
 
-            self.last_messages[inspect.stack()[1].function] = message
-            return message
+            if clean:
+                return await self.alerts.post(caller, text, parse_mode="MarkdownV2", notify=notify)
+            return await self.alerts.send_new(caller, text, parse_mode="MarkdownV2", delete_previous=False)
 
         except Exception as e:
             logger.error("Failed to send message: %s in message: %s", e, text)
@@ -109,7 +113,7 @@ class Torn:
             if self.cache[url].get("expires", 0) > time.time():
                 return self.cache[url]["data"]
 
-        response = requests.get(url).json()
+        response = await run_blocking(Resource.TORN, reqwest, url)
 
         while response.get("error") is not None:
 
@@ -120,7 +124,7 @@ class Torn:
 
                 break
 
-            response = requests.get(url).json()
+            response = await run_blocking(Resource.TORN, reqwest, url)
             await asyncio.sleep(10)
 
         if response.get("error") is None:
@@ -161,7 +165,7 @@ class Torn:
 
     async def get_bts(self, id):
 
-        cached = BattleStatsCache.get_cached(target_id=id)
+        cached = await run_blocking(Resource.MONGO, BattleStatsCache.get_cached, target_id=id)
         if cached is not None:
             return cached
 
@@ -171,10 +175,11 @@ class Torn:
         }
 
         try:
-            result = requests.get(url, headers=headers).json()
+            response = await run_blocking(Resource.HTTP, requests.get, url, headers=headers)
+            result = response.json()
 
             if result.get("TargetId") is not None:
-                BattleStatsCache.set_cached(target_id=id, data=result, expire_days=10)
+                await run_blocking(Resource.MONGO, BattleStatsCache.set_cached, target_id=id, data=result, expire_days=10)
                 return result
             else:
                 logger.error("Unexpected response from lol-manager: %s", result)
@@ -2,9 +2,6 @@ import asyncio
 import time
 from typing import Any, Dict, List
 
-import telegram
-import telegramify_markdown
-
 from modules.database import MongoDB
 from modules.torn import Torn, logg_error
 from utils.logging import get_logger
@@ -204,7 +201,7 @@ async def bounty_monitor(torn: Torn) -> None:
         return
 
     my_bts = torn.user.get("total", 0)
-    chat_message: telegram.Message = await torn.send("Starting Bounty monitor")
+    await torn.send("Starting Bounty monitor", notify=True)
 
     while True:
         monitor = await get_valid_bounties(torn, 500000)
@@ -226,10 +223,7 @@ async def bounty_monitor(torn: Torn) -> None:
 
         message += "\n\nupdated: " + time.strftime('%H:%M:%S', time.localtime())
 
-        await chat_message.edit_text(
-            telegramify_markdown.markdownify(message),
-            parse_mode="MarkdownV2"
-        )
+        await torn.send(message, notify=False)
 
         await asyncio.sleep(60)
 
@@ -0,0 +1,158 @@
+"""
+Small persisted key-value state for watchers.
+
+Watchers used to keep their progress (last seen event, reported emails, alert message ids) in
+function or class attributes, which was lost on every restart. WatcherState keeps one document per
+namespace in the "watcher_state" collection. It is loaded once and then served from memory. Writes
+are debounced so a watcher updating its state every tick costs at most one Mongo write per
+`flush_delay` seconds.
+
+Usage:
+    state = WatcherState("torn_new_events")
+    oldest = state.get("oldest_event", 0)
+    state.set("oldest_event", newest)
+
+Values have to be BSON serializable (tuples come back as lists, dict keys must be strings).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import copy
+import threading
+from typing import Any, ClassVar, Dict, Optional
+
+from modules.database import MongoDB
+from utils.logging import get_logger
+from utils.offload import Resource, run_blocking
+
+logger = get_logger(__name__)
+
+
+class WatcherState:
+    """Persisted state for a single namespace, shared by every instance with the same name."""
+
+    COLLECTION = "watcher_state"
+
+    flush_delay: ClassVar[float] = 5.0
+
+    _namespaces: ClassVar[Dict[str, Dict[str, Any]]] = {}
+    _dirty: ClassVar[set] = set()
+    _flush_handle: ClassVar[Optional[asyncio.TimerHandle]] = None
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._data = self._load(namespace)
+
+    @classmethod
+    def _load(cls, namespace: str) -> Dict[str, Any]:
+        with cls._lock:
+            if namespace not in cls._namespaces:
+                try:
+                    doc = MongoDB().collection(cls.COLLECTION).find_one({"_id": namespace})
+                except Exception as e:
+                    logger.error("Failed to load watcher state '%s': %s", namespace, e)
+                    doc = None
+                cls._namespaces[namespace] = (doc or {}).get("data", {})
+                logger.debug("Loaded watcher state '%s' (%d keys)", namespace, len(cls._namespaces[namespace]))
+            return cls._namespaces[namespace]
+
+    @classmethod
+    def load_all(cls) -> None:
+        """Load every namespace with a single query, called once at startup."""
+        try:
+            docs = MongoDB().collection(cls.COLLECTION).find({})
+        except Exception as e:
+            logger.error("Failed to load watcher state: %s", e)
+            return
+
+        with cls._lock:
+            for doc in docs:
+                cls._namespaces.setdefault(doc["_id"], doc.get("data", {}))
+        logger.info("Loaded watcher state for %d namespaces", len(cls._namespaces))
+
+    # Changes are made under the lock, flush() copies the namespaces from a MONGO pool thread
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with WatcherState._lock:
+            return copy.deepcopy(self._data.get(key, default))
+
+    def set(self, key: str, value: Any) -> None:
+        with WatcherState._lock:
+            if self._data.get(key, object()) == value:
+                return
+            self._data[key] = copy.deepcopy(value)
+        self._mark_dirty()
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with WatcherState._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+        self._mark_dirty()
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        with WatcherState._lock:
+            return key in self._data
+
+    def _mark_dirty(self) -> None:
+        with WatcherState._lock:
+            WatcherState._dirty.add(self.namespace)
+        WatcherState._schedule_flush()
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # Checkpointing
+    # ─────────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def _schedule_flush(cls) -> None:
+        """Flush after `flush_delay` seconds, coalescing every change made in the meantime."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the event loop (scripts, shutdown) just write straight away
+            cls.flush()
+            return
+
+        if cls._flush_handle is not None and not cls._flush_handle.cancelled():
+            return
+
+        def _start_flush():
+            cls._flush_handle = None
+            loop.create_task(cls.flush_async())
+
+        cls._flush_handle = loop.call_later(cls.flush_delay, _start_flush)
+
+    @classmethod
+    async def flush_async(cls) -> None:
+        if not await run_blocking(Resource.MONGO, cls.flush):
+            # Retried with the next debounced flush instead of waiting for an unrelated change
+            cls._schedule_flush()
+
+    @classmethod
+    def flush(cls) -> bool:
+        """Write every dirty namespace to the database, returns False if any write failed."""
+        with cls._lock:
+            dirty = {name: copy.deepcopy(cls._namespaces[name]) for name in cls._dirty}
+            cls._dirty.clear()
+
+        written = True
+        for namespace, data in dirty.items():
+            try:
+                MongoDB().collection(cls.COLLECTION).update_one(
+                    {"_id": namespace},
+                    {"$set": {"_id": namespace, "data": data}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error("Failed to save watcher state '%s': %s", namespace, e)
+                written = False
+                with cls._lock:
+                    cls._dirty.add(namespace)
+        return written
+
+
+atexit.register(WatcherState.flush)
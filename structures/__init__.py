@@ -1,9 +1,13 @@
 # Auto-import all structures for Document registry
+from structures.agent_run import AgentRun
 from structures.bts_cache import BattleStatsCache
+from structures.image_cache import CachedImage
 from structures.race_record import RaceResult
 
 __all__ = [
+    "AgentRun",
     "BattleStatsCache",
+    "CachedImage",
     "RaceResult",
 ]
 
@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import ConfigDict, Field
+
+from modules.database import Document
+
+
+class AgentRun(Document):
+    """Token usage, estimated cost and timings of a single main agent run."""
+
+    model_config = ConfigDict(collection_name="agent_runs")
+
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    model: str
+    chat_id: Optional[int] = None
+    tier: Optional[str] = None  # ModelRouter tier the turn was routed to
+    escalation: Optional[str] = None  # why the turn was escalated to this run, if it was
+    error: Optional[str] = None  # set for runs that raised
+
+    requests: int = 0  # model round trips
+    tool_calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    output_tokens: int = 0
+    cost: Optional[float] = None  # USD, None if the model isn't in the price list
+
+    tools_offered: Optional[float] = None  # average per request, None without tool selection
+    tools_total: Optional[int] = None
+    tool_tokens_saved: int = 0  # estimated prompt tokens of tool schemas that weren't sent
+    lost_tool_calls: int = 0  # calls to tools that were hidden by tool selection
+
+    total_time: float = 0.0
+    llm_time: float = 0.0
+    tool_time: float = 0.0
+
+    @classmethod
+    def ensure_indexes(cls):
+        collection = cls._collection()
+        if hasattr(collection, 'create_index'):
+            collection.create_index("started_at")
+
+    @classmethod
+    def since(cls, start: datetime) -> list["AgentRun"]:
+        """Runs started at or after `start` (UTC)."""
+        # Dates are stored as ISO strings, which compare in the same order
+        return cls.find(started_at={"$gte": start.isoformat()})
+
+    @staticmethod
+    def aggregate(runs: list["AgentRun"]) -> Dict[str, Dict[str, Any]]:
+        """Totals and averages per model. Runs that raised are only counted, as `failed_runs`."""
+        by_model: Dict[str, Dict[str, Any]] = {}
+
+        for run in runs:
+            totals = by_model.setdefault(run.model, {
+                "runs": 0, "requests": 0, "tool_calls": 0,
+                "failed_runs": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                "cost": 0.0, "unpriced_runs": 0, "tool_tokens_saved": 0, "lost_tool_calls": 0,
+                "total_time": 0.0, "llm_time": 0.0, "tool_time": 0.0,
+            })
+            if run.error is not None:
+                # Recorded without usage, they would only drag the per-run averages down
+                totals["failed_runs"] += 1
+                continue
+            totals["runs"] += 1
+            for key in ("requests", "tool_calls", "input_tokens", "cached_tokens", "output_tokens",
+                        "tool_tokens_saved", "lost_tool_calls", "total_time", "llm_time", "tool_time"):
+                totals[key] += getattr(run, key)
+            if run.cost is None:
+                totals["unpriced_runs"] += 1
+            else:
+                totals["cost"] += run.cost
+
+        for totals in by_model.values():
+            runs = totals["runs"] or 1
+            totals["avg_total_time"] = totals["total_time"] / runs
+            totals["avg_llm_time"] = totals["llm_time"] / runs
+            totals["avg_tool_time"] = totals["tool_time"] / runs
+            totals["avg_requests"] = totals["requests"] / runs
+            totals["cache_ratio"] = totals["cached_tokens"] / totals["input_tokens"] if totals["input_tokens"] else 0.0
+            # Share of tool calls that first hit a tool hidden by tool selection
+            attempted = totals["tool_calls"] + totals["lost_tool_calls"]
+            totals["lost_tool_call_rate"] = totals["lost_tool_calls"] / attempted if attempted else 0.0
+
+        return by_model
@@ -0,0 +1,52 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from pydantic import ConfigDict
+
+from modules.database import Document
+
+
+class CachedImage(Document):
+    """Telegram file_id of an already uploaded generated image, keyed by a hash of what it was rendered from."""
+
+    model_config = ConfigDict(collection_name="image_cache")
+
+    key: str
+    file_id: str
+    expires_at: datetime
+
+    @classmethod
+    def ensure_indexes(cls):
+        """Create TTL index on expires_at field for automatic document deletion."""
+        collection = cls._collection()
+        if hasattr(collection, 'create_index'):
+            collection.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def make_key(kind: str, **inputs: Any) -> str:
+        """Hash the render inputs, anything that changes the image has to be in there."""
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return f"{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    @classmethod
+    def get_file_id(cls, key: str) -> Optional[str]:
+        """Get the file_id for a key, or None if the image hasn't been uploaded yet."""
+        cached = cls.find_one(key=key)
+        if cached is None:
+            return None
+        # MongoDB TTL handles deletion, but check just in case
+        if datetime.utcnow() > cached.expires_at:
+            return None
+        return cached.file_id
+
+    @classmethod
+    def set_file_id(cls, key: str, file_id: str, expire_days: int = 30) -> None:
+        """Remember the file_id Telegram gave the first upload of an image."""
+        cache_entry = cls(
+            key=key,
+            file_id=file_id,
+            expires_at=datetime.utcnow() + timedelta(days=expire_days)
+        )
+        cache_entry.save(key_field="key")
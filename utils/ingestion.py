@@ -0,0 +1,92 @@
+"""
+How updates get from Telegram to the bot: long polling (default) or a webhook.
+
+In webhook mode Telegram pushes every update to a small async HTTP server started by
+python-telegram-bot (tornado), so there is no long-poll round trip in front of each update.
+The mode is chosen with environment variables:
+
+    TELEGRAM_MODE=webhook
+    WEBHOOK_URL=https://bot.example.com/telegram   # public URL Telegram posts to
+    WEBHOOK_SECRET=...                             # checked against X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_LISTEN=127.0.0.1                       # optional, address of the local server
+    WEBHOOK_PORT=8443                              # optional
+    WEBHOOK_PATH=telegram                          # optional, defaults to the path of WEBHOOK_URL
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+from telegram.ext import Application
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Telegram only accepts these characters in a secret token
+_SECRET_TOKEN = re.compile(r"^[A-Za-z0-9_-]{1,256}$")
+
+
+class IngestionMode:
+    POLLING = "polling"
+    WEBHOOK = "webhook"
+
+
+@dataclass
+class WebhookConfig:
+    url: str
+    secret: str
+    listen: str = "127.0.0.1"
+    port: int = 8443
+    path: str = ""
+
+    @classmethod
+    def from_env(cls) -> "WebhookConfig":
+        url = os.environ.get("WEBHOOK_URL")
+        secret = os.environ.get("WEBHOOK_SECRET")
+
+        if not url:
+            raise ValueError("WEBHOOK_URL has to be set in webhook mode")
+        if not secret or not _SECRET_TOKEN.match(secret):
+            raise ValueError("WEBHOOK_SECRET has to be set in webhook mode (1-256 characters of A-Z, a-z, 0-9, _ and -)")
+
+        path = os.environ.get("WEBHOOK_PATH", urlparse(url).path).strip("/")
+
+        return cls(
+            url=url,
+            secret=secret,
+            listen=os.environ.get("WEBHOOK_LISTEN", cls.listen),
+            port=int(os.environ.get("WEBHOOK_PORT", cls.port)),
+            path=path,
+        )
+
+
+def get_mode() -> str:
+    mode = os.environ.get("TELEGRAM_MODE", IngestionMode.POLLING).lower()
+    if mode not in (IngestionMode.POLLING, IngestionMode.WEBHOOK):
+        raise ValueError(f"Unknown TELEGRAM_MODE '{mode}', use '{IngestionMode.POLLING}' or '{IngestionMode.WEBHOOK}'")
+    return mode
+
+
+def run_application(application: Application, mode: Optional[str] = None) -> None:
+    """Run the application with polling or a webhook, blocks until the bot is stopped."""
+    mode = mode or get_mode()
+
+    if mode == IngestionMode.POLLING:
+        logger.info("Receiving updates with long polling")
+        application.run_polling()
+        return
+
+    config = WebhookConfig.from_env()
+    logger.info("Receiving updates with a webhook on %s:%d/%s", config.listen, config.port, config.path)
+
+    # Updates with a missing or wrong X-Telegram-Bot-Api-Secret-Token header are rejected with 403
+    application.run_webhook(
+        listen=config.listen,
+        port=config.port,
+        url_path=config.path,
+        webhook_url=config.url,
+        secret_token=config.secret,
+    )
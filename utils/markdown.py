@@ -0,0 +1,262 @@
+"""
+Cached MarkdownV2 rendering.
+
+telegramify_markdown parses the whole text into a markdown AST on every call, and most outgoing
+messages are the same templated alerts every minute. `markdownify` puts a bounded LRU cache keyed by
+a content hash in front of it, and skips the parser entirely for plain text that needs no escaping.
+
+Usage:
+    from utils.markdown import markdownify
+
+    await bot.send_message(chat_id, markdownify(text), parse_mode="MarkdownV2")
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import telegramify_markdown
+
+CACHE_SIZE = 512
+
+# Text made only of these characters, without leading/trailing whitespace on any line, renders to itself
+_PLAIN_TEXT = re.compile(r"[A-Za-z0-9 ,:;?'\"%$@/\n]+")
+
+_cache: "OrderedDict[Tuple[bytes, Any], str]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "plain": 0}
+
+
+def _is_plain(text: str) -> bool:
+    if not _PLAIN_TEXT.fullmatch(text) or text != text.strip():
+        return False
+    return all(line == line.strip() for line in text.split("\n"))
+
+
+def markdownify(text: str, cache: bool = True, **kwargs) -> str:
+    """
+    Drop-in replacement for telegramify_markdown.markdownify with a render cache.
+
+    `cache=False` for one-off texts like partial previews, which would only push out useful entries.
+    """
+    if not text:
+        return telegramify_markdown.markdownify(text, **kwargs)
+
+    if not kwargs and _is_plain(text):
+        _stats["plain"] += 1
+        return text + "\n"
+
+    if not cache:
+        return telegramify_markdown.markdownify(text, **kwargs)
+
+    key = (hashlib.blake2b(text.encode(), digest_size=16).digest(), tuple(sorted(kwargs.items())))
+
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+
+    rendered = telegramify_markdown.markdownify(text, **kwargs)
+
+    with _lock:
+        _stats["misses"] += 1
+        _cache[key] = rendered
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return rendered
+
+
+def cache_info() -> dict:
+    """Hit/miss counters and current size of the render cache."""
+    with _lock:
+        return {**_stats, "size": len(_cache), "max_size": CACHE_SIZE}
+
+
+def clear_cache() -> None:
+    with _lock:
+        _cache.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Splitting long messages
+# ─────────────────────────────────────────────────────────────────────────────
+
+MESSAGE_LIMIT = 4096
+
+_FENCE = re.compile(r"^(```|~~~)")
+
+
+def _blocks(text: str) -> Iterator[str]:
+    """Split markdown into paragraphs, keeping fenced code blocks in one piece."""
+    current: List[str] = []
+    fence = None
+
+    for line in text.split("\n"):
+        match = _FENCE.match(line.strip())
+
+        if fence is not None:
+            current.append(line)
+            if match and match.group(1) == fence:
+                fence = None
+            continue
+
+        if match:
+            fence = match.group(1)
+        elif not line.strip():
+            if current:
+                yield "\n".join(current)
+                current = []
+            continue
+
+        current.append(line)
+
+    if current:
+        yield "\n".join(current)
+
+
+def _hard_split(text: str, fits: Callable[[str], bool]) -> Iterator[Tuple[str, str]]:
+    """Split a single line at spaces, or anywhere if a word alone is too long. Yields (separator, part)."""
+    current = ""
+    separator = ""
+    for word in text.split(" "):
+        candidate = f"{current} {word}" if current else word
+        if fits(candidate):
+            current = candidate
+            continue
+        if current:
+            yield separator, current
+            separator = " "
+        # A word that doesn't fit on its own is cut wherever it has to be
+        while not fits(word):
+            cut = len(word) // 2
+            while cut > 1 and not fits(word[:cut]):
+                cut //= 2
+            cut = max(cut, 1)
+            yield separator, word[:cut]
+            separator = ""
+            word = word[cut:]
+        current = word
+    if current:
+        yield separator, current
+
+
+def _split_code(block: str, fits: Callable[[str], bool]) -> Iterator[str]:
+    """Split a fenced code block into several complete fenced blocks."""
+    lines = block.split("\n")
+    opening = lines[0]
+    fence = _FENCE.match(opening.strip()).group(1)
+    closing = fence
+    body = lines[1:-1] if len(lines) > 1 and lines[-1].strip().startswith(fence) else lines[1:]
+
+    current: List[str] = []
+    for line in body:
+        if fits("\n".join([opening, *current, line, closing])):
+            current.append(line)
+            continue
+        if current:
+            yield "\n".join([opening, *current, closing])
+            current = []
+        if fits("\n".join([opening, line, closing])):
+            current = [line]
+        else:
+            for _, part in _hard_split(line, lambda s: fits("\n".join([opening, s, closing]))):
+                yield "\n".join([opening, part, closing])
+    if current:
+        yield "\n".join([opening, *current, closing])
+
+
+def _pieces(text: str, fits: Callable[[str], bool]) -> Iterator[Tuple[str, str]]:
+    """Yield (separator, piece) pairs, each piece fitting on its own."""
+    for block in _blocks(text):
+        if fits(block):
+            yield "\n\n", block
+        elif _FENCE.match(block.strip()):
+            for part in _split_code(block, fits):
+                yield "\n\n", part
+        else:
+            separator = "\n\n"
+            for line in block.split("\n"):
+                if fits(line):
+                    yield separator, line
+                else:
+                    for i, (part_separator, part) in enumerate(_hard_split(line, fits)):
+                        yield (separator if i == 0 else part_separator), part
+                separator = "\n"
+
+
+def split_message(text: str, render: Optional[Callable[[str], str]] = markdownify,
+                  limit: int = MESSAGE_LIMIT) -> Iterator[str]:
+    """
+    Lazily split text into messages that fit Telegram's length limit.
+
+    Cuts at paragraph boundaries first, then lines, then words. Fenced code blocks are only cut
+    between lines, and every part is re-fenced so each message renders on its own. The limit is
+    checked after rendering, so escaping can't push a chunk over it.
+
+    Args:
+        text: Markdown (or plain) source text.
+        render: Applied to every chunk, e.g. markdownify. None to split plain text.
+        limit: Maximum length of a rendered chunk.
+
+    Yields:
+        Rendered chunks, in order.
+    """
+    for _, rendered in split_message_sources(text, render, limit):
+        yield rendered
+
+
+def split_message_sources(text: str, render: Optional[Callable[[str], str]] = markdownify,
+                          limit: int = MESSAGE_LIMIT) -> Iterator[Tuple[str, str]]:
+    """
+    split_message yielding (source, rendered) pairs, so a sender can fall back to the source text
+    of the chunks that haven't been sent yet.
+    """
+    render = render or (lambda s: s)
+    # Pieces are only measured, rendering them through the cache would push out every useful entry
+    measure = (lambda s: markdownify(s, cache=False)) if render is markdownify else render
+    sizes: Dict[str, int] = {}
+
+    def size(source: str) -> int:
+        if source not in sizes:
+            sizes[source] = len(measure(source))
+        return sizes[source]
+
+    def fits(source: str) -> bool:
+        return size(source) <= limit
+
+    if fits(text):
+        if text:
+            yield text, render(text)
+        return
+
+    def chunks(pieces: List[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        source = "".join(separator + piece for separator, piece in pieces)[len(pieces[0][0]):]
+        rendered = render(source)
+        if len(rendered) <= limit or len(pieces) == 1:
+            yield source, rendered
+        else:
+            # Rendering isn't strictly additive, in the rare case the sum was off send the pieces alone
+            for _, piece in pieces:
+                yield piece, render(piece)
+
+    # Every piece is rendered once and the chunk size is the sum of the rendered pieces, so the
+    # split stays linear in the length of the text
+    current: List[Tuple[str, str]] = []
+    total = 0
+    for separator, piece in _pieces(text, fits):
+        added = size(piece) + (len(separator) if current else 0)
+        if current and total + added > limit:
+            yield from chunks(current)
+            current, total = [], 0
+            added = size(piece)
+        current.append((separator, piece))
+        total += added
+
+    if current:
+        yield from chunks(current)
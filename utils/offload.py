@@ -0,0 +1,194 @@
+"""
+Helpers for running blocking code (pymongo, requests, IMAP, googleapiclient, matplotlib)
+without stalling the asyncio event loop.
+
+Blocking work is sent to a bounded ThreadPoolExecutor per resource class, so a handful of slow
+IMAP logins can't starve database reads and matplotlib (which isn't thread safe) always renders
+on a single thread.
+
+Usage:
+    from utils.offload import Resource, blocking, run_blocking
+
+    @blocking(Resource.MONGO)
+    def load_things():
+        ...
+
+    things = await load_things()
+    user = await run_blocking(Resource.TORN, requests.get, url)
+
+Set `DEBUG_LOOP_BLOCKING=1` to start a LoopBlockMonitor that logs every time the event loop is
+blocked for longer than `LOOP_BLOCK_THRESHOLD_MS` (default 250), together with the stack of the
+code that is blocking it.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Set, TypeVar
+
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class Resource:
+    """Resource classes, each one gets its own thread pool."""
+    MONGO = "mongo"
+    TORN = "torn"
+    HTTP = "http"
+    IMAP = "imap"
+    GOOGLE = "google"
+    RENDER = "render"
+    SUBPROCESS = "subprocess"
+    DEFAULT = "default"
+
+
+# Maximum number of worker threads per resource class
+POOL_SIZES: Dict[str, int] = {
+    Resource.MONGO: 4,
+    Resource.TORN: 4,
+    Resource.HTTP: 4,
+    Resource.IMAP: 2,
+    Resource.GOOGLE: 2,
+    Resource.RENDER: 1,  # matplotlib.pyplot keeps global state
+    Resource.SUBPROCESS: 2,
+    Resource.DEFAULT: 4,
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(resource: str = Resource.DEFAULT) -> ThreadPoolExecutor:
+    """Return the thread pool for a resource class, creating it on first use."""
+    with _executors_lock:
+        if resource not in _executors:
+            size = POOL_SIZES.get(resource, POOL_SIZES[Resource.DEFAULT])
+            _executors[resource] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"offload-{resource}")
+        return _executors[resource]
+
+
+# Pool futures of the calls made inside track_blocking_calls(), see there
+_tracked_calls: contextvars.ContextVar[Optional[Set[Future]]] = contextvars.ContextVar("tracked_blocking_calls", default=None)
+
+
+@contextlib.contextmanager
+def track_blocking_calls() -> Iterator[Set[Future]]:
+    """
+    Collect the run_blocking calls made inside the block (and in tasks started from it) that are
+    still running. Cancelling the awaiting coroutine doesn't stop a call's thread, this tells when
+    the threads are really done.
+    """
+    calls: Set[Future] = set()
+    token = _tracked_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _tracked_calls.reset(token)
+
+
+async def run_blocking(resource: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable in the resource's thread pool and await its result."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    future = get_executor(resource).submit(call)
+
+    tracked = _tracked_calls.get()
+    if tracked is not None:
+        tracked.add(future)
+        future.add_done_callback(tracked.discard)
+
+    return await asyncio.wrap_future(future)
+
+
+def blocking(resource: str = Resource.DEFAULT):
+    """Decorator that turns a blocking function into a coroutine function running in the resource's pool."""
+
+    def decorator(func: Callable[..., T]) -> Callable[..., "asyncio.Future[T]"]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(resource, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def shutdown_executors() -> None:
+    """Shut down all thread pools, waiting for running work to finish."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
+
+
+class LoopBlockMonitor:
+    """
+    Debug helper that detects when the event loop is blocked.
+
+    A callback on the loop updates a heartbeat every `interval` seconds, and a daemon thread checks
+    how old the heartbeat is. When it gets older than `threshold` the loop thread's current stack is
+    logged, which points right at the blocking call.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._blocked_since: Optional[float] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> Optional["LoopBlockMonitor"]:
+        """Create a monitor if DEBUG_LOOP_BLOCKING is set, otherwise return None."""
+        if os.environ.get("DEBUG_LOOP_BLOCKING", "").lower() not in ("1", "true", "yes"):
+            return None
+        threshold_ms = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", 250))
+        return cls(threshold=threshold_ms / 1000)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._heartbeat = time.monotonic()
+        loop.call_soon_threadsafe(self._beat)
+        threading.Thread(target=self._watch, name="loop-block-monitor", daemon=True).start()
+        logger.info("Event loop block monitor started (threshold %.0f ms)", self.threshold * 1000)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _beat(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        if not self._stop.is_set():
+            self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            lag = time.monotonic() - self._heartbeat
+
+            if lag <= self.threshold + self.interval:
+                if self._blocked_since is not None:
+                    logger.warning("Event loop unblocked after %.0f ms", (time.monotonic() - self._blocked_since) * 1000)
+                    self._blocked_since = None
+                continue
+
+            # Only report the stack once per blocking episode
+            if self._blocked_since is not None or self._loop_thread_id is None:
+                continue
+
+            self._blocked_since = self._heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<stack unavailable>"
+            logger.warning("Event loop blocked for over %.0f ms, offending stack:\n%s", lag * 1000, stack)